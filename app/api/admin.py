@@ -17,12 +17,25 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import admin_required, get_current_admin
+from app.api.deps import admin_required, get_async_db, get_current_admin, get_user_by_username
 from app.core import security
 from app.core.config import ICONS_DIR
-from app.database import get_db
+from app.core.dashboard import public_groups_cache
+from app.core.favicons import favicon_cache
+from app.core.http_client import get_http_stats
+from app.core.index_page import index_pages
+from app.core.link_health import link_health
+from app.core.ordering import rebalance_groups, rebalance_links
+from app.core.pinyin_index import pinyin_index
+from app.core.search import count_of, search_links, search_users
+from app.core.icon_sweeper import icon_sweeper
+from app.core.icons import VARIANT_NAME_RE, purge_unreferenced_icons, remove_icon_files
+from app.core.title_queue import title_queue
+from app.core.url_metadata import canonicalize_url, url_metadata
+from app.core.user_cache import UserSnapshot, user_cache
 from app import models, schemas
 from app.schemas.link import LinkPaginationOut
 
@@ -279,14 +292,16 @@ def get_system_details():
 
 @router.post("/login")
 async def admin_login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = (
-        db.query(models.User).filter(models.User.username == form_data.username).first()
-    )
-    if not user or not security.verify_password(
-        form_data.password, user.hashed_password
-    ):
+    user = await get_user_by_username(db, form_data.username)
+    await db.commit()
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await security.verify_and_update_password_async(
+            form_data.password, user.hashed_password
+        )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="管理员账号或密码错误"
         )
@@ -296,15 +311,19 @@ async def admin_login(
             status_code=status.HTTP_403_FORBIDDEN, detail="拒绝访问：该账户非管理员"
         )
 
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     access_token = security.create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/config")
 async def get_config(
-    db: Session = Depends(get_db), admin: models.User = Depends(admin_required)
+    db: AsyncSession = Depends(get_async_db), admin: UserSnapshot = Depends(admin_required)
 ):
-    configs = db.query(models.SystemConfig).all()
+    configs = (await db.scalars(select(models.SystemConfig))).all()
 
     cfg_dict = {c.key: c.value for c in configs}
 
@@ -317,13 +336,14 @@ async def get_config(
 
 @router.get("/system-info")
 async def get_system_info(
-    db: Session = Depends(get_db), admin: models.User = Depends(get_current_admin)
+    db: AsyncSession = Depends(get_async_db), admin: UserSnapshot = Depends(get_current_admin)
 ):
     cfg_dict = {
         item.key: item.value
-        for item in db.query(models.SystemConfig)
-        .filter(models.SystemConfig.key.in_(["site_title"]))
-        .all()
+        for item in await db.scalars(
+            select(models.SystemConfig)
+            .where(models.SystemConfig.key.in_(["site_title"]))
+        )
     }
 
     os_name, os_version = get_system_details()
@@ -348,16 +368,45 @@ async def get_system_info(
     }
 
 
+@router.get("/metrics")
+async def get_metrics(
+    db: AsyncSession = Depends(get_async_db), admin: UserSnapshot = Depends(get_current_admin)
+):
+    return {
+        "user_cache": user_cache.stats(),
+        "password_pool": security.get_password_pool_stats(),
+        "title_queue": await title_queue.stats(db),
+        "http_client": get_http_stats(),
+        "url_metadata": url_metadata.stats(),
+        "favicon_cache": favicon_cache.stats(),
+        "link_health": await link_health.stats(db),
+        "icon_sweeper": icon_sweeper.stats(),
+        "pinyin_index": pinyin_index.stats(),
+        "public_groups_cache": public_groups_cache.stats(),
+        "index_pages": index_pages.stats(),
+    }
+
+
+@router.post("/rebalance-order")
+async def rebalance_order(
+    db: AsyncSession = Depends(get_async_db), admin: UserSnapshot = Depends(admin_required)
+):
+    """把所有分组和链接的排序键压缩为等间隔，拖拽次数很多之后可手动执行"""
+    await rebalance_groups(db)
+    await rebalance_links(db)
+    await db.commit()
+    return {"msg": "排序已整理"}
+
+
 @router.post("/config/registration")
 async def toggle_registration(
     open: bool,
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(admin_required),
 ):
-    reg_cfg = (
-        db.query(models.SystemConfig)
-        .filter(models.SystemConfig.key == "registration_open")
-        .first()
+    reg_cfg = await db.scalar(
+        select(models.SystemConfig)
+        .where(models.SystemConfig.key == "registration_open")
     )
     val_str = "true" if open else "false"
 
@@ -367,7 +416,7 @@ async def toggle_registration(
         reg_cfg = models.SystemConfig(key="registration_open", value=val_str)
         db.add(reg_cfg)
 
-    db.commit()
+    await db.commit()
     return {"status": "success", "registration_open": open}
 
 
@@ -375,24 +424,28 @@ async def toggle_registration(
 async def update_site_info(
     site_title: Optional[str] = Form(None),
     favicon_api: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(admin_required),
 ):
     try:
         if site_title:
-            db.query(models.SystemConfig).filter(
-                models.SystemConfig.key == "site_title"
-            ).update({"value": site_title})
+            await db.execute(
+                update(models.SystemConfig)
+                .where(models.SystemConfig.key == "site_title")
+                .values(value=site_title)
+            )
 
         if favicon_api:
-            db.query(models.SystemConfig).filter(
-                models.SystemConfig.key == "favicon_api"
-            ).update({"value": favicon_api})
+            await db.execute(
+                update(models.SystemConfig)
+                .where(models.SystemConfig.key == "favicon_api")
+                .values(value=favicon_api)
+            )
 
-        db.commit()
+        await db.commit()
         return {"msg": "更新成功"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Update Error: {e}")
         raise HTTPException(status_code=500, detail="数据库繁忙，请稍后再试")
 
@@ -401,8 +454,8 @@ async def update_site_info(
 async def update_static_assets(
     file: UploadFile = File(...),
     asset_type: str = Form(...),
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(admin_required),
 ):
     file_map = {
         "background": "default_bg.jpg",
@@ -470,18 +523,18 @@ async def update_static_assets(
 
 @router.get("/users", response_model=schemas.user.UserPaginationOut)
 async def list_users(
-    q: str = "", page: int = 1, size: int = 10, db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_admin)
+    q: str = "", page: int = 1, size: int = 10, db: AsyncSession = Depends(get_async_db),
+    current_admin: UserSnapshot = Depends(get_current_admin)
 ):
     try:
         skip = (page - 1) * size
-        query = db.query(models.User)
+        query = select(models.User)
 
         if q:
-            query = query.filter(models.User.username.ilike(f"%{q}%"))
+            query = search_users(query, q)
 
-        total = query.count()
-        users = query.offset(skip).limit(size).all()
+        total = await db.scalar(count_of(query))
+        users = (await db.scalars(query.order_by(models.User.id).offset(skip).limit(size))).all()
 
         return {
             "items": users,
@@ -498,14 +551,14 @@ async def list_users(
 async def handle_user_action(
     user_id: int,
     action: str = Form(...),
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(admin_required),
 ):
     
     if user_id == 1:
         raise HTTPException(403, "初始管理员受保护，无法修改其权限或状态")
     
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
+    target_user = await db.scalar(select(models.User).where(models.User.id == user_id))
     if not target_user:
         raise HTTPException(404, "用户不存在")
 
@@ -523,7 +576,8 @@ async def handle_user_action(
     else:
         raise HTTPException(400, "无效的操作类型")
 
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(target_user.id)
     return {"msg": "操作成功"}
 
 
@@ -531,8 +585,8 @@ async def handle_user_action(
 async def admin_reset_password(
     user_id: int,
     new_password: str = Form(...),
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(admin_required),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(admin_required),
 ):
     
     if user_id == 1 and admin.id != 1:
@@ -541,38 +595,50 @@ async def admin_reset_password(
     if len(new_password) < 8:
         raise HTTPException(status_code=400, detail="新密码长度至少为8位")
 
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
+    target_user = await db.scalar(select(models.User).where(models.User.id == user_id))
     if not target_user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
-    target_user.hashed_password = security.get_password_hash(new_password)
-    db.commit()
+    await db.commit()
+    target_user.hashed_password = await security.get_password_hash_async(new_password)
+    await db.commit()
+    user_cache.invalidate(target_user.id)
     return {"msg": f"用户 {target_user.username} 的密码已重置"}
 
 
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: UserSnapshot = Depends(get_current_admin),
 ):
     
     if user_id == 1:
         raise HTTPException(status_code=403, detail="初始管理员禁止删除")
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.scalar(select(models.User).where(models.User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
 
     if user.id == current_admin.id:
         raise HTTPException(status_code=400, detail="不能删除当前登录的管理员账号")
 
+    icons = (
+        await db.scalars(
+            select(models.Link.icon)
+            .join(models.Group, models.Link.group_id == models.Group.id)
+            .where(models.Group.user_id == user_id)
+        )
+    ).all()
+
     try:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        user_cache.invalidate(user_id)
+        await purge_unreferenced_icons(db, icons)
         return {"msg": "用户已成功删除"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
 
 
@@ -581,22 +647,26 @@ async def get_all_links(
     q: str = "",
     page: int = 1,
     size: int = 7,
-    db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: UserSnapshot = Depends(get_current_admin),
 ):
     try:
-        config = db.query(models.SystemConfig).filter_by(key="risk_keywords").first()
+        config = await db.scalar(select(models.SystemConfig).filter_by(key="risk_keywords"))
         forbidden_str = config.value if (config and config.value) else ""
         keywords = [k.strip() for k in forbidden_str.split(",") if k.strip()]
 
         skip = (page - 1) * size
 
         query = (
-            db.query(
+            select(
                 models.Link.id,
                 models.Link.title,
                 models.Link.url,
                 models.Link.http_title,
+                models.Link.health_status,
+                models.Link.health_code,
+                models.Link.health_checked_at,
+                models.Link.health_failures,
                 models.User.username.label("owner_name"),
             )
             .join(models.Group, models.Link.group_id == models.Group.id)
@@ -604,20 +674,39 @@ async def get_all_links(
         )
 
         if q:
-            query = query.filter(
-                models.Link.title.ilike(f"%{q}%") | models.Link.url.ilike(f"%{q}%")
-            )
-
-        total = query.count()
-        results = query.offset(skip).limit(size).all()
+            # 使用 FTS5 索引，按相关度排序；同时会匹配网页标题
+            query = search_links(query, q)
+
+        total = await db.scalar(count_of(query))
+        results = (await db.execute(query.order_by(models.Link.id).offset(skip).limit(size))).all()
+
+        # 跳转后的最终地址来自共享的 URL 元数据，一并纳入风险关键词检查
+        url_keys = {r.id: canonicalize_url(r.url) for r in results}
+        metadata = {
+            meta.url_key: meta
+            for meta in (
+                await db.scalars(
+                    select(models.UrlMetadata).where(
+                        models.UrlMetadata.url_key.in_(set(url_keys.values()))
+                    )
+                )
+            ).all()
+        }
 
         items = []
         for r in results:
             h_title = r.http_title or ""
             u_title = r.title or ""
             u_url = r.url.lower()
+            meta = metadata.get(url_keys[r.id])
+            # 仅在发生跳转时返回最终地址
+            final_url = (
+                meta.final_url
+                if meta and meta.final_url and canonicalize_url(meta.final_url) != url_keys[r.id]
+                else None
+            )
 
-            check_pool = f"{r.title}{r.url}{r.http_title or ''}".lower()
+            check_pool = f"{r.title}{r.url}{r.http_title or ''}{final_url or ''}".lower()
 
             is_risk = (
                 any(word.lower() in check_pool for word in keywords)
@@ -631,6 +720,12 @@ async def get_all_links(
                     "title": r.title,
                     "url": r.url,
                     "http_title": r.http_title,
+                    "final_url": final_url,
+                    "http_status": meta.status_code if meta else None,
+                    "health_status": r.health_status,
+                    "health_code": r.health_code,
+                    "health_checked_at": r.health_checked_at,
+                    "health_failures": r.health_failures or 0,
                     "owner": r.owner_name,
                     "risk_score": "high" if is_risk else "normal",
                 }
@@ -649,21 +744,21 @@ async def get_all_links(
 
 @router.get("/config/risk-keywords")
 async def get_risk_keywords(
-    db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: UserSnapshot = Depends(get_current_admin),
 ):
-    config = db.query(models.SystemConfig).filter_by(key="risk_keywords").first()
+    config = await db.scalar(select(models.SystemConfig).filter_by(key="risk_keywords"))
     return {"keywords": config.value if config else ""}
 
 
 @router.post("/config/risk-keywords")
 async def update_risk_keywords(
     payload: dict,
-    db: Session = Depends(get_db),
-    current_admin: models.User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    current_admin: UserSnapshot = Depends(get_current_admin),
 ):
     new_value = payload.get("keywords", "")
-    config = db.query(models.SystemConfig).filter_by(key="risk_keywords").first()
+    config = await db.scalar(select(models.SystemConfig).filter_by(key="risk_keywords"))
 
     if config:
         config.value = new_value
@@ -672,26 +767,31 @@ async def update_risk_keywords(
         db.add(config)
 
     try:
-        db.commit()
+        await db.commit()
         return {"msg": "策略配置已成功覆写并生效"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"保存失败: {str(e)}")
 
 
 @router.get("/unused-icons")
 async def get_unused_icons(
-    db: Session = Depends(get_db), admin: models.User = Depends(get_current_admin)
+    db: AsyncSession = Depends(get_async_db), admin: UserSnapshot = Depends(get_current_admin)
 ):
-    used_icons = db.query(models.Link.icon).filter(models.Link.icon != None).all()
-    used_filenames = {os.path.basename(icon[0]) for icon in used_icons}
+    used_icons = await db.scalars(select(models.IconRef.icon))
+    used_filenames = {os.path.basename(icon) for icon in used_icons}
 
     unused_list = []
     if not os.path.exists(ICONS_DIR):
         return []
 
     for filename in os.listdir(ICONS_DIR):
-        if filename != ".gitkeep" and filename not in used_filenames:
+        # 以 . 开头的是 .gitkeep 和正在写入的临时文件；缩略图随原图一起清理，不单独列出
+        if (
+            not filename.startswith(".")
+            and filename not in used_filenames
+            and not VARIANT_NAME_RE.fullmatch(filename)
+        ):
             file_path = os.path.join(ICONS_DIR, filename)
             if os.path.isfile(file_path):
                 stats = os.stat(file_path)
@@ -711,19 +811,22 @@ async def get_unused_icons(
 @router.delete("/unused-icons")
 async def delete_unused_icons(
     payload: dict, 
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(get_current_admin),
 ):
     filenames = payload.get("filenames", [])
     success_count = 0
+    used_filenames = {
+        os.path.basename(icon) for icon in await db.scalars(select(models.IconRef.icon))
+    }
 
     for name in filenames:
         safe_name = os.path.basename(name)
         file_path = os.path.join(ICONS_DIR, safe_name)
 
-        if os.path.exists(file_path):
+        if safe_name not in used_filenames and os.path.exists(file_path):
             try:
-                os.remove(file_path)
+                remove_icon_files(safe_name)
                 success_count += 1
             except Exception as e:
                 print(f"删除失败 {safe_name}: {e}")
@@ -733,21 +836,21 @@ async def delete_unused_icons(
 
 @router.get("/config/custom-code")
 async def get_custom_code(
-    db: Session = Depends(get_db),
-    admin: models.User = Depends(get_current_admin)
+    db: AsyncSession = Depends(get_async_db),
+    admin: UserSnapshot = Depends(get_current_admin)
 ):
     
-    configs = db.query(models.SystemConfig).filter(
+    configs = (await db.scalars(select(models.SystemConfig).where(
         models.SystemConfig.key.in_(["custom_styles", "custom_scripts"])
-    ).all()
+    ))).all()
     
     return {c.key: c.value for c in configs}
 
 @router.post("/config/custom-code")
 async def save_custom_code(
     payload: dict, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_admin)
 ):
     if current_user.id != 1:
         raise HTTPException(
@@ -757,11 +860,11 @@ async def save_custom_code(
     
     for key, value in payload.items():
         if key in ["custom_styles", "custom_scripts"]:
-            config = db.query(models.SystemConfig).filter(models.SystemConfig.key == key).first()
+            config = await db.scalar(select(models.SystemConfig).where(models.SystemConfig.key == key))
             if config:
                 config.value = value
             else:
                 db.add(models.SystemConfig(key=key, value=value))
     
-    db.commit()
+    await db.commit()
     return {"msg": "保存成功"}
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_current_user, get_current_user_model, get_user_by_username
 from app.schemas.user import UserRegister, UserOut, UserUpdate
 from app.core import security, config
+from app.core.user_cache import UserSnapshot, user_cache
 from app import models
 from PIL import Image, UnidentifiedImageError
 import io
@@ -25,52 +27,57 @@ router = APIRouter(tags=["认证"])
 
 
 @router.post("/api/register")
-async def register(user_in: UserRegister, db: Session = Depends(get_db)):
-    user_count = db.query(models.User).count()
+async def register(user_in: UserRegister, db: AsyncSession = Depends(get_async_db)):
+    user_count = await db.scalar(select(func.count()).select_from(models.User))
 
     if user_count > 0:
-        reg_config = (
-            db.query(models.SystemConfig)
-            .filter(models.SystemConfig.key == "registration_open")
-            .first()
+        reg_config = await db.scalar(
+            select(models.SystemConfig)
+            .where(models.SystemConfig.key == "registration_open")
         )
         if reg_config and reg_config.value == "false":
             raise HTTPException(status_code=403, detail="管理员已关闭注册功能")
 
-    if db.query(models.User).filter(models.User.username == user_in.username).first():
+    if await get_user_by_username(db, user_in.username):
         raise HTTPException(status_code=400, detail="用户名已被占用")
 
+    # 先结束只读事务，哈希排队期间不占用数据库连接
+    await db.commit()
+    hashed_password = await security.get_password_hash_async(user_in.password)
+
     try:
         new_user = models.User(
             username=user_in.username,
-            hashed_password=security.get_password_hash(user_in.password),
+            hashed_password=hashed_password,
             is_admin=(user_count == 0),
             custom_bg="/static/default_bg.jpg",
         )
         db.add(new_user)
-        db.flush()
+        await db.flush()
 
         default_group = models.Group(name="默认分组", order=0, user_id=new_user.id)
         db.add(default_group)
 
-        db.commit()
+        await db.commit()
         return {"msg": "注册成功并已创建默认分组"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"注册失败: {str(e)}")
 
 
 @router.post("/api/login")
 async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
-    user = (
-        db.query(models.User).filter(models.User.username == form_data.username).first()
-    )
-    if not user or not security.verify_password(
-        form_data.password, user.hashed_password
-    ):
+    user = await get_user_by_username(db, form_data.username)
+    await db.commit()
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await security.verify_and_update_password_async(
+            form_data.password, user.hashed_password
+        )
+    if not verified:
         raise HTTPException(status_code=400, detail="用户名或密码错误")
 
     if not user.is_active:
@@ -79,20 +86,25 @@ async def login(
             detail="您的账号已被管理员禁用，请联系管理人员。"
         )    
 
+    if new_hash:
+        # 哈希方案或成本参数已调整，登录成功时顺带升级旧哈希
+        user.hashed_password = new_hash
+        await db.commit()
+
     token = security.create_access_token(data={"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.get("/api/user/me", response_model=UserOut)
-async def get_me(current_user: models.User = Depends(get_current_user)):
+async def get_me(current_user: UserSnapshot = Depends(get_current_user)):
 
     return current_user
 
 @router.put("/api/user/me")
 async def update_me(
     obj_in: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_model)
 ):
     update_data = obj_in.model_dump(exclude_unset=True)
     
@@ -100,8 +112,9 @@ async def update_me(
         setattr(current_user, field, update_data[field])
     
     db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    user_cache.invalidate(current_user.id)
     
     return current_user
 
@@ -109,8 +122,8 @@ async def update_me(
 @router.post("/api/upload-bg")
 async def upload_background(
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_model),
+    db: AsyncSession = Depends(get_async_db),
 ):
 
     if not file.content_type.startswith("image/"):
@@ -164,7 +177,8 @@ async def upload_background(
 
     current_user.custom_bg = relative_path
 
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(current_user.id)
 
     return {
         "msg": "背景更新成功",
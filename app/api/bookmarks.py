@@ -0,0 +1,243 @@
+import os
+from typing import AsyncIterator, Literal
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.api.deps import get_async_db, get_current_user
+from app.core.bookmarks import (
+    Bookmark,
+    BookmarkFormatError,
+    NetscapeReader,
+    export_json,
+    export_netscape,
+    parse_json_bookmarks,
+)
+from app.core.icons import HASHED_NAME_RE, ICON_URL_PREFIX, icon_file_path
+from app.core.ordering import ORDER_GAP, next_group_order
+from app.core.favicons import favicon_cache
+from app.core.title_queue import STATUS_PENDING, enqueue_title_jobs, title_queue
+from app.core.url_metadata import url_host
+from app.core.user_cache import UserSnapshot
+from app.database import AsyncSessionLocal
+
+router = APIRouter(prefix="/api/bookmarks", tags=["书签导入导出"])
+
+MAX_IMPORT_SIZE = 20 * 1024 * 1024  # 20MB
+READ_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 500
+EXPORT_FLUSH_SIZE = 64 * 1024
+
+
+class BookmarkImporter:
+    """在同一事务内按分组名归并书签，攒满一批后多行 INSERT 写入"""
+
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.group_ids: dict[str, int] = {}
+        self.next_order: dict[int, int] = {}
+        self.existing: set[tuple[int, str]] = set()
+        self.next_group_order = ORDER_GAP
+        self.pending: list[Bookmark] = []
+        self.groups_created = 0
+        self.links_created = 0
+        self.hosts: set[str] = set()
+        self.duplicates = 0
+
+    async def load(self) -> None:
+        groups = (
+            await self.db.execute(
+                select(models.Group.id, models.Group.name)
+                .where(models.Group.user_id == self.user_id)
+                .order_by(models.Group.order.asc(), models.Group.id.asc())
+            )
+        ).all()
+        for group_id, name in groups:
+            self.group_ids.setdefault(name, group_id)
+            self.next_order[group_id] = ORDER_GAP
+        self.next_group_order = await next_group_order(self.db, self.user_id)
+
+        links = await self.db.execute(
+            select(models.Link.group_id, models.Link.url, models.Link.order)
+            .join(models.Group)
+            .where(models.Group.user_id == self.user_id)
+        )
+        for group_id, url, order in links:
+            self.existing.add((group_id, url))
+            self.next_order[group_id] = max(self.next_order[group_id], (order or 0) + ORDER_GAP)
+
+    async def add(self, bookmarks: list[Bookmark]) -> None:
+        self.pending.extend(bookmarks)
+        if len(self.pending) >= IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def group_id(self, name: str) -> int:
+        group_id = self.group_ids.get(name)
+        if group_id is None:
+            group = models.Group(name=name, user_id=self.user_id, order=self.next_group_order)
+            self.db.add(group)
+            await self.db.flush()
+            group_id = self.group_ids[name] = group.id
+            self.next_order[group_id] = ORDER_GAP
+            self.next_group_order += ORDER_GAP
+            self.groups_created += 1
+        return group_id
+
+    async def flush(self) -> None:
+        rows = []
+        for bookmark in self.pending:
+            group_id = await self.group_id(bookmark.group)
+            if (group_id, bookmark.url) in self.existing:
+                self.duplicates += 1
+                continue
+            self.existing.add((group_id, bookmark.url))
+            rows.append({
+                "title": bookmark.title,
+                "url": bookmark.url,
+                "host": url_host(bookmark.url),
+                "icon": importable_icon(bookmark.icon),
+                "group_id": group_id,
+                "order": self.next_order[group_id],
+                "title_status": STATUS_PENDING,
+            })
+            self.next_order[group_id] += ORDER_GAP
+        self.pending = []
+        if not rows:
+            return
+
+        # executemany 形式由 SQLAlchemy 拼成多行 VALUES，语句只编译一次
+        created = (
+            await self.db.execute(
+                insert(models.Link).returning(models.Link.id, models.Link.url), rows
+            )
+        ).all()
+        await enqueue_title_jobs(self.db, [(link_id, url) for link_id, url in created])
+        self.links_created += len(created)
+        self.hosts.update(row["host"] for row in rows if row["host"])
+
+
+def importable_icon(icon: str | None) -> str | None:
+    """只保留外部图标地址和本机已存在的本地图标"""
+    if not icon:
+        return None
+    if icon.startswith(("http://", "https://")):
+        return icon
+    if (
+        icon.startswith(ICON_URL_PREFIX)
+        and HASHED_NAME_RE.fullmatch(icon[len(ICON_URL_PREFIX):])
+        and os.path.exists(icon_file_path(icon))
+    ):
+        return icon
+    return None
+
+
+async def read_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    received = 0
+    while chunk := await file.read(READ_CHUNK_SIZE):
+        received += len(chunk)
+        if received > MAX_IMPORT_SIZE:
+            raise HTTPException(status_code=400, detail="书签文件不能超过20MB")
+        yield chunk
+
+
+@router.post("/import")
+async def import_bookmarks(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user),
+):
+    importer = BookmarkImporter(db, user.id)
+    await importer.load()
+
+    chunks = read_upload(file)
+    first = await anext(chunks, b"")
+    if (file.filename or "").lower().endswith(".json") or first.lstrip().startswith(b"{"):
+        data = first + b"".join([chunk async for chunk in chunks])
+        try:
+            bookmarks, skipped = parse_json_bookmarks(data)
+        except BookmarkFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await importer.add(bookmarks)
+    else:
+        reader = NetscapeReader()
+        await importer.add(reader.feed(first))
+        async for chunk in chunks:
+            await importer.add(reader.feed(chunk))
+        await importer.add(reader.close())
+        skipped = reader.parser.skipped
+
+    await importer.flush()
+    await db.commit()
+    if importer.links_created:
+        favicon_cache.forget_unlinked(importer.hosts)
+        title_queue.notify()
+
+    return {
+        "msg": "导入完成",
+        "groups_created": importer.groups_created,
+        "links_created": importer.links_created,
+        "duplicates": importer.duplicates,
+        "skipped": skipped,
+    }
+
+
+async def export_rows(user_id: int):
+    # 响应流在请求处理函数返回后才开始发送，需要单独的数据库会话
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(
+                models.Group.id,
+                models.Group.name,
+                models.Link.title,
+                models.Link.url,
+                models.Link.icon,
+            )
+            .outerjoin(models.Link, models.Link.group_id == models.Group.id)
+            .where(models.Group.user_id == user_id)
+            .order_by(
+                models.Group.order.asc(),
+                models.Group.id.asc(),
+                models.Link.order.asc(),
+                models.Link.id.asc(),
+            )
+            .execution_options(yield_per=IMPORT_BATCH_SIZE)
+        )
+        async for row in result:
+            yield row
+
+
+async def buffered(parts: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    buffer = []
+    size = 0
+    async for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= EXPORT_FLUSH_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+@router.get("/export")
+async def export_bookmarks(
+    format: Literal["html", "json"] = Query("html"),
+    user: UserSnapshot = Depends(get_current_user),
+):
+    if format == "json":
+        parts = export_json(export_rows(user.id))
+        media_type = "application/json"
+    else:
+        parts = export_netscape(export_rows(user.id))
+        media_type = "text/html; charset=utf-8"
+
+    return StreamingResponse(
+        buffered(parts),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="onepanel-bookmarks.{format}"'},
+    )
@@ -0,0 +1,129 @@
+import orjson
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.api.deps import get_async_db, get_optional_user
+from app.core.data_versions import (
+    CONFIG_SCOPE,
+    PUBLIC_SCOPE,
+    etag_matches,
+    get_versions,
+    make_etag,
+    user_scope,
+)
+from app.core.dashboard import (
+    PAYLOAD_FORMAT,
+    OrjsonResponse,
+    RenderedCache,
+    load_groups,
+    rendered_response,
+)
+from app.core.index_page import TOKEN_COOKIE, index_pages, index_template
+from app.core.user_cache import UserSnapshot
+from app.schemas.user import UserOut
+
+router = APIRouter(prefix="/api", tags=["首页数据"])
+
+GUEST_SCOPES = [CONFIG_SCOPE, PUBLIC_SCOPE]
+# 内容随登录用户变化，只允许浏览器私有缓存，每次用 ETag 校验
+PRIVATE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+# 服务端渲染的首页按 cookie 中的令牌识别用户
+INDEX_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Cookie"}
+
+
+async def build_bootstrap(db: AsyncSession, user_id: int | None) -> dict:
+    config_rows = await db.execute(
+        select(models.SystemConfig.key, models.SystemConfig.value)
+    )
+    initialized = await db.scalar(
+        select(models.User.id).where(models.User.is_admin == True).limit(1)
+    )
+
+    # 用户快照可能滞后于其他进程的修改，这里以数据库为准，保证内容与版本号一致
+    user = await db.get(models.User, user_id) if user_id else None
+    if user is not None and not user.is_active:
+        user = None
+
+    if user is None:
+        groups = await load_groups(db, None)
+    else:
+        hidden_ids = [int(item) for item in (user.hidden_groups or "").split(",") if item.isdigit()]
+        groups = await load_groups(db, user.id, include_public=1 not in hidden_ids or user.id == 1)
+
+    return {
+        "initialized": bool(initialized),
+        "config": {key: value for key, value in config_rows},
+        "user": UserOut.model_validate(user).model_dump() if user is not None else None,
+        "groups": groups,
+    }
+
+
+async def build_guest_bootstrap(db: AsyncSession) -> dict:
+    payload = await build_bootstrap(db, None)
+    payload["versions"] = await get_versions(db, GUEST_SCOPES)
+    return payload
+
+
+guest_bootstrap_cache = RenderedCache("b", GUEST_SCOPES, build_guest_bootstrap)
+
+
+@router.get("/bootstrap", response_class=OrjsonResponse)
+async def get_bootstrap(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot | None = Depends(get_optional_user),
+):
+    """首页首屏所需的系统配置、当前用户与可见分组（含链接），一次请求返回
+
+    ETag 由身份与相关范围的版本号组成，数据未变化时只读取 data_versions 即可返回 304。
+    """
+    if current_user is not None and not current_user.is_active:
+        current_user = None
+    user_id = current_user.id if current_user else None
+    if user_id is None:
+        # 访客看到的内容对所有人相同，使用预渲染缓存
+        payload = await guest_bootstrap_cache.get(db)
+        await db.commit()
+        return rendered_response(request, payload, PRIVATE_HEADERS)
+
+    scopes = [*GUEST_SCOPES, user_scope(user_id)]
+    # 版本号与内容在同一个读事务中查询，看到的是同一份快照
+    versions = await get_versions(db, scopes)
+    etag = make_etag(f"b{PAYLOAD_FORMAT}", user_id, versions)
+    headers = {"ETag": etag, **PRIVATE_HEADERS}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    payload = await build_bootstrap(db, user_id)
+    payload["versions"] = versions
+    return OrjsonResponse(payload, headers=headers)
+
+
+async def render_index(request: Request, db: AsyncSession) -> Response:
+    """服务端渲染首页，内联的数据与 /api/bootstrap 相同，按用户与版本号缓存"""
+    current_user = await get_optional_user(request.cookies.get(TOKEN_COOKIE), db)
+    if current_user is not None and not current_user.is_active:
+        current_user = None
+    user_id = current_user.id if current_user else None
+    template = index_template.load()
+
+    guest = None
+    if user_id is None:
+        guest = await guest_bootstrap_cache.get(db)
+        versions = guest.versions
+    else:
+        versions = await get_versions(db, [*GUEST_SCOPES, user_scope(user_id)])
+
+    etag = index_pages.etag(template, user_id, versions)
+    page = index_pages.get(user_id, etag)
+    if page is None:
+        if guest is not None:
+            payload = orjson.loads(guest.body)
+        else:
+            payload = await build_bootstrap(db, user_id)
+            payload["versions"] = versions
+        page = index_pages.put(user_id, etag, versions, template.render(payload))
+    await db.commit()
+    return rendered_response(request, page, INDEX_HEADERS, media_type="text/html; charset=utf-8")
@@ -1,23 +1,31 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from app.database import SessionLocal
+from app.database import get_async_db
 from app.core import config
+from app.core.user_cache import UserSnapshot, user_cache
 from app import models
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login", auto_error=False)
 admin_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/admin/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
+
+async def get_user_snapshot(db: AsyncSession, username: str) -> UserSnapshot | None:
+    snapshot = user_cache.get(username)
+    if snapshot is None:
+        user = await get_user_by_username(db, username)
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_model(user)
+        user_cache.put(snapshot)
+    return snapshot
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token 无效或已过期",
@@ -31,21 +39,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await get_user_snapshot(db, username)
     if user is None:
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(status_code=403, detail="账户已被禁用")
     return user
 
-async def admin_required(current_user: models.User = Depends(get_current_user)):
+async def get_current_user_model(
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """需要修改当前用户时使用，返回绑定到本次请求会话的 ORM 对象"""
+    user = await db.get(models.User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Token 无效或已过期")
+    return user
+
+async def admin_required(current_user: UserSnapshot = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="权限不足，仅限管理员")
     return current_user
 
 async def get_optional_user(
     token: str = Depends(optional_oauth2_scheme), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not token:
         return None
@@ -54,11 +72,11 @@ async def get_optional_user(
         username: str = payload.get("sub")
         if username is None:
             return None
-        return db.query(models.User).filter(models.User.username == username).first()
+        return await get_user_snapshot(db, username)
     except JWTError:
         return None
     
-async def get_current_admin(token: str = Depends(admin_oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_admin(token: str = Depends(admin_oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     admin_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="管理员 Token 无效",
@@ -71,9 +89,9 @@ async def get_current_admin(token: str = Depends(admin_oauth2_scheme), db: Sessi
     except JWTError:
         raise admin_exception
 
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await get_user_snapshot(db, username)
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="非管理员账户")
     if not user.is_active:
         raise HTTPException(status_code=403, detail="管理账户已禁用")
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.api.deps import get_async_db
+from app.core import config
+from app.core.data_versions import etag_matches
+from app.core.favicons import favicon_cache, host_in_links, normalise_host
+
+router = APIRouter(prefix="/api/favicons", tags=["站点图标"])
+
+NEGATIVE_CACHE_CONTROL = "public, max-age=3600"
+# 主机名可能很快被添加为链接，浏览器不缓存
+UNLINKED_CACHE_CONTROL = "no-store"
+
+
+@router.get("/{host}")
+async def get_favicon(host: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    hostname = normalise_host(host)
+    if hostname is None:
+        raise HTTPException(status_code=400, detail="无效的主机名")
+
+    template = await db.scalar(
+        select(models.SystemConfig.value).where(models.SystemConfig.key == "favicon_api")
+    )
+    if not template or "${hostname}" not in template:
+        raise HTTPException(status_code=404, detail="未配置站点图标服务")
+
+    entry = await favicon_cache.cached(template, hostname)
+    if entry is None:
+        # 只为已保存链接中的站点抓取图标，避免任意主机名写满缓存目录
+        if favicon_cache.is_unlinked(hostname):
+            return Response(status_code=404, headers={"Cache-Control": UNLINKED_CACHE_CONTROL})
+        if not await host_in_links(db, hostname):
+            favicon_cache.mark_unlinked(hostname)
+            return Response(status_code=404, headers={"Cache-Control": UNLINKED_CACHE_CONTROL})
+        # 抓取第三方服务期间不占用数据库连接
+        await db.commit()
+        entry = await favicon_cache.get(template, hostname)
+    if not entry.found:
+        return Response(status_code=404, headers={"Cache-Control": NEGATIVE_CACHE_CONTROL})
+
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={config.FAVICON_CACHE_TTL}",
+    }
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.data, media_type=entry.content_type, headers=headers)
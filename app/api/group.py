@@ -1,129 +1,186 @@
+import asyncio
+import hashlib
 from typing import Any
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models
-from app.api.deps import get_current_user, get_db
-from app.schemas.link import GroupOut
+from app.api.deps import get_async_db, get_current_user, get_current_user_model, get_optional_user
+from app.core import config
+from app.core.dashboard import (
+    PAYLOAD_FORMAT,
+    OrjsonResponse,
+    load_group_options,
+    load_groups,
+    public_groups_cache,
+    rendered_response,
+)
+from app.core.data_versions import etag_matches, make_etag, viewer_versions
+from app.core.icon_bundles import bundle_icons, bundle_signature, load_group_bundle
+from app.core.icons import purge_unreferenced_icons
+from app.core.ordering import next_group_order, reorder_groups_stmt
+from app.core.user_cache import UserSnapshot, user_cache
+from app.schemas.link import DashboardGroupOut, GroupOptionOut, GroupOut
 
 router = APIRouter(prefix="/api/groups", tags=["分组管理"])
 
 
-@router.get("/")
+@router.get("/", response_model=list[DashboardGroupOut], response_class=OrjsonResponse)
 async def get_my_groups(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
-    hidden_ids = [int(item) for item in current_user.hidden_groups.split(",") if item.isdigit()]
+    # 只读版本号即可判断分组和链接是否变化；返回的字段都计入版本号，使用强 ETag
+    versions = await viewer_versions(db, current_user.id)
+    etag = make_etag(f"g{PAYLOAD_FORMAT}", current_user.id, versions)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
 
-    public_group = (
-        db.query(models.Group)
-        .options(joinedload(models.Group.links))
-        .filter(models.Group.id == 1, models.Group.user_id == 1)
-        .first()
+    hidden_ids = [int(item) for item in current_user.hidden_groups.split(",") if item.isdigit()]
+    groups = await load_groups(
+        db,
+        current_user.id,
+        include_public=1 not in hidden_ids or current_user.id == 1,
+        with_http_title=True,
     )
+    return OrjsonResponse(groups, headers=headers)
 
-    user_groups = (
-        db.query(models.Group)
-        .options(joinedload(models.Group.links))
-        .filter(models.Group.user_id == current_user.id, models.Group.id != 1)
-        .order_by(models.Group.order.asc())
-        .all()
-    )
 
-    all_groups = []
-    if public_group and (public_group.id not in hidden_ids or current_user.id == 1):
-        public_group.is_readonly = True
-        all_groups.append(public_group)
+def public_cache_control() -> str:
+    if config.PUBLIC_GROUPS_MAX_AGE > 0:
+        return f"public, max-age={config.PUBLIC_GROUPS_MAX_AGE}"
+    return "public, no-cache"
 
-    all_groups.extend(user_groups)
-    return all_groups
 
+@router.get("/public", response_model=list[DashboardGroupOut])
+async def get_public_groups(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # 访客视图对所有人相同，直接返回按版本号缓存的预渲染结果
+    payload = await public_groups_cache.get(db)
+    await db.commit()
+    return rendered_response(request, payload, {"Cache-Control": public_cache_control()})
 
-@router.get("/public")
-async def get_public_groups(db: Session = Depends(get_db)):
-    return (
-        db.query(models.Group)
-        .options(joinedload(models.Group.links))
-        .filter(models.Group.id == 1, models.Group.user_id == 1)
-        .all()
+
+@router.get("/icon-bundle")
+async def get_icon_bundle(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot | None = Depends(get_optional_user),
+):
+    """返回可见分组的图标 data URI：{分组 id: {图标地址: data URI}}"""
+    if current_user:
+        hidden_ids = [int(item) for item in current_user.hidden_groups.split(",") if item.isdigit()]
+        condition = models.Group.user_id == current_user.id
+        if 1 not in hidden_ids or current_user.id == 1:
+            condition = condition | (models.Group.id == 1)
+    else:
+        condition = models.Group.id == 1
+
+    rows = (
+        await db.execute(
+            select(models.Link.group_id, models.Link.icon)
+            .join(models.Group)
+            .where(condition, models.Link.icon.like("/static/icons/%"))
+        )
+    ).all()
+    await db.commit()
+
+    group_icons: dict[int, list[str]] = {}
+    for group_id, icon in rows:
+        group_icons.setdefault(group_id, []).append(icon)
+    signatures = {}
+    for group_id, icons in sorted(group_icons.items()):
+        icons = bundle_icons(icons)
+        if icons:
+            signatures[group_id] = (bundle_signature(icons), icons)
+
+    etag = '"{}"'.format(
+        hashlib.sha256(
+            ",".join(f"{group_id}:{sig}" for group_id, (sig, _) in signatures.items()).encode()
+        ).hexdigest()[:32]
+    )
+    # 内容随用户变化，只允许浏览器私有缓存，每次用 ETag 校验
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    parts = []
+    for group_id, (signature, icons) in signatures.items():
+        bundle = await asyncio.to_thread(load_group_bundle, signature, icons)
+        parts.append(f'"{group_id}":'.encode() + bundle)
+    return Response(
+        content=b"{" + b",".join(parts) + b"}", media_type="application/json", headers=headers
     )
 
 
-@router.get("/selectable")
+@router.get("/selectable", response_model=list[GroupOptionOut], response_class=OrjsonResponse)
 async def get_selectable_groups(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
-    return (
-        db.query(models.Group)
-        .filter(models.Group.user_id == current_user.id)
-        .order_by(models.Group.order.asc())
-        .all()
-    )
+    return OrjsonResponse(await load_group_options(db, current_user.id))
 
 
 @router.post("/", response_model=GroupOut)
 async def create_group(
     name: str | None = Query(None),
     payload: dict[str, Any] | None = Body(None),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
     group_name = (payload or {}).get("name", name)
     if not group_name or not str(group_name).strip():
         raise HTTPException(status_code=422, detail="暂无分组信息")
 
-    max_order = db.query(models.Group).filter(models.Group.user_id == current_user.id).count()
     new_group = models.Group(
         name=str(group_name).strip(),
         user_id=current_user.id,
-        order=max_order,
+        order=await next_group_order(db, current_user.id),
     )
     db.add(new_group)
-    db.commit()
-    db.refresh(new_group)
+    await db.commit()
+    await db.refresh(new_group, ["links"])
     return new_group
 
 
 @router.put("/reorder")
 async def reorder_groups(
     group_ids: list[int],
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
-    for index, group_id in enumerate(group_ids):
-        (
-            db.query(models.Group)
-            .filter(models.Group.id == group_id, models.Group.user_id == current_user.id)
-            .update({"order": index})
-        )
+    if group_ids:
+        await db.execute(reorder_groups_stmt(current_user.id, group_ids))
 
-    db.commit()
-    db.expire_all()
+    await db.commit()
     return {"status": "success"}
 
 
 @router.delete("/{group_id}")
 async def delete_group(
     group_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
     if group_id == 1 and current_user.id != 1:
         raise HTTPException(status_code=403, detail="公共分组禁止修改")
 
-    group = (
-        db.query(models.Group)
-        .filter(models.Group.id == group_id, models.Group.user_id == current_user.id)
-        .first()
+    group = await db.scalar(
+        select(models.Group)
+        .where(models.Group.id == group_id, models.Group.user_id == current_user.id)
     )
     if not group:
         raise HTTPException(status_code=404, detail="分组不存在")
 
-    db.delete(group)
-    db.commit()
+    icons = (
+        await db.scalars(select(models.Link.icon).where(models.Link.group_id == group_id))
+    ).all()
+    await db.delete(group)
+    await db.commit()
+    await purge_unreferenced_icons(db, icons)
     return {"msg": "分组及其链接已删除"}
 
 
@@ -132,16 +189,15 @@ async def update_group(
     group_id: int,
     name: str | None = Query(None),
     payload: dict[str, Any] | None = Body(None),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user),
 ):
     if group_id == 1 and current_user.id != 1:
         raise HTTPException(status_code=403, detail="公共分组禁止修改")
 
-    group = (
-        db.query(models.Group)
-        .filter(models.Group.id == group_id, models.Group.user_id == current_user.id)
-        .first()
+    group = await db.scalar(
+        select(models.Group)
+        .where(models.Group.id == group_id, models.Group.user_id == current_user.id)
     )
     if not group:
         raise HTTPException(status_code=404, detail="分组不存在")
@@ -151,15 +207,15 @@ async def update_group(
         raise HTTPException(status_code=422, detail="暂无分组信息")
 
     group.name = str(group_name).strip()
-    db.commit()
+    await db.commit()
     return {"msg": "修改成功", "name": group.name}
 
 
 @router.post("/{group_id}/toggle-visibility")
 async def toggle_group_visibility(
     group_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_model),
 ):
     hidden_raw = current_user.hidden_groups or ""
     hidden_list = [item for item in hidden_raw.split(",") if item.strip()]
@@ -171,15 +227,17 @@ async def toggle_group_visibility(
         hidden_list.append(group_id_str)
 
     current_user.hidden_groups = ",".join(hidden_list)
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(current_user.id)
     return {"hidden_groups": current_user.hidden_groups}
 
 
 @router.post("/reset-hidden")
 async def reset_hidden_groups(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_model),
 ):
     current_user.hidden_groups = ""
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(current_user.id)
     return {"msg": "所有分组已恢复显示"}
@@ -1,19 +1,22 @@
 from fastapi import Query, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
-from app.api.deps import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_async_db
 from app.core import security
 from app import models
 
 router = APIRouter(prefix="/api/system", tags=["系统初始化"])
 
 @router.get("/config")
-async def get_public_config(db: Session = Depends(get_db)):
-    configs = db.query(models.SystemConfig).all()
+async def get_public_config(db: AsyncSession = Depends(get_async_db)):
+    configs = (await db.scalars(select(models.SystemConfig))).all()
     return {item.key: item.value for item in configs}
 
 @router.get("/status")
-async def get_system_status(db: Session = Depends(get_db)):
-    admin_exists = db.query(models.User).filter(models.User.is_admin == True).first()
+async def get_system_status(db: AsyncSession = Depends(get_async_db)):
+    admin_exists = await db.scalar(
+        select(models.User.id).where(models.User.is_admin == True).limit(1)
+    )
     return {"is_initialized": bool(admin_exists), "status": "running"}
 
 
@@ -21,20 +24,24 @@ async def get_system_status(db: Session = Depends(get_db)):
 async def init_admin(
     username: str = Query(...),
     password: str = Query(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    if db.query(models.User).filter(models.User.is_admin == True).first():
+    if await db.scalar(select(models.User.id).where(models.User.is_admin == True).limit(1)):
         raise HTTPException(status_code=400, detail="系统已初始化")
 
+    # 先结束只读事务，哈希排队期间不占用数据库连接
+    await db.commit()
+    hashed_password = await security.get_password_hash_async(password)
+
     try:
         new_admin = models.User(
             username=username,
-            hashed_password=security.get_password_hash(password),
+            hashed_password=hashed_password,
             is_admin=True,
             custom_bg="/static/default_bg.jpg",
         )
         db.add(new_admin)
-        db.flush() 
+        await db.flush() 
 
         default_group = models.Group(
             name="常用链接", 
@@ -43,12 +50,12 @@ async def init_admin(
         )
         db.add(default_group)
 
-        db.commit()
+        await db.commit()
         return {"msg": "初始化成功"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"失败: {str(e)}")
 
     except Exception as e:
-        db.rollback() 
+        await db.rollback() 
         raise HTTPException(status_code=500, detail=f"初始化失败: {str(e)}")
@@ -1,80 +1,167 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from PIL import Image, UnidentifiedImageError
-import io
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 import shutil
-import requests
-import uuid
-import os
-from app.api.deps import get_db, get_current_user, get_optional_user
+from app.api.deps import get_async_db, get_current_user, get_optional_user
 from app.schemas.link import LinkCreate, LinkOut, LinkUpdate
 from app import models
+from app.core.user_cache import UserSnapshot
 from pydantic import BaseModel
 from typing import List
-from app.core.config import ICONS_DIR
-from app.core.crawler import get_remote_http_title
+from app.core.icons import (
+    MAX_FILE_SIZE,
+    IconError,
+    download_icon,
+    icon_variant_urls,
+    purge_unreferenced_icons,
+    store_icon_bytes,
+)
+from app.core.data_versions import etag_matches, make_etag, viewer_versions
+from app.core.favicons import favicon_cache
+from app.core.link_health import link_health
+from app.core.ordering import link_order_at, next_link_order, rebalance_links, reorder_links_stmt
+from app.core.pinyin_index import pinyin_index
+from app.core.search import search_links
+from app.core.title_queue import enqueue_title_job, title_queue
+from app.core.url_metadata import url_host
 
 router = APIRouter(prefix="/api/links", tags=["链接管理"])
 
-ALLOWED_FORMATS = {
-    "JPEG": ".jpg",
-    "PNG": ".png",
-    "GIF": ".gif",
-    "WEBP": ".webp",
-}
-
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-MAX_WIDTH = 4096
-MAX_HEIGHT = 4096
-
 class ReorderSchema(BaseModel):
     link_ids: List[int]
     group_id: int
 
 @router.get("/", response_model=list[LinkOut])
 async def get_links(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_optional_user),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_optional_user),
 ):
     if current_user:
+        versions = await viewer_versions(db, current_user.id)
+        etag = make_etag("l", current_user.id, versions, weak=True)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
         return (
-            db.query(models.Link)
-            .join(models.Group)
-            .filter(
-                (models.Group.user_id == current_user.id) | (models.Group.id == 1)
+            await db.scalars(
+                select(models.Link)
+                .join(models.Group)
+                .where(
+                    (models.Group.user_id == current_user.id) | (models.Group.id == 1)
+                )
+                .order_by(models.Link.order.asc())
             )
-            .order_by(models.Link.order.asc())
-            .all()
-        )
+        ).all()
     return []
 
+@router.get("/search", response_model=list[LinkOut])
+async def search_user_links(
+    q: str = Query("", max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_optional_user),
+):
+    """在可见的链接（自己的分组与公共分组）中搜索标题、URL 和网页标题"""
+    if not q.strip():
+        return []
+
+    visible = models.Group.id == 1
+    if current_user:
+        visible = visible | (models.Group.user_id == current_user.id)
+    query = search_links(select(models.Link).join(models.Group).where(visible), q)
+    return (await db.scalars(query.order_by(models.Link.order.asc()).limit(limit))).all()
+
+@router.get("/autocomplete", response_model=list[LinkOut])
+async def autocomplete_links(
+    q: str = Query("", max_length=100),
+    limit: int = Query(8, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_optional_user),
+):
+    """按拼音、拼音首字母或汉字前缀补全首页可见的链接，隐藏的分组不参与"""
+    if not q.strip():
+        return []
+
+    visible = {1}
+    if current_user:
+        visible.update(await db.scalars(
+            select(models.Group.id).where(models.Group.user_id == current_user.id)
+        ))
+        visible.difference_update(
+            int(group_id) for group_id in current_user.hidden_groups.split(",") if group_id.isdigit()
+        )
+    if not visible:
+        return []
+
+    user_id = current_user.id if current_user else None
+    link_ids = await pinyin_index.lookup(db, user_id, q, visible, limit)
+    if not link_ids:
+        return []
+
+    # 读取版本号之后链接仍可能被修改，以数据库为准再过滤一次
+    links = (await db.scalars(
+        select(models.Link).where(models.Link.id.in_(link_ids), models.Link.group_id.in_(visible))
+    )).all()
+    rank = {link_id: index for index, link_id in enumerate(link_ids)}
+    return sorted(links, key=lambda link: rank[link.id])
+
+@router.put("/reorder")
+async def reorder_links(
+    data: ReorderSchema,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    if data.group_id == 1 and current_user.id != 1:
+        raise HTTPException(status_code=403, detail="无法修改公共分组顺序")
+
+    group_exists = await db.scalar(select(models.Group.id).where(
+        models.Group.id == data.group_id, models.Group.user_id == current_user.id
+    ))
+
+    if not group_exists:
+        raise HTTPException(status_code=403, detail="无权操作该分组")
+
+    if data.link_ids:
+        owned_groups = select(models.Group.id).where(models.Group.user_id == current_user.id)
+        await db.execute(reorder_links_stmt(data.group_id, data.link_ids, owned_groups))
+
+    await db.commit()
+    return {"status": "success"}
+
 @router.post("/", response_model=LinkOut)
 async def add_link(
     link: LinkCreate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user),
 ):
     if link.group_id == 1 and user.id != 1:
         raise HTTPException(status_code=403, detail="无法向公共分组添加内容")
 
-    group = db.query(models.Group).filter(
+    group = await db.scalar(select(models.Group).where(
         models.Group.id == link.group_id, 
         models.Group.user_id == user.id
-    ).first()
+    ))
 
     if not group and not (link.group_id == 1 and user.id == 1):
         raise HTTPException(status_code=403, detail="目标分组不存在或无权操作")
-    
-    remote_title = await get_remote_http_title(link.url)
 
-    link_count = db.query(models.Link).filter(models.Link.group_id == link.group_id).count()
     link_data = link.model_dump()
     link_data.pop("order", None) 
 
-    new_link = models.Link(**link_data, order=link_count, http_title=remote_title)
+    new_link = models.Link(
+        **link_data, host=url_host(link.url), order=await next_link_order(db, link.group_id)
+    )
     db.add(new_link)
-    db.commit()
-    db.refresh(new_link)
+    await enqueue_title_job(db, new_link)
+    await db.commit()
+    await db.refresh(new_link)
+    favicon_cache.forget_unlinked([new_link.host])
+    title_queue.notify()
     return new_link
 
 
@@ -82,43 +169,60 @@ async def add_link(
 async def update_link(
     link_id: int,
     payload: LinkUpdate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user),
 ):
-    link = check_link_permission(db, link_id, user)
+    link = await check_link_permission(db, link_id, user)
 
     if payload.group_id == 1 and user.id != 1:
         raise HTTPException(status_code=403, detail="无法移动到公共分组")
 
-    target_group = (
-        db.query(models.Group)
-        .filter(models.Group.id == payload.group_id, models.Group.user_id == user.id)
-        .first()
+    target_group = await db.scalar(
+        select(models.Group)
+        .where(models.Group.id == payload.group_id, models.Group.user_id == user.id)
     )
     if not target_group and not (payload.group_id == 1 and user.id == 1):
         raise HTTPException(status_code=403, detail="目标分组不存在或无权操作")
 
     old_url = link.url
+    old_icon = link.icon
     link.title = payload.title
     link.url = payload.url
+    link.host = url_host(payload.url)
     link.icon = payload.icon or None
 
     if link.group_id != payload.group_id:
         link.group_id = payload.group_id
-        link.order = db.query(models.Link).filter(models.Link.group_id == payload.group_id).count()
-
-    if old_url != payload.url:
-        link.http_title = await get_remote_http_title(payload.url)
-
-    db.commit()
-    db.refresh(link)
+        link.order = await next_link_order(db, payload.group_id)
+
+    url_changed = old_url != payload.url
+    if url_changed:
+        await enqueue_title_job(db, link)
+        # 旧地址的检查结果不再适用，清空后由巡检尽快重新检查
+        link.health_status = None
+        link.health_code = None
+        link.health_latency_ms = None
+        link.health_checked_at = None
+        link.health_failures = 0
+
+    await db.commit()
+    await db.refresh(link)
+    if url_changed:
+        favicon_cache.forget_unlinked([link.host])
+        title_queue.notify()
+    if old_icon != link.icon:
+        await purge_unreferenced_icons(db, [old_icon])
     return link
 
-def check_link_permission(db: Session, link_id: int, user: models.User):
+async def check_link_permission(db: AsyncSession, link_id: int, user: UserSnapshot):
     if link_id is None:
         return True
         
-    link = db.query(models.Link).join(models.Group).filter(models.Link.id == link_id).first()
+    link = await db.scalar(
+        select(models.Link)
+        .options(joinedload(models.Link.group))
+        .where(models.Link.id == link_id)
+    )
     if not link:
         raise HTTPException(status_code=404, detail="链接不存在")
         
@@ -129,21 +233,12 @@ def check_link_permission(db: Session, link_id: int, user: models.User):
         raise HTTPException(status_code=403, detail="无权操作此链接的图标")
     return link
 
-def cleanup_old_icon_file(icon_path: str):
-    if icon_path and icon_path.startswith("/static/icons/"):
-        relative_path = icon_path.lstrip("/")
-        if os.path.exists(relative_path):
-            try:
-                os.remove(relative_path)
-            except Exception as e:
-                print(f"清理旧图标文件失败: {e}")
-
 @router.post("/upload-icon")
 async def upload_link_icon(
     file: UploadFile = File(...),
     link_id: int = Form(None),
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user)
 ):
 
     if not file.content_type.startswith("image/"):
@@ -154,155 +249,115 @@ async def upload_link_icon(
     if len(content) > MAX_FILE_SIZE:
         raise HTTPException(400, "图片不能超过5MB")
 
-    try:
-        image = Image.open(io.BytesIO(content))
-        image.verify()
-    except (UnidentifiedImageError, OSError):
-        raise HTTPException(400, "上传的文件不是有效图片")
-
-    image = Image.open(io.BytesIO(content))
-
-    if image.width > MAX_WIDTH or image.height > MAX_HEIGHT:
-        raise HTTPException(400, "图片尺寸过大")
-
-    if image.format not in ALLOWED_FORMATS:
-        raise HTTPException(400, "仅支持 JPG、PNG、GIF、WEBP 图片")
-
     link_obj = None
     if link_id:
-        link_obj = check_link_permission(db, link_id, user)
-        if link_obj and link_obj.icon:
-            cleanup_old_icon_file(link_obj.icon)
+        link_obj = await check_link_permission(db, link_id, user)
 
-    ext = ALLOWED_FORMATS[image.format]
-    filename = f"{uuid.uuid4()}{ext}"
-    save_path = os.path.join(ICONS_DIR, filename)
-    icon_url = f"/static/icons/{filename}"
-
-    if image.mode not in ("RGB", "RGBA"):
-        image = image.convert("RGBA" if image.format == "PNG" else "RGB")
-
-    image.save(save_path)
+    await db.commit()
+    try:
+        icon_url = await store_icon_bytes(content)
+    except IconError as e:
+        raise HTTPException(400, str(e))
 
     if link_obj:
-        link_obj.icon = icon_url
-        db.commit()
+        await replace_link_icon(db, link_obj, icon_url)
 
-    return {"icon_url": icon_url}
+    return {"icon_url": icon_url, "icon_variants": icon_variant_urls(icon_url)}
 
 @router.post("/download-icon")
 async def download_link_icon(
     url: str = Form(...), 
     link_id: int = Form(None), 
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user)
 ):
     
     link_obj = None
     if link_id:
-        link_obj = check_link_permission(db, link_id, user)
-        if link_obj and link_obj.icon:
-            cleanup_old_icon_file(link_obj.icon)
+        link_obj = await check_link_permission(db, link_id, user)
 
+    # 下载期间不占用数据库连接
+    await db.commit()
     try:
-        res = requests.get(url, timeout=5, headers={"User-Agent": "Mozilla/5.0"})
-        res.raise_for_status()
-        
-        content_type = res.headers.get('content-type', '')
-        ext = ".png"
-        if 'jpeg' in content_type: ext = ".jpg"
-        elif 'svg' in content_type: ext = ".svg"
-        elif 'x-icon' in content_type: ext = ".ico"
-
-        filename = f"{uuid.uuid4()}{ext}"
-        save_path = os.path.join(ICONS_DIR, filename)
-        icon_url = f"/static/icons/{filename}"
-        
-        with open(save_path, "wb") as f:
-            f.write(res.content)
+        icon_url = await download_icon(url)
+    except IconError as e:
+        raise HTTPException(400, f"抓取图标失败: {e}")
+
+    if link_obj:
+        await replace_link_icon(db, link_obj, icon_url)
+
+    return {"icon_url": icon_url, "icon_variants": icon_variant_urls(icon_url)}
 
-        if link_obj:
-            link_obj.icon = icon_url
-            db.commit()
-            
-        return {"icon_url": f"/static/icons/{filename}"}
-    except Exception as e:
-        raise HTTPException(400, f"抓取图标失败: {str(e)}")
+
+async def replace_link_icon(db: AsyncSession, link: models.Link, icon_url: str):
+    old_icon = link.icon
+    link.icon = icon_url
+    await db.commit()
+    await purge_unreferenced_icons(db, [old_icon])
 
 @router.put("/{link_id}/move")
 async def move_link(
     link_id: int,
     target_group_id: int,
     new_order: int,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user),
 ):
+    """把链接移动到目标分组的第 new_order 位（从 0 开始），通常只更新这一行"""
     if target_group_id == 1 and user.id != 1:
         raise HTTPException(status_code=403, detail="无法移动到公共分组")
 
-    link = db.query(models.Link).join(models.Group).filter(
-        models.Link.id == link_id, 
-        (models.Group.user_id == user.id) | (models.Group.id == 1 and user.id == 1)
-    ).first()
+    link = await db.scalar(select(models.Link).join(models.Group).where(
+        models.Link.id == link_id, models.Group.user_id == user.id
+    ))
 
     if not link:
         raise HTTPException(status_code=404, detail="链接不存在或无权操作")
 
+    target_exists = await db.scalar(select(models.Group.id).where(
+        models.Group.id == target_group_id, models.Group.user_id == user.id
+    ))
+    if not target_exists:
+        raise HTTPException(status_code=403, detail="目标分组不存在或无权操作")
+
+    order = await link_order_at(db, target_group_id, new_order, link.id)
+    if order is None:
+        # 相邻排序键之间已没有空隙，压缩该分组的排序键后重新计算
+        await rebalance_links(db, target_group_id)
+        order = await link_order_at(db, target_group_id, new_order, link.id)
+
     link.group_id = target_group_id
-    link.order = new_order
-    db.commit()
-    return {"msg": "移动成功"}
+    link.order = order
+    await db.commit()
+    return {"msg": "移动成功", "order": order}
 
 @router.delete("/{link_id}")
 async def delete_link(
     link_id: int, 
-    db: Session = Depends(get_db), 
-    user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db), 
+    user: UserSnapshot = Depends(get_current_user)
 ):
-    link = check_link_permission(db, link_id, user)
+    link = await check_link_permission(db, link_id, user)
 
     if link.group_id == 1 and user.id != 1:
         raise HTTPException(status_code=403, detail="无法删除公共分组内容")
 
-    group = db.query(models.Group).filter(models.Group.id == link.group_id).first()
+    group = link.group
     if group.user_id != user.id and not (group.id == 1 and user.id == 1):
          raise HTTPException(status_code=403, detail="无权删除")
 
-    if link.icon:
-        cleanup_old_icon_file(link.icon)
-
-    db.delete(link)
-    db.commit()
+    await db.delete(link)
+    await db.commit()
+    await purge_unreferenced_icons(db, [link.icon])
     return {"msg": "已删除"}
 
-@router.put("/reorder")
-async def reorder_links(
-    data: ReorderSchema,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    if data.group_id == 1 and current_user.id != 1:
-        raise HTTPException(status_code=403, detail="无法修改公共分组顺序")
-
-    group_exists = db.query(models.Group).filter(
-        models.Group.id == data.group_id, 
-        (models.Group.user_id == current_user.id) | (models.Group.id == 1 and current_user.id == 1)
-    ).first()
-    
-    if not group_exists:
-        raise HTTPException(status_code=403, detail="无权操作该分组")
-
-    for index, l_id in enumerate(data.link_ids):
-        db.query(models.Link).filter(models.Link.id == l_id).update(
-            {"order": index, "group_id": data.group_id},
-            synchronize_session=False
-        )
-    
-    db.commit()
-    db.expire_all() 
-    return {"status": "success"}
-
 @router.post("/check-health")
-async def health_check_trigger():
+async def health_check_trigger(
+    db: AsyncSession = Depends(get_async_db),
+    user: UserSnapshot = Depends(get_current_user),
+):
+    if link_health.concurrency == 0:
+        raise HTTPException(status_code=503, detail="链接巡检未启用")
 
-    return {"msg": "健康检查已触发"}
+    queued = await link_health.request_recheck(db, user.id)
+    return {"msg": "健康检查已触发", "queued": queued}
@@ -0,0 +1,185 @@
+"""书签导入导出的格式处理
+
+导入支持浏览器导出的 Netscape 书签 HTML 和本项目导出的 JSON。HTML 用标准库
+HTMLParser 增量解析，上传内容分块喂入，解析出的书签随时取走分批入库，不需要
+把整个文件读进内存。分组是扁平的，嵌套文件夹以 “父 / 子” 的路径作为分组名。
+"""
+import codecs
+import html
+import json
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+DEFAULT_GROUP_NAME = "导入的书签"
+FOLDER_SEPARATOR = " / "
+ALLOWED_SCHEMES = ("http", "https")
+
+NETSCAPE_HEADER = (
+    "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n"
+    "<!-- This is an automatically generated file.\n"
+    "     It will be read and overwritten.\n"
+    "     DO NOT EDIT! -->\n"
+    '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+    "<TITLE>Bookmarks</TITLE>\n"
+    "<H1>Bookmarks</H1>\n"
+    "<DL><p>\n"
+)
+NETSCAPE_FOOTER = "</DL><p>\n"
+
+
+class BookmarkFormatError(Exception):
+    """上传内容无法解析，消息可直接返回给用户"""
+
+
+@dataclass(slots=True)
+class Bookmark:
+    group: str
+    title: str
+    url: str
+    icon: str | None = None
+
+
+def normalise_url(url: str) -> str | None:
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ALLOWED_SCHEMES or not parts.netloc:
+        return None
+    return url
+
+
+def make_bookmark(group: str | None, title: str | None, url: str | None, icon=None) -> Bookmark | None:
+    url = normalise_url(url or "")
+    if url is None:
+        return None
+    title = " ".join((title or "").split()) or url
+    group = " ".join((group or "").split()) or DEFAULT_GROUP_NAME
+    return Bookmark(group, title, url, icon if isinstance(icon, str) and icon else None)
+
+
+class NetscapeParser(HTMLParser):
+    """Netscape 书签文件的增量解析器，解析结果从 bookmarks 中取走"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.bookmarks: list[Bookmark] = []
+        self.skipped = 0
+        self._folders: list[str | None] = []
+        self._pending_folder: str | None = None
+        self._text: list[str] | None = None
+        self._href: str | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "dl":
+            # 每个 <DL> 对应上一个 <H3> 的文件夹，根 <DL> 没有文件夹名
+            self._folders.append(self._pending_folder)
+            self._pending_folder = None
+        elif tag == "h3":
+            self._text = []
+        elif tag == "a":
+            self._href = dict(attrs).get("href") or ""
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "dl":
+            if self._folders:
+                self._folders.pop()
+        elif tag == "h3" and self._text is not None:
+            self._pending_folder = "".join(self._text).strip()
+            self._text = None
+        elif tag == "a" and self._href is not None:
+            group = FOLDER_SEPARATOR.join(name for name in self._folders if name)
+            bookmark = make_bookmark(group, "".join(self._text or []), self._href)
+            if bookmark is None:
+                self.skipped += 1
+            else:
+                self.bookmarks.append(bookmark)
+            self._href = None
+            self._text = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+class NetscapeReader:
+    """把字节块解码后喂给解析器"""
+
+    def __init__(self):
+        self.parser = NetscapeParser()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, chunk: bytes) -> list[Bookmark]:
+        self.parser.feed(self._decoder.decode(chunk))
+        return self.drain()
+
+    def close(self) -> list[Bookmark]:
+        self.parser.feed(self._decoder.decode(b"", final=True))
+        self.parser.close()
+        return self.drain()
+
+    def drain(self) -> list[Bookmark]:
+        bookmarks, self.parser.bookmarks = self.parser.bookmarks, []
+        return bookmarks
+
+
+def parse_json_bookmarks(data: bytes) -> tuple[list[Bookmark], int]:
+    """解析导出的 JSON：{"groups": [{"name": ..., "links": [{"title", "url", "icon"}]}]}"""
+    try:
+        payload = json.loads(data)
+        groups = payload["groups"]
+        bookmarks = []
+        skipped = 0
+        for group in groups:
+            for link in group.get("links") or []:
+                bookmark = make_bookmark(
+                    group.get("name"), link.get("title"), link.get("url"), link.get("icon")
+                )
+                if bookmark is None:
+                    skipped += 1
+                else:
+                    bookmarks.append(bookmark)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise BookmarkFormatError("JSON 书签格式无效")
+    return bookmarks, skipped
+
+
+async def export_netscape(rows: AsyncIterator) -> AsyncIterator[str]:
+    """rows 按分组排列，每行为 (group_id, group_name, title, url, icon)"""
+    yield NETSCAPE_HEADER
+    current = None
+    async for group_id, group_name, title, url, _icon in rows:
+        if group_id != current:
+            if current is not None:
+                yield "    </DL><p>\n"
+            current = group_id
+            yield f"    <DT><H3>{html.escape(group_name)}</H3>\n    <DL><p>\n"
+        if url is not None:
+            yield f'        <DT><A HREF="{html.escape(url)}">{html.escape(title)}</A>\n'
+    if current is not None:
+        yield "    </DL><p>\n"
+    yield NETSCAPE_FOOTER
+
+
+async def export_json(rows: AsyncIterator) -> AsyncIterator[str]:
+    yield '{"version": 1, "groups": ['
+    current = None
+    first_link = True
+    async for group_id, group_name, title, url, icon in rows:
+        if group_id != current:
+            if current is not None:
+                yield "]},"
+            current = group_id
+            first_link = True
+            yield f'\n{{"name": {json.dumps(group_name, ensure_ascii=False)}, "links": ['
+        if url is not None:
+            link = json.dumps({"title": title, "url": url, "icon": icon}, ensure_ascii=False)
+            yield f"\n  {link}" if first_link else f",\n  {link}"
+            first_link = False
+    if current is not None:
+        yield "]}"
+    yield "\n]}\n"
@@ -0,0 +1,78 @@
+"""测算本机密码哈希耗时，给出满足目标延迟的成本参数
+
+用法：
+    python -m app.core.calibrate                    # 使用 .env 中的 PASSWORD_SCHEME / PASSWORD_HASH_TARGET_MS
+    python -m app.core.calibrate --scheme argon2 --target-ms 150
+
+输出推荐写入 .env 的配置；修改后重启服务，旧哈希会在用户下次登录时自动升级。
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import argon2
+
+from app.core import config
+from app.core.security import build_crypt_context, prehash_password
+
+SAMPLES = 3
+BCRYPT_ROUNDS_RANGE = range(8, 17)
+ARGON2_TIME_COST_RANGE = range(1, 11)
+
+
+def measure_ms(scheme: str, cost: int) -> float:
+    if scheme == "bcrypt":
+        context = build_crypt_context(scheme, bcrypt_rounds=cost)
+    else:
+        context = build_crypt_context(scheme, argon2_time_cost=cost)
+
+    secret = prehash_password("calibration-password")
+    timings = []
+    for _ in range(SAMPLES):
+        started = time.perf_counter()
+        context.hash(secret)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(scheme: str, target_ms: int) -> tuple[int, list[tuple[int, float]]]:
+    """返回耗时不超过目标值的最大成本；全部超出时返回最小成本"""
+    costs = BCRYPT_ROUNDS_RANGE if scheme == "bcrypt" else ARGON2_TIME_COST_RANGE
+    results = []
+    chosen = costs[0]
+    for cost in costs:
+        elapsed = measure_ms(scheme, cost)
+        results.append((cost, elapsed))
+        if elapsed > target_ms:
+            break
+        chosen = cost
+    return chosen, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测算密码哈希成本参数")
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default=config.PASSWORD_SCHEME)
+    parser.add_argument("--target-ms", type=int, default=config.PASSWORD_HASH_TARGET_MS)
+    args = parser.parse_args()
+    if args.scheme == "argon2" and not argon2.has_backend():
+        parser.error("argon2 需要先安装 argon2-cffi：pip install argon2-cffi")
+
+    chosen, results = calibrate(args.scheme, args.target_ms)
+    cost_name = "rounds" if args.scheme == "bcrypt" else "time_cost"
+
+    print(f"方案: {args.scheme}，目标耗时: {args.target_ms} ms")
+    for cost, elapsed in results:
+        marker = "  <- 推荐" if cost == chosen else ""
+        print(f"  {cost_name}={cost:<3} {elapsed:8.1f} ms{marker}")
+
+    print("\n推荐写入 .env：")
+    print(f"PASSWORD_SCHEME={args.scheme}")
+    if args.scheme == "bcrypt":
+        print(f"BCRYPT_ROUNDS={chosen}")
+    else:
+        print(f"ARGON2_TIME_COST={chosen}")
+        print(f"ARGON2_MEMORY_COST_KB={config.ARGON2_MEMORY_COST_KB}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 UPLOAD_DIR = os.path.join(STATIC_DIR, "user_uploads")
 ICONS_DIR = os.path.join(STATIC_DIR, "icons")
+FAVICON_CACHE_DIR = os.path.join(DATA_DIR, "favicons")
+ICON_BUNDLE_DIR = os.path.join(DATA_DIR, "icon_bundles")
 
 
 def load_env_file(path: str) -> None:
@@ -36,6 +38,38 @@ if not SECRET_KEY:
 
 ALGORITHM = "HS256"
 
+
+def get_int_env(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+    except ValueError:
+        raise RuntimeError(f"{name} must be an integer")
+
+    if value < minimum:
+        raise RuntimeError(f"{name} must be greater than or equal to {minimum}")
+    return value
+
+
+def get_choice_env(name: str, default: str, choices: set[str]) -> str:
+    value = os.getenv(name, default).strip().upper()
+    if value not in choices:
+        raise RuntimeError(f"{name} must be one of: {', '.join(sorted(choices))}")
+    return value
+
+
+def get_bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+
+    value = value.strip().lower()
+    if value in {"1", "true", "yes", "on"}:
+        return True
+    if value in {"0", "false", "no", "off"}:
+        return False
+    raise RuntimeError(f"{name} must be a boolean")
+
+
 try:
     ACCESS_TOKEN_EXPIRE_DAYS = int(
         os.getenv("ACCESS_TOKEN_EXPIRE_DAYS", "1")
@@ -51,5 +85,89 @@ if ACCESS_TOKEN_EXPIRE_DAYS <= 0:
         "ACCESS_TOKEN_EXPIRE_DAYS must be greater than 0"
     )
 
-for path in [DATA_DIR, UPLOAD_DIR, ICONS_DIR]:
+# SQLite 存储配置：WAL 让读写互不阻塞，busy_timeout 避免并发写入时直接报 "database is locked"
+SQLITE_JOURNAL_MODE = get_choice_env(
+    "SQLITE_JOURNAL_MODE", "WAL", {"WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"}
+)
+SQLITE_SYNCHRONOUS = get_choice_env(
+    "SQLITE_SYNCHRONOUS", "NORMAL", {"OFF", "NORMAL", "FULL", "EXTRA"}
+)
+SQLITE_TEMP_STORE = get_choice_env(
+    "SQLITE_TEMP_STORE", "MEMORY", {"DEFAULT", "FILE", "MEMORY"}
+)
+SQLITE_BUSY_TIMEOUT_MS = get_int_env("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_SIZE_KB = get_int_env("SQLITE_CACHE_SIZE_KB", 16384)
+SQLITE_MMAP_SIZE_MB = get_int_env("SQLITE_MMAP_SIZE_MB", 128)
+
+DB_POOL_SIZE = get_int_env("DB_POOL_SIZE", 5, minimum=1)
+DB_MAX_OVERFLOW = get_int_env("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = get_int_env("DB_POOL_TIMEOUT", 30, minimum=1)
+
+# 已认证用户缓存：TTL 同时是多 worker 部署下用户状态变更的最长生效延迟，设为 0 可关闭
+USER_CACHE_SIZE = get_int_env("USER_CACHE_SIZE", 1024)
+USER_CACHE_TTL = get_int_env("USER_CACHE_TTL", 60)
+
+# 密码哈希线程池：bcrypt 计算期间会释放 GIL，线程数建议不超过 CPU 核数
+PASSWORD_HASH_WORKERS = get_int_env(
+    "PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1), minimum=1
+)
+PASSWORD_HASH_QUEUE_LIMIT = get_int_env("PASSWORD_HASH_QUEUE_LIMIT", 32, minimum=1)
+
+# 密码哈希方案与成本，可用 python -m app.core.calibrate 按本机性能测算；
+# 调整后旧哈希会在用户下次登录成功时自动按新参数重算
+PASSWORD_SCHEME = get_choice_env("PASSWORD_SCHEME", "BCRYPT", {"BCRYPT", "ARGON2"}).lower()
+PASSWORD_HASH_TARGET_MS = get_int_env("PASSWORD_HASH_TARGET_MS", 100, minimum=1)
+BCRYPT_ROUNDS = get_int_env("BCRYPT_ROUNDS", 12, minimum=4)
+ARGON2_TIME_COST = get_int_env("ARGON2_TIME_COST", 2, minimum=1)
+ARGON2_MEMORY_COST_KB = get_int_env("ARGON2_MEMORY_COST_KB", 19456, minimum=8)
+ARGON2_PARALLELISM = get_int_env("ARGON2_PARALLELISM", 1, minimum=1)
+
+# 网页标题后台抓取队列：失败后按 RETRY_BASE * 2^(attempts-1) 秒退避重试
+TITLE_FETCH_WORKERS = get_int_env("TITLE_FETCH_WORKERS", 2)
+TITLE_FETCH_MAX_ATTEMPTS = get_int_env("TITLE_FETCH_MAX_ATTEMPTS", 5, minimum=1)
+TITLE_FETCH_RETRY_BASE = get_int_env("TITLE_FETCH_RETRY_BASE", 30, minimum=1)
+TITLE_FETCH_LEASE = get_int_env("TITLE_FETCH_LEASE", 60, minimum=10)
+TITLE_QUEUE_POLL_INTERVAL = get_int_env("TITLE_QUEUE_POLL_INTERVAL", 5, minimum=1)
+# 抓取标题时最多读取的响应体字节数，读到 </title> 会提前结束
+TITLE_MAX_BYTES = get_int_env("TITLE_MAX_BYTES", 256 * 1024, minimum=1024)
+
+# URL 元数据（标题、最终地址、图标）缓存有效期，单位秒；非 200 响应使用较短的有效期
+URL_METADATA_TTL = get_int_env("URL_METADATA_TTL", 7 * 24 * 3600)
+URL_METADATA_ERROR_TTL = get_int_env("URL_METADATA_ERROR_TTL", 3600)
+
+# 外部 HTTP 请求（标题抓取等）共用的连接池：全局并发上限 + 单站点并发上限，
+# 启用 HTTP/2 需额外安装 h2（pip install "httpx[http2]"）
+HTTP_MAX_CONNECTIONS = get_int_env("HTTP_MAX_CONNECTIONS", 20, minimum=1)
+HTTP_MAX_KEEPALIVE = get_int_env("HTTP_MAX_KEEPALIVE", 10)
+HTTP_KEEPALIVE_EXPIRY = get_int_env("HTTP_KEEPALIVE_EXPIRY", 30)
+HTTP_PER_HOST_LIMIT = get_int_env("HTTP_PER_HOST_LIMIT", 2, minimum=1)
+HTTP_TIMEOUT = get_int_env("HTTP_TIMEOUT", 6, minimum=1)
+HTTP2_ENABLED = get_bool_env("HTTP2_ENABLED", False)
+# 下载远程图标的总耗时上限（秒），防止慢速响应长时间占用连接
+ICON_DOWNLOAD_TIMEOUT = get_int_env("ICON_DOWNLOAD_TIMEOUT", 10, minimum=1)
+
+# 站点图标代理缓存有效期（秒）；取不到图标时的负缓存有效期较短
+FAVICON_CACHE_TTL = get_int_env("FAVICON_CACHE_TTL", 7 * 24 * 3600)
+FAVICON_NEGATIVE_TTL = get_int_env("FAVICON_NEGATIVE_TTL", 24 * 3600)
+
+# 链接可用性巡检：每轮领取 BATCH 条超过 STALE 秒未检查的链接，最多 CONCURRENCY 个并发，
+# 同一站点两次请求至少间隔 HOST_INTERVAL_MS 毫秒；CONCURRENCY 设为 0 可关闭巡检
+HEALTH_CHECK_CONCURRENCY = get_int_env("HEALTH_CHECK_CONCURRENCY", 8)
+HEALTH_CHECK_BATCH = get_int_env("HEALTH_CHECK_BATCH", 200, minimum=1)
+HEALTH_CHECK_STALE = get_int_env("HEALTH_CHECK_STALE", 24 * 3600, minimum=60)
+HEALTH_CHECK_INTERVAL = get_int_env("HEALTH_CHECK_INTERVAL", 300, minimum=1)
+HEALTH_CHECK_HOST_INTERVAL_MS = get_int_env("HEALTH_CHECK_HOST_INTERVAL_MS", 500)
+
+# 未引用图标文件的定期清理间隔（秒），清理链接更换图标时因宽限期保留下来的文件；0 表示关闭
+ICON_SWEEP_INTERVAL = get_int_env("ICON_SWEEP_INTERVAL", 3600)
+# 定期清理只删除超过该秒数仍未被引用的文件；编辑链接时先上传或下载的图标在保存前没有引用，
+# 需覆盖一次编辑的时长
+ICON_SWEEP_GRACE = get_int_env("ICON_SWEEP_GRACE", 24 * 3600, minimum=3600)
+
+# 访客视图（公共分组）允许浏览器和 CDN 直接复用的秒数；0 表示每次都用 ETag 校验
+PUBLIC_GROUPS_MAX_AGE = get_int_env("PUBLIC_GROUPS_MAX_AGE", 0)
+
+# 服务端渲染首页：把首屏数据、站点标题与自定义样式内联到 index.html，省去首屏的接口请求
+SERVER_RENDER_INDEX = get_bool_env("SERVER_RENDER_INDEX", False)
+for path in [DATA_DIR, UPLOAD_DIR, ICONS_DIR, FAVICON_CACHE_DIR, ICON_BUNDLE_DIR]:
     os.makedirs(path, exist_ok=True)
@@ -1,34 +1,138 @@
+import codecs
+import html
+import re
 import httpx
-from bs4 import BeautifulSoup
 import logging
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+from app.core import config
+from app.core.http_client import get_http_client, outbound_slot
 
 logger = logging.getLogger(__name__)
 
-async def get_remote_http_title(url: str) -> str:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-    }
-    
+# 只读取到 </title> 为止；<head> 结束仍未出现标题，或读满字节上限时直接放弃
+TITLE_RE = re.compile(rb"<title\b[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+TITLE_OPEN_RE = re.compile(rb"<title\b", re.IGNORECASE)
+HEAD_END_RE = re.compile(rb"</head\s*>|<body\b", re.IGNORECASE)
+META_CHARSET_RE = re.compile(
+    rb"""<meta\b[^>]*?charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE
+)
+LINK_TAG_RE = re.compile(rb"<link\b[^>]*>", re.IGNORECASE)
+ATTR_RE = re.compile(rb"""([a-zA-Z\-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+# 无法识别编码且不是合法 UTF-8 时，按中文站点最常见的 GBK 系列解码
+FALLBACK_ENCODING = "gb18030"
+
+
+class TitleFetchError(Exception):
+    """可重试的抓取失败：网络异常或服务端 5xx"""
+
+
+@dataclass(slots=True)
+class PageMetadata:
+    title: str
+    final_url: str
+    status_code: int | None
+    favicon: str | None
+
+
+def lookup_encoding(name: str | None) -> str | None:
+    if not name:
+        return None
     try:
-        async with httpx.AsyncClient(headers=headers, timeout=6.0, follow_redirects=True) as client:
-            response = await client.get(url)
-            
-            if response.status_code != 200:
-                logger.warning(f"无法访问 URL: {url}, 状态码: {response.status_code}")
-                return ""
-
-            content = response.content
-            soup = BeautifulSoup(content, "html.parser", from_encoding=response.encoding)
-            
-            if soup.title and soup.title.string:
-                title_text = soup.title.string.strip()
-                return " ".join(title_text.split())
-                
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def sniff_encoding(head: bytes, header_charset: str | None) -> str | None:
+    """按 BOM -> Content-Type -> <meta charset> 的顺序确定编码"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    encoding = lookup_encoding(header_charset)
+    if encoding:
+        return encoding
+
+    match = META_CHARSET_RE.search(head)
+    if match:
+        return lookup_encoding(match.group(1).decode("ascii", "ignore"))
+    return None
+
+
+def decode_title(raw: bytes, encoding: str | None) -> str:
+    if encoding:
+        text = raw.decode(encoding, errors="replace")
+    else:
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            text = raw.decode(FALLBACK_ENCODING, errors="replace")
+    return " ".join(html.unescape(text).split())
+
+
+def extract_title(buffer: bytes) -> tuple[bool, bytes | None]:
+    """返回 (是否可以停止读取, 标题原始字节)"""
+    match = TITLE_RE.search(buffer)
+    if match:
+        return True, match.group(1)
+
+    head_end = HEAD_END_RE.search(buffer)
+    if head_end and not TITLE_OPEN_RE.search(buffer, 0, head_end.start()):
+        return True, None
+    return False, None
+
+
+async def read_title_bytes(response: httpx.Response) -> tuple[bytes | None, bytes]:
+    """增量读取响应体，找到标题或读满 TITLE_MAX_BYTES 即停止；返回 (标题原始字节, 已读取内容)"""
+    buffer = b""
+    async for chunk in response.aiter_bytes():
+        buffer = (buffer + chunk)[: config.TITLE_MAX_BYTES]
+        done, raw_title = extract_title(buffer)
+        if done or len(buffer) >= config.TITLE_MAX_BYTES:
+            return raw_title, buffer
+
+    return extract_title(buffer)[1], buffer
+
+
+def extract_favicon(head: bytes, base_url: str) -> str:
+    """取 <link rel="icon"> 的地址，没有时退回站点根目录的 /favicon.ico"""
+    for tag in LINK_TAG_RE.findall(head):
+        attrs = {
+            match.group(1).lower(): (match.group(2) or match.group(3) or match.group(4) or b"")
+            for match in ATTR_RE.finditer(tag)
+        }
+        rel = attrs.get(b"rel", b"").lower().split()
+        href = attrs.get(b"href", b"").strip()
+        if b"icon" in rel and href:
+            return urljoin(base_url, html.unescape(href.decode("utf-8", "ignore")))
+    return urljoin(base_url, "/favicon.ico")
+
+
+async def fetch_page_metadata(url: str) -> PageMetadata:
+    """抓取网页标题等元数据；暂时性错误抛出 TitleFetchError"""
+    try:
+        async with outbound_slot(url):
+            async with get_http_client().stream("GET", url) as response:
+                if response.status_code >= 500:
+                    raise TitleFetchError(f"服务端错误, 状态码: {response.status_code}")
+                final_url = str(response.url.copy_with(fragment=None))
+                if response.status_code != 200:
+                    logger.warning(f"无法访问 URL: {url}, 状态码: {response.status_code}")
+                    return PageMetadata("", final_url, response.status_code, None)
+                raw_title, head = await read_title_bytes(response)
+                header_charset = response.charset_encoding
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol) as exc:
+        logger.warning(f"URL 无法抓取: {exc} (URL: {url})")
+        return PageMetadata("", url, None, None)
     except httpx.RequestError as exc:
-        logger.error(f"请求发生异常: {exc} (URL: {url})")
-    except Exception as e:
-        logger.error(f"解析标题时发生未知错误: {e}")
-        
-    return ""
\ No newline at end of file
+        raise TitleFetchError(f"请求发生异常: {exc}") from exc
+
+    title = decode_title(raw_title, sniff_encoding(head, header_charset)) if raw_title else ""
+    return PageMetadata(title, final_url, 200, extract_favicon(head, final_url))
@@ -0,0 +1,282 @@
+"""首页分组与链接数据的查询，以及访客视图的预渲染缓存
+
+分组和链接按列查询后在一次遍历中组装为 slots dataclass，只读取首页用到的字段，
+不经过 ORM 对象和 jsonable_encoder，由 orjson 直接序列化。这些字段的变化都会递增
+data_versions 中的版本号（见迁移 0008），因此可以按版本号缓存。
+
+访客看到的公共分组（以及访客的 /api/bootstrap）对所有人相同，渲染好的 JSON 与
+其 gzip 压缩结果保存在进程内，每次请求只读取版本号，版本号变化时才重新查询和序列化。
+"""
+import asyncio
+import gzip
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core.data_versions import PUBLIC_SCOPE, etag_matches, get_versions, make_etag
+from app.core.icons import icon_variant_urls
+
+# 首页数据（/api/bootstrap 与公共分组）结构调整时递增，使浏览器和代理中缓存的旧数据失效
+PAYLOAD_FORMAT = 2
+
+PUBLIC_GROUP_ID = 1
+PUBLIC_OWNER_ID = 1
+
+# 首页用到的链接字段，顺序与 LinkItem 一致，需与迁移 0008 中触发版本号递增的字段保持一致
+LINK_COLUMNS = (
+    models.Link.id,
+    models.Link.group_id,
+    models.Link.title,
+    models.Link.url,
+    models.Link.icon,
+    models.Link.order,
+    models.Link.title_status,
+    models.Link.health_status,
+    models.Link.health_code,
+    models.Link.health_failures,
+)
+
+
+@dataclass(slots=True)
+class LinkItem:
+    # 缩略图地址由 icon 计算得到，放在第一位，其余字段按 LINK_COLUMNS 的顺序直接由行展开
+    icon_variants: dict | None
+    id: int
+    group_id: int
+    title: str
+    url: str
+    icon: str | None
+    order: int
+    title_status: str
+    health_status: str | None
+    health_code: int | None
+    health_failures: int
+
+
+@dataclass(slots=True)
+class LinkDetailItem(LinkItem):
+    http_title: str | None
+
+
+@dataclass(slots=True)
+class GroupItem:
+    id: int
+    name: str
+    order: int
+    user_id: int
+    is_readonly: bool
+    links: list[LinkItem] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class GroupOption:
+    id: int
+    name: str
+    order: int
+
+
+def group_query(user_id: int | None, include_public: bool):
+    """用户自己的分组，以及可选的公共分组（id 为 1，属于用户 1）
+
+    按 (user_id, order) 排序，直接沿 ix_groups_user_id_order 的顺序读取，不需要额外排序。
+    """
+    owners, visible = [], []
+    if include_public:
+        owners.append(PUBLIC_OWNER_ID)
+        visible.append(models.Group.id == PUBLIC_GROUP_ID)
+    if user_id:
+        owners.append(user_id)
+        visible.append(models.Group.user_id == user_id)
+    return (
+        select(models.Group.id, models.Group.name, models.Group.order, models.Group.user_id)
+        .where(models.Group.user_id.in_(owners), or_(*visible))
+        .order_by(models.Group.user_id.asc(), models.Group.order.asc())
+    )
+
+
+def link_query(group_ids: list[int], with_http_title: bool = False):
+    """分组内的链接，按 (group_id, order, id) 排序，与 ix_links_group_id_order 的顺序一致"""
+    columns = (*LINK_COLUMNS, models.Link.http_title) if with_http_title else LINK_COLUMNS
+    return (
+        select(*columns)
+        .where(models.Link.group_id.in_(group_ids))
+        .order_by(models.Link.group_id.asc(), models.Link.order.asc(), models.Link.id.asc())
+    )
+
+
+async def load_groups(
+    db: AsyncSession,
+    user_id: int | None,
+    include_public: bool = True,
+    with_http_title: bool = False,
+) -> list[GroupItem]:
+    """查询用户的分组及其链接，公共分组排在最前；user_id 为 None 时只有公共分组
+
+    首页不展示网页标题，只有需要时才读取 http_title。查询在会话的连接上以 Core 方式执行，
+    与会话处于同一事务，结果行不经过 ORM 的结果处理。
+    """
+    conn = await db.connection()
+    groups: dict[int, GroupItem] = {}
+    public = None
+    for group_id, name, order, owner_id in await conn.execute(group_query(user_id, include_public)):
+        group = GroupItem(group_id, name, order, owner_id, group_id == PUBLIC_GROUP_ID)
+        if group.is_readonly:
+            public = group
+        else:
+            groups[group_id] = group
+    if public is not None:
+        groups = {public.id: public, **groups}
+
+    if groups:
+        link_cls = LinkDetailItem if with_http_title else LinkItem
+        for row in await conn.execute(link_query(list(groups), with_http_title)):
+            groups[row.group_id].links.append(link_cls(icon_variant_urls(row.icon), *row))
+
+    return list(groups.values())
+
+
+async def load_group_options(db: AsyncSession, user_id: int) -> list[GroupOption]:
+    """添加链接时可选择的分组，只读取名称与排序"""
+    conn = await db.connection()
+    rows = await conn.execute(
+        select(models.Group.id, models.Group.name, models.Group.order)
+        .where(models.Group.user_id == user_id)
+        .order_by(models.Group.order.asc())
+    )
+    return [GroupOption(*row) for row in rows]
+
+
+class OrjsonResponse(JSONResponse):
+    """由 orjson 序列化的 JSON 响应，可直接返回 slots dataclass（FastAPI 的 ORJSONResponse 已弃用）"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+@dataclass(frozen=True, slots=True)
+class RenderedPayload:
+    versions: dict[str, int]
+    etag: str
+    body: bytes
+    gzipped: bytes
+
+
+class RenderedCache:
+    """按版本号缓存对所有访问者相同的 JSON 响应，保存原文与 gzip 压缩结果
+
+    build(db) 返回 orjson 可序列化的数据（dict、list 与上面的 dataclass）；版本号与数据在同一个读事务中查询，
+    缓存内容与版本号一致。
+    """
+
+    def __init__(self, kind: str, scopes: list[str], build: Callable[[AsyncSession], Awaitable]):
+        self.kind = kind
+        self.scopes = scopes
+        self.build = build
+        self._current: RenderedPayload | None = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "versions": current.versions if current else None,
+            "bytes": len(current.body) if current else 0,
+            "gzip_bytes": len(current.gzipped) if current else 0,
+            "hits": self.hits,
+            "renders": self.renders,
+        }
+
+    def _fresh(self, versions: dict[str, int]) -> RenderedPayload | None:
+        # 版本号只增不减，已缓存的版本不低于本次读到的版本时直接使用
+        current = self._current
+        if current is not None and all(current.versions[s] >= versions[s] for s in self.scopes):
+            self.hits += 1
+            return current
+        return None
+
+    async def get(self, db: AsyncSession) -> RenderedPayload:
+        versions = await get_versions(db, self.scopes)
+        current = self._fresh(versions)
+        if current is not None:
+            return current
+
+        # 版本变化后的并发请求只渲染一次
+        async with self._lock:
+            current = self._fresh(versions)
+            if current is None:
+                current = await self._render(db, versions)
+                self._current = current
+                self.renders += 1
+            return current
+
+    async def _render(self, db: AsyncSession, versions: dict[str, int]) -> RenderedPayload:
+        data = await self.build(db)
+        etag = make_etag(f"{self.kind}{PAYLOAD_FORMAT}", None, versions)
+        return make_payload(versions, etag, orjson.dumps(data))
+
+
+def make_payload(versions: dict[str, int], etag: str, body: bytes) -> RenderedPayload:
+    return RenderedPayload(
+        versions=versions,
+        etag=etag,
+        body=body,
+        gzipped=gzip.compress(body, compresslevel=6),
+    )
+
+
+def encoding_qvalues(header: str) -> dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: q 值}；q 值无法解析时按 0 处理"""
+    qvalues = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    return qvalues
+
+
+def accepts_gzip(request: Request) -> bool:
+    """明确列出的 gzip（或 x-gzip）优先，否则看 * 的 q 值；q=0 表示不接受"""
+    qvalues = encoding_qvalues(request.headers.get("accept-encoding", ""))
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+
+def rendered_response(
+    request: Request,
+    payload: RenderedPayload,
+    headers: dict,
+    media_type: str = "application/json",
+) -> Response:
+    """按 If-None-Match 与 Accept-Encoding 返回 304、gzip 或原文"""
+    vary = ", ".join(filter(None, [headers.get("Vary"), "Accept-Encoding"]))
+    headers = {**headers, "ETag": payload.etag, "Vary": vary}
+    if etag_matches(request, payload.etag):
+        return Response(status_code=304, headers=headers)
+    if accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzipped, media_type=media_type, headers=headers)
+    return Response(content=payload.body, media_type=media_type, headers=headers)
+
+
+public_groups_cache = RenderedCache(
+    "p", [PUBLIC_SCOPE], lambda db: load_groups(db, None)
+)
@@ -0,0 +1,78 @@
+"""按范围读取数据版本号
+
+版本号存放在 data_versions 表中，由迁移 0008 创建的触发器在同一事务内递增，
+接口无需手动维护。比较版本号即可判断数据是否变化，不必读取链接和分组本身；
+进程内缓存也可以用 viewer_versions 的结果作为缓存键。
+"""
+import re
+
+from fastapi import Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+
+# If-None-Match 列表中的一项：* 或可带 W/ 前缀的带引号字符串（引号内可以有逗号），允许空项
+ENTITY_TAG_RE = re.compile(r'[\s,]*(\*|(?:W/)?"[^"]*")\s*(?:,|$)')
+
+PUBLIC_SCOPE = "public"
+CONFIG_SCOPE = "config"
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+async def get_versions(db: AsyncSession, scopes: list[str]) -> dict[str, int]:
+    """返回各范围的版本号，从未写入过的范围为 0"""
+    rows = await db.execute(
+        select(models.DataVersion.scope, models.DataVersion.version)
+        .where(models.DataVersion.scope.in_(scopes))
+    )
+    versions = dict.fromkeys(scopes, 0)
+    versions.update({scope: version for scope, version in rows})
+    return versions
+
+
+def viewer_scopes(user_id: int | None) -> list[str]:
+    """某个访问者看到的分组与链接所依赖的范围；访客只依赖公共分组"""
+    scopes = [PUBLIC_SCOPE]
+    if user_id:
+        scopes.append(user_scope(user_id))
+    return scopes
+
+
+async def viewer_versions(db: AsyncSession, user_id: int | None) -> dict[str, int]:
+    return await get_versions(db, viewer_scopes(user_id))
+
+
+def make_etag(kind: str, user_id: int | None, versions: dict[str, int], weak: bool = False) -> str:
+    """由接口类型、访问者和各范围版本号组成 ETag
+
+    响应中含有不影响版本号的字段（如巡检耗时）时使用弱 ETag。
+    """
+    tag = '"{}-{}-{}"'.format(kind, user_id or 0, "-".join(str(v) for v in versions.values()))
+    return f"W/{tag}" if weak else tag
+
+
+def parse_entity_tags(header: str) -> list[str]:
+    """拆分逗号分隔的实体标签列表；格式不正确时整个头部视为空"""
+    tags = []
+    pos = 0
+    header = header.strip()
+    while pos < len(header):
+        match = ENTITY_TAG_RE.match(header, pos)
+        if match is None:
+            return []
+        tags.append(match.group(1))
+        pos = match.end()
+    return tags
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 按弱比较：去掉 W/ 后与 etag 完全相等即匹配，* 匹配任意 ETag"""
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate == "*" or candidate.removeprefix("W/") == opaque
+        for candidate in parse_entity_tags(request.headers.get("if-none-match", ""))
+    )
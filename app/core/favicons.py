@@ -0,0 +1,244 @@
+"""站点图标代理的磁盘缓存
+
+前端不再直接请求第三方 favicon 服务，而是访问 /api/favicons/{host}，由服务端按
+系统配置中的 favicon_api 模板抓取并缓存到 data/favicons。每个条目由图片文件和
+一个 JSON 元数据文件组成；抓取失败也会写入“未找到”条目（负缓存），在较短的
+有效期内不再重复请求第三方服务。
+
+接口不需要登录，为避免任意主机名写满磁盘，缓存中没有的站点只有出现在已保存
+链接中（links.host）时才会去抓取。查不到的主机名在内存中记住 UNLINKED_TTL 秒，
+随机主机名的请求不会每次都查询数据库；本进程新增或修改链接时立即清除对应记录。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core import config
+from app.core.http_client import get_http_client, outbound_slot
+from app.core.icons import sniff_image_format
+
+HOST_RE = re.compile(r"[a-z0-9](?:[a-z0-9\-]{0,61}[a-z0-9])?(?:\.[a-z0-9](?:[a-z0-9\-]{0,61}[a-z0-9])?)*")
+MAX_FAVICON_BYTES = 512 * 1024
+# 未出现在链接中的主机名的内存负缓存：有效期（秒）与最多记录数
+UNLINKED_TTL = 60
+MAX_UNLINKED_HOSTS = 4096
+CONTENT_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+    "ICO": "image/x-icon",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class CachedFavicon:
+    found: bool
+    fetched_at: float
+    etag: str | None = None
+    content_type: str | None = None
+    data: bytes | None = None
+
+    @property
+    def fresh(self) -> bool:
+        ttl = config.FAVICON_CACHE_TTL if self.found else config.FAVICON_NEGATIVE_TTL
+        return time.time() - self.fetched_at < ttl
+
+
+def normalise_host(host: str) -> str | None:
+    host = host.strip().lower().rstrip(".")
+    if len(host) > 253 or not HOST_RE.fullmatch(host):
+        return None
+    return host
+
+
+async def host_in_links(db: AsyncSession, host: str) -> bool:
+    """是否有链接使用该主机名；links.host 与 normalise_host 的结果格式一致，可直接按索引等值查询"""
+    link_id = await db.scalar(select(models.Link.id).where(models.Link.host == host).limit(1))
+    return link_id is not None
+
+
+def cache_key(template: str, host: str) -> str:
+    # 模板也参与计算，管理员更换 favicon 服务后旧缓存自然失效
+    return hashlib.sha256(f"{template}\n{host}".encode("utf-8")).hexdigest()
+
+
+def entry_paths(key: str) -> tuple[str, str]:
+    base = os.path.join(config.FAVICON_CACHE_DIR, key)
+    return f"{base}.json", f"{base}.bin"
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=config.FAVICON_CACHE_DIR, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            output.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_entry(key: str) -> CachedFavicon | None:
+    meta_path, data_path = entry_paths(key)
+    try:
+        with open(meta_path, encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        data = None
+        if meta["found"]:
+            with open(data_path, "rb") as data_file:
+                data = data_file.read()
+    except (OSError, ValueError, KeyError):
+        return None
+    return CachedFavicon(
+        found=meta["found"],
+        fetched_at=meta["fetched_at"],
+        etag=meta.get("etag"),
+        content_type=meta.get("content_type"),
+        data=data,
+    )
+
+
+def write_entry(key: str, entry: CachedFavicon) -> None:
+    meta_path, data_path = entry_paths(key)
+    # 先写图片再写元数据，读到元数据时图片一定已经就绪
+    if entry.found:
+        write_atomic(data_path, entry.data)
+    meta = {
+        "found": entry.found,
+        "fetched_at": entry.fetched_at,
+        "etag": entry.etag,
+        "content_type": entry.content_type,
+    }
+    write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+async def fetch_favicon(url: str) -> CachedFavicon:
+    not_found = CachedFavicon(found=False, fetched_at=time.time())
+    try:
+        async with outbound_slot(url):
+            async with get_http_client().stream("GET", url) as response:
+                if response.status_code != 200:
+                    return not_found
+                data = b""
+                async for chunk in response.aiter_bytes():
+                    data += chunk
+                    if len(data) > MAX_FAVICON_BYTES:
+                        return not_found
+    except httpx.HTTPError:
+        return not_found
+
+    # 只接受可识别的位图格式，SVG 等可能携带脚本的内容一律视为未找到
+    image_format = sniff_image_format(data[:16])
+    if image_format is None:
+        return not_found
+
+    return CachedFavicon(
+        found=True,
+        fetched_at=time.time(),
+        etag=f'"{hashlib.sha256(data).hexdigest()[:32]}"',
+        content_type=CONTENT_TYPES[image_format],
+        data=data,
+    )
+
+
+class FaviconCache:
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._unlinked: OrderedDict[str, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.unlinked_hits = 0
+
+    def is_unlinked(self, host: str) -> bool:
+        expires_at = self._unlinked.get(host)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._unlinked[host]
+            return False
+        self.unlinked_hits += 1
+        return True
+
+    def mark_unlinked(self, host: str) -> None:
+        self._unlinked[host] = time.monotonic() + UNLINKED_TTL
+        self._unlinked.move_to_end(host)
+        while len(self._unlinked) > MAX_UNLINKED_HOSTS:
+            self._unlinked.popitem(last=False)
+
+    def forget_unlinked(self, hosts: Iterable[str | None]) -> None:
+        """链接保存后调用，这些主机名的图标可以立即抓取"""
+        for host in hosts:
+            if host:
+                self._unlinked.pop(host, None)
+
+    async def cached(self, template: str, host: str) -> CachedFavicon | None:
+        """读取未过期的缓存条目，不访问第三方服务"""
+        entry = await asyncio.to_thread(read_entry, cache_key(template, host))
+        if entry is not None and entry.fresh:
+            self.hits += 1
+            return entry
+        return None
+
+    async def get(self, template: str, host: str) -> CachedFavicon:
+        key = cache_key(template, host)
+        entry = await asyncio.to_thread(read_entry, key)
+        if entry is not None and entry.fresh:
+            self.hits += 1
+            return entry
+
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            fetched = await fetch_favicon(template.replace("${hostname}", host))
+            if not fetched.found and entry is not None and entry.found:
+                # 上游暂时失败时继续使用过期的图标，并推迟下次刷新
+                fetched = CachedFavicon(
+                    found=True,
+                    fetched_at=fetched.fetched_at,
+                    etag=entry.etag,
+                    content_type=entry.content_type,
+                    data=entry.data,
+                )
+            await asyncio.to_thread(write_entry, key, fetched)
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(fetched)
+            return fetched
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "unlinked": len(self._unlinked),
+            "unlinked_hits": self.unlinked_hits,
+        }
+
+
+favicon_cache = FaviconCache()
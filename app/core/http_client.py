@@ -0,0 +1,131 @@
+"""外部 HTTP 请求共用的客户端
+
+整个进程只保留一个 httpx.AsyncClient，复用 keep-alive 连接；所有出站请求
+先通过 outbound_slot 获取全局与单站点两级信号量，避免同时打开过多连接，
+也避免对同一站点并发请求过多。客户端在首次使用时创建，随应用生命周期关闭。
+"""
+import asyncio
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core import config
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+}
+
+LATENCY_SAMPLES = 512
+
+_client: httpx.AsyncClient | None = None
+_global_slots = asyncio.Semaphore(config.HTTP_MAX_CONNECTIONS)
+# host -> [信号量, 使用者数]，使用者归零时移除，避免站点数无限增长
+_host_slots: dict[str, list] = {}
+_latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+_counters = {"requests": 0, "errors": 0, "in_flight": 0, "waiting": 0}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        if config.HTTP2_ENABLED:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise RuntimeError('HTTP2_ENABLED=true 需要先安装 h2：pip install "httpx[http2]"')
+
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=config.HTTP_TIMEOUT,
+            follow_redirects=True,
+            http2=config.HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{(parts.hostname or '').lower()}:{parts.port or ''}"
+
+
+@asynccontextmanager
+async def outbound_slot(url: str):
+    """占用一个出站请求名额，并记录请求耗时（不含排队时间）"""
+    key = host_key(url)
+    entry = _host_slots.setdefault(key, [asyncio.Semaphore(config.HTTP_PER_HOST_LIMIT), 0])
+    entry[1] += 1
+    _counters["waiting"] += 1
+    acquired = False
+    try:
+        async with entry[0], _global_slots:
+            _counters["waiting"] -= 1
+            _counters["in_flight"] += 1
+            _counters["requests"] += 1
+            acquired = True
+            started = time.perf_counter()
+            try:
+                yield
+            except Exception:
+                _counters["errors"] += 1
+                raise
+            finally:
+                _latencies.append((time.perf_counter() - started) * 1000)
+                _counters["in_flight"] -= 1
+    finally:
+        if not acquired:
+            _counters["waiting"] -= 1
+        entry[1] -= 1
+        if entry[1] == 0:
+            _host_slots.pop(key, None)
+
+
+def pool_connections() -> dict:
+    # httpx 未公开连接池状态，这里读取底层 httpcore 连接池，取不到时返回空
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "open": len(connections),
+        "idle": sum(1 for conn in connections if conn.is_idle()),
+    }
+
+
+def get_http_stats() -> dict:
+    latencies = sorted(_latencies)
+    latency = {"samples": len(latencies)}
+    if latencies:
+        latency.update(
+            avg=round(statistics.fmean(latencies), 1),
+            p50=round(latencies[len(latencies) // 2], 1),
+            p95=round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+            max=round(latencies[-1], 1),
+        )
+
+    return {
+        "http2": config.HTTP2_ENABLED,
+        "max_connections": config.HTTP_MAX_CONNECTIONS,
+        "per_host_limit": config.HTTP_PER_HOST_LIMIT,
+        "active_hosts": len(_host_slots),
+        "connections": pool_connections(),
+        "latency_ms": latency,
+        **_counters,
+    }
@@ -0,0 +1,87 @@
+"""按分组打包的图标 data URI
+
+首页每个链接图标都是一次独立请求。这里把一个分组内所有本地图标的缩略图编码为
+data URI，合成一个 JSON 对象缓存到 data/icon_bundles。文件名是分组图标集合的
+哈希，图标按内容寻址，所以集合不变时包内容也不变；只有分组内的图标发生变化时
+才会生成新的包，其他分组的包不受影响。
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Iterable
+
+from app.core import config
+from app.core.icons import ICON_URL_PREFIX, HASHED_NAME_RE, variant_filename
+
+BUNDLE_SIZE = 128
+BUNDLE_FORMAT = "webp"
+# 超过该时长未被读取的包视为已失效（分组图标已变化），生成新包时顺带清理
+BUNDLE_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def bundle_icons(icons: Iterable[str | None]) -> list[str]:
+    """取出按内容哈希命名的本地图标，排序去重"""
+    return sorted({
+        icon
+        for icon in icons
+        if icon
+        and icon.startswith(ICON_URL_PREFIX)
+        and HASHED_NAME_RE.fullmatch(icon[len(ICON_URL_PREFIX):])
+    })
+
+
+def bundle_signature(icons: list[str]) -> str:
+    return hashlib.sha256("\n".join(icons).encode("utf-8")).hexdigest()
+
+
+def build_bundle(icons: list[str]) -> bytes:
+    """返回 {图标地址: data URI}；缺少缩略图的图标跳过，前端按原地址加载"""
+    bundle = {}
+    for icon in icons:
+        digest = HASHED_NAME_RE.fullmatch(icon[len(ICON_URL_PREFIX):]).group(1)
+        path = os.path.join(config.ICONS_DIR, variant_filename(digest, BUNDLE_SIZE, BUNDLE_FORMAT))
+        try:
+            with open(path, "rb") as icon_file:
+                data = icon_file.read()
+        except FileNotFoundError:
+            continue
+        bundle[icon] = f"data:image/{BUNDLE_FORMAT};base64,{base64.b64encode(data).decode('ascii')}"
+    return json.dumps(bundle, separators=(",", ":")).encode("utf-8")
+
+
+def prune_bundles() -> None:
+    cutoff = time.time() - BUNDLE_RETENTION_SECONDS
+    for filename in os.listdir(config.ICON_BUNDLE_DIR):
+        path = os.path.join(config.ICON_BUNDLE_DIR, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def load_group_bundle(signature: str, icons: list[str]) -> bytes:
+    """读取或生成分组的图标包（阻塞调用）"""
+    path = os.path.join(config.ICON_BUNDLE_DIR, f"{signature}.json")
+    try:
+        with open(path, "rb") as bundle_file:
+            data = bundle_file.read()
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        pass
+
+    data = build_bundle(icons)
+    fd, tmp_path = tempfile.mkstemp(dir=config.ICON_BUNDLE_DIR, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            output.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    prune_bundles()
+    return data
@@ -0,0 +1,58 @@
+"""未引用图标文件的定期清理
+
+链接更换或删除图标后，purge_unreferenced_icons 会跳过宽限期内的文件（可能正被
+并发的上传复用），这些文件之后不会再被单独检查。清理任务每隔 ICON_SWEEP_INTERVAL
+秒删除一次引用计数不大于 0 的记录，以及超过 ICON_SWEEP_GRACE 秒仍没有引用的图标
+文件和缩略图。编辑表单中上传或下载的图标在点击保存前没有引用，因此清理的宽限期
+按一次编辑的时长设置，而不是使用即时清理的 PURGE_GRACE_SECONDS。
+"""
+import asyncio
+import logging
+
+from app.core import config
+from app.core.icons import sweep_unreferenced_icons
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class IconSweeper:
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.removed = 0
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop(), name="icon-sweeper")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, "runs": self.runs, "removed": self.removed}
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"清理未引用图标失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """执行一次清理，返回删除的图标数"""
+        async with AsyncSessionLocal() as db:
+            removed = await sweep_unreferenced_icons(db)
+        self.runs += 1
+        self.removed += removed
+        if removed:
+            logger.info(f"已清理 {removed} 个未引用图标")
+        return removed
+
+
+icon_sweeper = IconSweeper(config.ICON_SWEEP_INTERVAL)
@@ -0,0 +1,335 @@
+"""链接图标的下载、校验与落盘
+
+远程图标以流式方式写入 ICONS_DIR 下的临时文件，超过字节上限立即中止；
+图片类型按文件头魔数判断而不是信任 Content-Type，Pillow 校验与重新编码
+放到线程中执行，最后通过 os.replace 原子地移动到正式文件名。
+
+图标按内容寻址，文件名为重新编码后字节的 sha256，相同图标只保存一份。
+引用计数保存在 icon_refs 表中，由 links 表上的触发器维护；链接更换或删除
+图标后调用 purge_unreferenced_icons，计数归零的文件才会被删除。刚写入的文件
+有 PURGE_GRACE_SECONDS 秒的宽限期，期间跳过的文件由 sweep_unreferenced_icons
+定期清理；编辑链接时上传或下载的图标在保存前没有引用，定期清理使用更长的
+ICON_SWEEP_GRACE，不会删除正在编辑的链接的图标。
+"""
+import asyncio
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+from functools import lru_cache
+from typing import Iterable
+
+import httpx
+from PIL import Image, ImageSequence, UnidentifiedImageError
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core import config
+from app.core.http_client import get_http_client, outbound_slot
+
+ICON_URL_PREFIX = "/static/icons/"
+HASHED_NAME_RE = re.compile(r"([0-9a-f]{64})\.[a-z0-9]+")
+VARIANT_NAME_RE = re.compile(r"([0-9a-f]{64})-\d+\.(?:webp|png)")
+# 首页图标显示为 60px，生成 1x/2x 所需的缩略图；WebP 为主，PNG 作为兼容回退
+VARIANT_SIZES = (32, 64, 128)
+VARIANT_FORMATS = {"webp": "WEBP", "png": "PNG"}
+# 刚写入或刚被复用的文件在宽限期内不清理，避免与并发保存同一图标的请求冲突
+PURGE_GRACE_SECONDS = 60
+
+ALLOWED_FORMATS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+}
+
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+MAX_WIDTH = 4096
+MAX_HEIGHT = 4096
+
+# 文件头魔数 -> Pillow 格式名；ICO 会被转换为 PNG 保存
+MAGIC_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"\x00\x00\x01\x00", "ICO"),
+)
+
+
+class IconError(Exception):
+    """图标无法下载或不是受支持的图片，消息可直接返回给用户"""
+
+
+def sniff_image_format(head: bytes) -> str | None:
+    for signature, image_format in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def normalise_icon(src, image_format: str) -> str:
+    """校验并重新编码图片，按内容哈希保存到 ICONS_DIR，返回图标地址（阻塞调用）
+
+    src 可以是文件路径或类文件对象。
+    """
+    try:
+        with Image.open(src) as image:
+            image.verify()
+        if hasattr(src, "seek"):
+            src.seek(0)
+        image = Image.open(src)
+    except (UnidentifiedImageError, OSError):
+        raise IconError("文件不是有效图片")
+
+    with image:
+        if image.width > MAX_WIDTH or image.height > MAX_HEIGHT:
+            raise IconError("图片尺寸过大")
+
+        save_format = "PNG" if image_format == "ICO" else image_format
+        if save_format not in ALLOWED_FORMATS:
+            raise IconError("仅支持 JPG、PNG、GIF、WEBP、ICO 图片")
+
+        save_kwargs = {}
+        if save_format == "GIF":
+            save_kwargs["save_all"] = getattr(image, "is_animated", False)
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if save_format in ("PNG", "WEBP") else "RGB")
+
+        output = io.BytesIO()
+        image.save(output, format=save_format, **save_kwargs)
+        data = output.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        write_variants(image, digest)
+
+    return write_icon_bytes(data, f"{digest}{ALLOWED_FORMATS[save_format]}")
+
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=config.ICONS_DIR, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            output.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_icon_bytes(data: bytes, filename: str) -> str:
+    path = os.path.join(config.ICONS_DIR, filename)
+    if os.path.exists(path):
+        # 内容相同的图标已存在，刷新修改时间以推迟清理
+        os.utime(path)
+    else:
+        write_file_atomic(path, data)
+    return ICON_URL_PREFIX + filename
+
+
+def variant_filename(digest: str, size: int, ext: str) -> str:
+    return f"{digest}-{size}.{ext}"
+
+
+def write_variants(image: Image.Image, digest: str) -> None:
+    """生成固定尺寸的缩略图，已存在的跳过；动图取第一帧"""
+    frame = None
+    for size in VARIANT_SIZES:
+        for ext, image_format in VARIANT_FORMATS.items():
+            path = os.path.join(config.ICONS_DIR, variant_filename(digest, size, ext))
+            if os.path.exists(path):
+                continue
+            if frame is None:
+                frame = next(ImageSequence.Iterator(image)).convert("RGBA")
+
+            thumb = frame.copy()
+            thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            if image_format == "WEBP":
+                thumb.save(output, format="WEBP", quality=90, method=6)
+            else:
+                thumb.save(output, format="PNG", optimize=True)
+            write_file_atomic(path, output.getvalue())
+
+
+@lru_cache(maxsize=8192)
+def icon_variant_urls(icon: str | None) -> dict | None:
+    """按内容哈希命名的本地图标返回各尺寸缩略图地址，其他图标返回 None
+
+    结果按图标地址缓存，多次调用返回同一个 dict，调用方不应修改。
+    """
+    if not icon or not icon.startswith(ICON_URL_PREFIX):
+        return None
+    match = HASHED_NAME_RE.fullmatch(icon[len(ICON_URL_PREFIX):])
+    if not match:
+        return None
+
+    digest = match.group(1)
+    return {
+        str(size): {
+            ext: ICON_URL_PREFIX + variant_filename(digest, size, ext) for ext in VARIANT_FORMATS
+        }
+        for size in VARIANT_SIZES
+    }
+
+
+def ensure_icon_variants() -> int:
+    """为缺少缩略图的已有图标补生成缩略图，返回处理的图标数（阻塞调用）"""
+    generated = 0
+    for filename in os.listdir(config.ICONS_DIR):
+        match = HASHED_NAME_RE.fullmatch(filename)
+        if not match:
+            continue
+        digest = match.group(1)
+        if all(
+            os.path.exists(os.path.join(config.ICONS_DIR, variant_filename(digest, size, ext)))
+            for size in VARIANT_SIZES
+            for ext in VARIANT_FORMATS
+        ):
+            continue
+
+        try:
+            with Image.open(os.path.join(config.ICONS_DIR, filename)) as image:
+                write_variants(image, digest)
+            generated += 1
+        except (UnidentifiedImageError, OSError) as e:
+            print(f"生成图标缩略图失败 {filename}: {e}")
+    return generated
+
+
+def remove_icon_files(filename: str) -> None:
+    """删除图标文件及其缩略图"""
+    os.remove(os.path.join(config.ICONS_DIR, filename))
+    match = HASHED_NAME_RE.fullmatch(filename)
+    if match:
+        for size in VARIANT_SIZES:
+            for ext in VARIANT_FORMATS:
+                try:
+                    os.remove(os.path.join(config.ICONS_DIR, variant_filename(match.group(1), size, ext)))
+                except FileNotFoundError:
+                    pass
+
+
+async def store_icon_bytes(data: bytes) -> str:
+    """保存用户上传的图标，返回图标地址"""
+    image_format = sniff_image_format(data[:16])
+    if image_format is None:
+        raise IconError("仅支持 JPG、PNG、GIF、WEBP、ICO 图片")
+    return await asyncio.to_thread(normalise_icon, io.BytesIO(data), image_format)
+
+
+def icon_file_path(icon: str) -> str:
+    return os.path.join(config.ICONS_DIR, os.path.basename(icon[len(ICON_URL_PREFIX):]))
+
+
+async def purge_unreferenced_icons(db: AsyncSession, icons: Iterable[str | None]) -> None:
+    """删除引用计数已归零的本地图标文件，需在相关修改提交后调用"""
+    candidates = {icon for icon in icons if icon and icon.startswith(ICON_URL_PREFIX)}
+    if not candidates:
+        return
+
+    referenced = set(
+        await db.scalars(select(models.IconRef.icon).where(models.IconRef.icon.in_(candidates)))
+    )
+    for icon in candidates - referenced:
+        path = icon_file_path(icon)
+        try:
+            if time.time() - os.path.getmtime(path) > PURGE_GRACE_SECONDS:
+                remove_icon_files(os.path.basename(path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"清理旧图标文件失败: {e}")
+
+
+def remove_expired_icon_files(referenced: set[str], grace: int) -> int:
+    """删除 ICONS_DIR 中超过 grace 秒未修改且未被引用的图标及缩略图，返回删除的图标数
+
+    旧版 uuid 文件名的图标不在此处理，由管理后台的冗余图标清理负责。
+    """
+    now = time.time()
+    removed = 0
+    with os.scandir(config.ICONS_DIR) as entries:
+        files = [entry for entry in entries if entry.is_file()]
+    digests = {match.group(1) for entry in files if (match := HASHED_NAME_RE.fullmatch(entry.name))}
+    for entry in files:
+        main = HASHED_NAME_RE.fullmatch(entry.name) is not None
+        if main:
+            orphan = ICON_URL_PREFIX + entry.name not in referenced
+        else:
+            # 原图已删除的缩略图
+            match = VARIANT_NAME_RE.fullmatch(entry.name)
+            orphan = match is not None and match.group(1) not in digests
+        if not orphan:
+            continue
+        try:
+            if now - entry.stat().st_mtime > grace:
+                if main:
+                    remove_icon_files(entry.name)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"清理未引用图标失败 {entry.name}: {e}")
+    return removed
+
+
+async def sweep_unreferenced_icons(db: AsyncSession) -> int:
+    """清理引用计数不大于 0 的记录以及超过 ICON_SWEEP_GRACE 秒仍未引用的图标文件"""
+    await db.execute(delete(models.IconRef).where(models.IconRef.refcount <= 0))
+    await db.commit()
+    referenced = set(await db.scalars(select(models.IconRef.icon)))
+    return await asyncio.to_thread(remove_expired_icon_files, referenced, config.ICON_SWEEP_GRACE)
+
+
+async def stream_to_file(url: str, output) -> bytes:
+    """把响应体分块写入 output，返回文件头部字节；超过上限抛出 IconError"""
+    async with outbound_slot(url):
+        async with get_http_client().stream("GET", url) as response:
+            if response.status_code != 200:
+                raise IconError(f"远程服务器返回状态码 {response.status_code}")
+
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > MAX_FILE_SIZE:
+                raise IconError("图标文件超过 5MB")
+
+            head = b""
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > MAX_FILE_SIZE:
+                    raise IconError("图标文件超过 5MB")
+                if len(head) < 16:
+                    head += chunk[: 16 - len(head)]
+                output.write(chunk)
+            return head
+
+
+async def download_icon(url: str) -> str:
+    """下载远程图标并保存，返回 /static/icons/ 下的地址"""
+    fd, tmp_path = tempfile.mkstemp(dir=config.ICONS_DIR, prefix=".", suffix=".download")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            try:
+                head = await asyncio.wait_for(
+                    stream_to_file(url, output), timeout=config.ICON_DOWNLOAD_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                raise IconError("下载超时")
+            except (httpx.InvalidURL, httpx.UnsupportedProtocol):
+                raise IconError("图标地址无效")
+            except httpx.HTTPError as exc:
+                raise IconError(f"请求失败: {exc}")
+
+        image_format = sniff_image_format(head)
+        if image_format is None:
+            raise IconError("仅支持 JPG、PNG、GIF、WEBP、ICO 图片")
+        return await asyncio.to_thread(normalise_icon, tmp_path, image_format)
+    finally:
+        os.unlink(tmp_path)
@@ -0,0 +1,117 @@
+"""服务端渲染的首页（SERVER_RENDER_INDEX）
+
+开启后访问 / 时，把与 /api/bootstrap 相同的首屏数据以 JSON 内联到 index.html 中，
+站点标题和自定义样式直接写入 <head>，浏览器拿到页面后无需再请求接口即可渲染链接。
+自定义脚本随内联的系统配置下发，仍由前端在渲染完成后注入，执行时机与之前一致。
+
+令牌保存在 localStorage 中，服务端看不到；前端在服务端渲染模式下把它同步到同名 cookie，
+服务端据此识别用户。cookie 与 localStorage 不一致时（刚登录、退出或切换账号后的第一次访问）
+前端忽略内联数据，改为请求 /api/bootstrap。
+
+渲染结果按用户缓存原文与 gzip 压缩结果，数据版本号或模板变化时重新渲染。
+"""
+import hashlib
+import html
+import os
+import re
+from collections import OrderedDict
+
+import orjson
+
+from app.core import config
+from app.core.dashboard import PAYLOAD_FORMAT, RenderedPayload, make_payload
+from app.core.data_versions import make_etag
+
+TEMPLATE_PATH = os.path.join(config.STATIC_DIR, "index.html")
+TOKEN_COOKIE = "onepanel_token"
+# 缓存的页面数，超出后淘汰最久未访问的用户
+MAX_PAGES = 256
+
+TITLE_RE = re.compile(r"<title>.*?</title>", re.S)
+STYLE_END_RE = re.compile(r"</(style)", re.I)
+
+
+def inline_json(data) -> bytes:
+    # JSON 字符串中的 < 转义为 \u003c，内容无法提前结束 <script> 标签
+    return orjson.dumps(data).replace(b"<", b"\\u003c")
+
+
+def inline_styles(styles: str) -> str:
+    return STYLE_END_RE.sub(r"<\\/\1", styles)
+
+
+class IndexTemplate:
+    """index.html 模板，文件修改后自动重新读取"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: float | None = None
+        self._text = ""
+        self.stamp = ""
+
+    def load(self) -> "IndexTemplate":
+        mtime = os.stat(self.path).st_mtime
+        if mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as f:
+                self._text = f.read()
+            self.stamp = hashlib.sha256(self._text.encode("utf-8")).hexdigest()[:8]
+            self._mtime = mtime
+        return self
+
+    def render(self, data: dict) -> bytes:
+        site = data.get("config") or {}
+        page = self._text
+        if site.get("site_title"):
+            title = f"<title>{html.escape(site['site_title'])}</title>"
+            page = TITLE_RE.sub(lambda _: title, page, count=1)
+
+        styles = site.get("custom_styles") or ""
+        if styles.strip():
+            style_tag = f'<style id="onepanel-custom-css">{inline_styles(styles)}</style>\n'
+            page = page.replace("</head>", style_tag + "</head>", 1)
+
+        head, sep, tail = page.rpartition("</body>")
+        return b"".join([
+            head.encode("utf-8"),
+            b'<script id="onepanel-bootstrap" type="application/json">',
+            inline_json(data),
+            b"</script>\n",
+            (sep + tail).encode("utf-8"),
+        ])
+
+
+class IndexPageCache:
+    """按用户缓存渲染好的首页，ETag 相同时直接复用；访客的用户 id 为 0"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._pages: OrderedDict[int, RenderedPayload] = OrderedDict()
+        self.hits = 0
+        self.renders = 0
+
+    def etag(self, template: IndexTemplate, user_id: int | None, versions: dict[str, int]) -> str:
+        return make_etag(f"i{PAYLOAD_FORMAT}{template.stamp}", user_id, versions)
+
+    def get(self, user_id: int | None, etag: str) -> RenderedPayload | None:
+        page = self._pages.get(user_id or 0)
+        if page is None or page.etag != etag:
+            return None
+        self._pages.move_to_end(user_id or 0)
+        self.hits += 1
+        return page
+
+    def put(self, user_id: int | None, etag: str, versions: dict[str, int], body: bytes) -> RenderedPayload:
+        page = make_payload(versions, etag, body)
+        self._pages[user_id or 0] = page
+        self._pages.move_to_end(user_id or 0)
+        while len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+        self.renders += 1
+        return page
+
+    def stats(self) -> dict:
+        return {"pages": len(self._pages), "hits": self.hits, "renders": self.renders}
+
+
+index_template = IndexTemplate(TEMPLATE_PATH)
+index_pages = IndexPageCache(MAX_PAGES)
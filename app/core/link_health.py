@@ -0,0 +1,260 @@
+"""链接可用性后台巡检
+
+巡检任务定期领取超过 HEALTH_CHECK_STALE 秒未检查的链接，只检查这些过期链接。
+领取时用一条 UPDATE ... RETURNING 先写入 health_checked_at，多进程部署时
+同一链接不会被重复领取；进程中途退出的链接等到下次过期再检查。
+
+每个 URL 先发 HEAD，失败或返回错误码时再用 GET 确认（部分站点不支持 HEAD）。
+请求经过 outbound_slot 的全局与单站点并发限制，另外同一站点两次请求之间
+至少间隔 HEALTH_CHECK_HOST_INTERVAL_MS 毫秒，避免短时间内集中访问同一站点。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+import httpx
+from sqlalchemy import bindparam, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core import config
+from app.core.http_client import get_http_client, host_key, outbound_slot
+from app.core.url_metadata import utcnow
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_BROKEN = "broken"
+STATUS_UNREACHABLE = "unreachable"
+# 手动触发时，最近这段时间内检查过的链接不会重复检查
+RECHECK_COOLDOWN = 300
+
+
+@dataclass(slots=True)
+class HealthResult:
+    status: str
+    code: int | None
+    latency_ms: int | None
+
+
+def stale_condition():
+    cutoff = utcnow() - timedelta(seconds=config.HEALTH_CHECK_STALE)
+    return or_(models.Link.health_checked_at.is_(None), models.Link.health_checked_at < cutoff)
+
+
+async def request_status(method: str, url: str) -> int:
+    async with outbound_slot(url):
+        # 只需要状态码，不读取响应体
+        async with get_http_client().stream(method, url) as response:
+            return response.status_code
+
+
+async def check_url(url: str) -> HealthResult:
+    started = time.perf_counter()
+    try:
+        code = await request_status("HEAD", url)
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol):
+        return HealthResult(STATUS_UNREACHABLE, None, None)
+    except httpx.HTTPError:
+        code = None
+
+    if code is None or code >= 400:
+        started = time.perf_counter()
+        try:
+            code = await request_status("GET", url)
+        except httpx.HTTPError:
+            return HealthResult(STATUS_UNREACHABLE, None, None)
+
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    return HealthResult(STATUS_OK if code < 400 else STATUS_BROKEN, code, latency_ms)
+
+
+class HostThrottle:
+    """同一站点的请求按最小间隔排队"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_at: dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        key = host_key(url)
+        now = time.monotonic()
+        scheduled = max(now, self._next_at.get(key, 0.0))
+        self._next_at[key] = scheduled + self.interval
+        if scheduled > now:
+            await asyncio.sleep(scheduled - now)
+
+    def prune(self) -> None:
+        now = time.monotonic()
+        self._next_at = {key: at for key, at in self._next_at.items() if at > now}
+
+
+class LinkHealthChecker:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._throttle = HostThrottle(config.HEALTH_CHECK_HOST_INTERVAL_MS / 1000)
+        self.checked = 0
+        self.ok = 0
+        self.failed = 0
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self.concurrency > 0:
+            self._task = asyncio.create_task(self._loop(), name="link-health-checker")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def stats(self, db: AsyncSession) -> dict:
+        stale, broken, unreachable = (
+            await db.execute(
+                select(
+                    func.count().filter(stale_condition()),
+                    func.count().filter(models.Link.health_status == STATUS_BROKEN),
+                    func.count().filter(models.Link.health_status == STATUS_UNREACHABLE),
+                ).select_from(models.Link)
+            )
+        ).one()
+        return {
+            "running": self._task is not None,
+            "stale": stale,
+            "broken": broken,
+            "unreachable": unreachable,
+            "checked": self.checked,
+            "ok": self.ok,
+            "failed": self.failed,
+        }
+
+    async def request_recheck(self, db: AsyncSession, user_id: int) -> int:
+        """把用户较早检查过的链接标记为过期并唤醒巡检，返回待检查数量"""
+        cutoff = utcnow() - timedelta(seconds=RECHECK_COOLDOWN)
+        owned_groups = select(models.Group.id).where(models.Group.user_id == user_id)
+        await db.execute(
+            update(models.Link)
+            .where(models.Link.group_id.in_(owned_groups), models.Link.health_checked_at < cutoff)
+            .values(health_checked_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        queued = await db.scalar(
+            select(func.count())
+            .select_from(models.Link)
+            .where(models.Link.group_id.in_(owned_groups), stale_condition())
+        )
+        await db.commit()
+        self.notify()
+        return queued
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                checked = await self.run_once()
+            except Exception as e:
+                logger.error(f"链接巡检失败: {e}")
+                checked = 0
+
+            # 还有过期链接时立即处理下一批，否则等待下一轮或手动触发
+            if checked < config.HEALTH_CHECK_BATCH:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=config.HEALTH_CHECK_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """检查一批过期链接，返回本批链接数"""
+        links = await self._claim()
+        if not links:
+            return 0
+
+        # 同一 URL 只请求一次
+        urls = {url for _, url in links}
+        semaphore = asyncio.Semaphore(self.concurrency or 1)
+
+        async def check(url: str) -> tuple[str, HealthResult]:
+            # 先按站点间隔排队再占用并发名额，等待中的请求不占名额
+            await self._throttle.wait(url)
+            async with semaphore:
+                try:
+                    return url, await check_url(url)
+                except Exception as e:
+                    # 整批链接已标记为检查过，单个 URL 出错也要写入结果，其余链接的结果照常保存
+                    logger.warning(f"检查链接失败 {url}: {e}")
+                    return url, HealthResult(STATUS_UNREACHABLE, None, None)
+
+        results = dict(await asyncio.gather(*(check(url) for url in urls)))
+        self._throttle.prune()
+        await self._save(links, results)
+        return len(links)
+
+    async def _claim(self) -> list[tuple[int, str]]:
+        async with AsyncSessionLocal() as db:
+            due = (
+                select(models.Link.id)
+                .where(stale_condition())
+                .order_by(models.Link.health_checked_at.asc().nulls_first())
+                .limit(config.HEALTH_CHECK_BATCH)
+            )
+            claimed = (
+                await db.execute(
+                    update(models.Link)
+                    .where(models.Link.id.in_(due), stale_condition())
+                    .values(health_checked_at=utcnow())
+                    .returning(models.Link.id, models.Link.url)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            await db.commit()
+        return [(link_id, url) for link_id, url in claimed]
+
+    async def _save(self, links: list[tuple[int, str]], results: dict[str, HealthResult]) -> None:
+        rows = []
+        for link_id, url in links:
+            result = results[url]
+            rows.append({
+                "link_id": link_id,
+                "link_url": url,
+                "status": result.status,
+                "code": result.code,
+                "latency_ms": result.latency_ms,
+                "passed": result.status == STATUS_OK,
+            })
+            self.checked += 1
+            if result.status == STATUS_OK:
+                self.ok += 1
+            else:
+                self.failed += 1
+
+        async with AsyncSessionLocal() as db:
+            # 检查期间 URL 被修改的链接不写入结果，等待重新检查
+            await db.execute(
+                update(models.Link.__table__)
+                .where(
+                    models.Link.id == bindparam("link_id"),
+                    models.Link.url == bindparam("link_url"),
+                )
+                .values(
+                    health_status=bindparam("status"),
+                    health_code=bindparam("code"),
+                    health_latency_ms=bindparam("latency_ms"),
+                    health_failures=case(
+                        (bindparam("passed"), 0), else_=models.Link.health_failures + 1
+                    ),
+                ),
+                rows,
+            )
+            await db.commit()
+
+
+link_health = LinkHealthChecker(config.HEALTH_CHECK_CONCURRENCY)
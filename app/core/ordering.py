@@ -0,0 +1,123 @@
+"""链接与分组的稀疏排序键
+
+order 字段按 ORDER_GAP 的间隔分配，拖拽移动一个链接时取前后两个邻居的中间值，
+只需要更新这一行。相邻键之间没有空隙时先对该分组做一次重排（rebalance），
+把键重新压缩为 ORDER_GAP 的整数倍。整体重排使用单条 UPDATE ... CASE。
+"""
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+
+ORDER_GAP = 1024
+
+# 按当前顺序把每个分组内的键压缩为 1024, 2048, ...（SQLite 3.33+ 支持 UPDATE ... FROM）
+REBALANCE_LINKS_SQL = """
+UPDATE links SET "order" = ranked.position * :gap
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY "order", id) AS position
+    FROM links {where}
+) AS ranked
+WHERE links.id = ranked.id
+"""
+REBALANCE_GROUPS_SQL = """
+UPDATE groups SET "order" = ranked.position * :gap
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY "order", id) AS position
+    FROM groups
+) AS ranked
+WHERE groups.id = ranked.id
+"""
+
+
+async def next_link_order(db: AsyncSession, group_id: int) -> int:
+    """分组末尾的排序键"""
+    last = await db.scalar(
+        select(func.max(models.Link.order)).where(models.Link.group_id == group_id)
+    )
+    return (last or 0) + ORDER_GAP
+
+
+async def next_group_order(db: AsyncSession, user_id: int) -> int:
+    last = await db.scalar(
+        select(func.max(models.Group.order)).where(models.Group.user_id == user_id)
+    )
+    return (last or 0) + ORDER_GAP
+
+
+async def rebalance_links(db: AsyncSession, group_id: int | None = None) -> None:
+    """重新压缩链接排序键；不指定分组时处理全部分组"""
+    if group_id is None:
+        await db.execute(text(REBALANCE_LINKS_SQL.format(where="")), {"gap": ORDER_GAP})
+    else:
+        await db.execute(
+            text(REBALANCE_LINKS_SQL.format(where="WHERE group_id = :group_id")),
+            {"gap": ORDER_GAP, "group_id": group_id},
+        )
+
+
+async def rebalance_groups(db: AsyncSession) -> None:
+    await db.execute(text(REBALANCE_GROUPS_SQL), {"gap": ORDER_GAP})
+
+
+async def link_order_at(db: AsyncSession, group_id: int, position: int, link_id: int) -> int | None:
+    """把链接放到分组第 position 位（不含自身）所需的排序键，没有空隙时返回 None"""
+    position = max(position, 0)
+    neighbours = (
+        await db.scalars(
+            select(models.Link.order)
+            .where(models.Link.group_id == group_id, models.Link.id != link_id)
+            .order_by(models.Link.order.asc(), models.Link.id.asc())
+            .offset(max(position - 1, 0))
+            .limit(2)
+        )
+    ).all()
+
+    if position > 0 and not neighbours:
+        # 位置超出末尾时追加到最后
+        last = await db.scalar(
+            select(func.max(models.Link.order))
+            .where(models.Link.group_id == group_id, models.Link.id != link_id)
+        )
+        return (last or 0) + ORDER_GAP
+    if position == 0:
+        before, after = None, neighbours[0] if neighbours else None
+    else:
+        before = neighbours[0] if neighbours else None
+        after = neighbours[1] if len(neighbours) > 1 else None
+
+    if before is None and after is None:
+        return ORDER_GAP
+    if after is None:
+        return before + ORDER_GAP
+    if before is None:
+        return after - ORDER_GAP
+    if after - before < 2:
+        return None
+    return (before + after) // 2
+
+
+def ordered_case(column, ids: list[int]):
+    """按 ids 的顺序生成 CASE id WHEN ... THEN 1024 * n 表达式"""
+    return case(
+        {item_id: (index + 1) * ORDER_GAP for index, item_id in enumerate(ids)}, value=column
+    )
+
+
+def reorder_links_stmt(group_id: int, link_ids: list[int], owned_groups):
+    """整组重排的单条 UPDATE；只处理属于 owned_groups 子查询中分组的链接"""
+    return (
+        update(models.Link)
+        .where(models.Link.id.in_(link_ids), models.Link.group_id.in_(owned_groups))
+        .values(order=ordered_case(models.Link.id, link_ids), group_id=group_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reorder_groups_stmt(user_id: int, group_ids: list[int]):
+    return (
+        update(models.Group)
+        .where(models.Group.id.in_(group_ids), models.Group.user_id == user_id)
+        .values(order=ordered_case(models.Group.id, group_ids))
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,196 @@
+"""链接标题的拼音前缀索引，用于首页搜索框的输入补全
+
+每个链接的 title 和 http_title 转换为全拼与首字母两类键（如 “百度一下” 得到
+baiduyixia、bdyx，以及从每个字开始的后缀 duyixia、dyx ...），键与链接 id
+组成有序数组，前缀查询用二分查找定位。查询中的汉字同样转换为全拼，
+因此输入 “百度”、“baidu”、“bd” 都能命中。
+
+索引按数据版本号的范围分片：公共分组一片，每个用户自己的分组各一片，每片是
+(键, 链接 id) 的有序数组，查询只访问访问者可见的分片。分片记录构建时的版本号，
+链接或分组修改后数据库触发器会递增所在范围的版本号（其他 worker 进程的修改也一样），
+下次查询发现版本号变化时只重建这一片。键按标题缓存，重建主要是读库和排序。
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+
+from pypinyin import lazy_pinyin
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core.dashboard import PUBLIC_GROUP_ID
+from app.core.data_versions import PUBLIC_SCOPE, get_versions, user_scope
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+KEY_LENGTH = 32
+# 只为前若干个字生成后缀键，长标题末尾的词无法从中间开始匹配
+MAX_SUFFIXES = 12
+# 链接数超过该数量的分片在线程中计算键
+THREAD_THRESHOLD = 100
+# 保留的分片数，超出后淘汰最久未查询的用户
+MAX_SHARDS = 1024
+WORD_RE = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """汉字按字转为拼音，其余部分按字母数字切词"""
+    tokens = []
+    for segment in lazy_pinyin(text):
+        tokens.extend(WORD_RE.findall(segment.lower()))
+    return tokens
+
+
+@lru_cache(maxsize=65536)
+def text_keys(text: str) -> frozenset[str]:
+    tokens = tokenize(text)
+    keys = set()
+    for start in range(min(len(tokens), MAX_SUFFIXES)):
+        rest = tokens[start:]
+        keys.add("".join(rest)[:KEY_LENGTH])
+        keys.add("".join(token[0] for token in rest)[:KEY_LENGTH])
+    return frozenset(keys)
+
+
+def link_keys(title: str | None, http_title: str | None) -> frozenset[str]:
+    return text_keys(title or "") | text_keys(http_title or "")
+
+
+def query_key(q: str) -> str:
+    return "".join(tokenize(q))[:KEY_LENGTH]
+
+
+def compute_rows(rows) -> dict[int, tuple[int, frozenset[str]] | None]:
+    """(id, group_id, title, http_title) 转换为 {id: (group_id, keys)}"""
+    return {
+        link_id: (group_id, link_keys(title, http_title))
+        for link_id, group_id, title, http_title in rows
+    }
+
+
+
+@dataclass(slots=True)
+class Shard:
+    version: int
+    entries: list[tuple[str, int]]
+    groups: dict[int, int]
+
+    def matches(self, prefix: str, group_ids: set[int], limit: int) -> list[tuple[str, int]]:
+        """键以 prefix 开头、且位于 group_ids 分组中的 (键, 链接 id)，每个链接取字典序最小的键"""
+        found: list[tuple[str, int]] = []
+        seen: set[int] = set()
+        entries = self.entries
+        index = bisect.bisect_left(entries, (prefix,))
+        while index < len(entries) and len(found) < limit:
+            key, link_id = entries[index]
+            if not key.startswith(prefix):
+                break
+            if link_id not in seen and self.groups[link_id] in group_ids:
+                seen.add(link_id)
+                found.append((key, link_id))
+            index += 1
+        return found
+
+
+def build_shard(version: int, rows) -> Shard:
+    computed = compute_rows(rows)
+    entries = sorted((key, link_id) for link_id, (_, keys) in computed.items() for key in keys)
+    return Shard(version, entries, {link_id: group_id for link_id, (group_id, _) in computed.items()})
+
+
+def scope_links(user_id: int | None):
+    """某个分片包含的链接：公共分组，或用户自己的其他分组"""
+    query = select(models.Link.id, models.Link.group_id, models.Link.title, models.Link.http_title)
+    if user_id is None:
+        return query.where(models.Link.group_id == PUBLIC_GROUP_ID)
+    return query.join(models.Group).where(
+        models.Group.user_id == user_id, models.Group.id != PUBLIC_GROUP_ID
+    )
+
+
+class PinyinIndex:
+    def __init__(self, max_shards: int):
+        self.max_shards = max_shards
+        self._shards: OrderedDict[str, Shard] = OrderedDict()
+        self._builds: dict[str, asyncio.Task] = {}
+        self.lookups = 0
+        self.rebuilds = 0
+
+    def stats(self) -> dict:
+        return {
+            "shards": len(self._shards),
+            "links": sum(len(shard.groups) for shard in self._shards.values()),
+            "keys": sum(len(shard.entries) for shard in self._shards.values()),
+            "lookups": self.lookups,
+            "rebuilds": self.rebuilds,
+        }
+
+    async def lookup(
+        self, db: AsyncSession, user_id: int | None, q: str, group_ids: set[int], limit: int
+    ) -> list[int]:
+        """返回键以 q 的拼音开头、且位于 group_ids 分组中的链接 id，按键的字典序"""
+        prefix = query_key(q)
+        if not prefix:
+            return []
+        self.lookups += 1
+
+        owners: dict[str, int | None] = {}
+        if PUBLIC_GROUP_ID in group_ids:
+            owners[PUBLIC_SCOPE] = None
+        if user_id and group_ids - {PUBLIC_GROUP_ID}:
+            owners[user_scope(user_id)] = user_id
+        if not owners:
+            return []
+
+        versions = await get_versions(db, list(owners))
+        shards = [
+            await self._shard(scope, owners[scope], version) for scope, version in versions.items()
+        ]
+        matches = heapq.merge(*(shard.matches(prefix, group_ids, limit) for shard in shards))
+        return [link_id for _, link_id in islice(matches, limit)]
+
+    async def _shard(self, scope: str, user_id: int | None, version: int) -> Shard:
+        shard = self._shards.get(scope)
+        # 进行中的重建可能读到的是本次修改之前的数据，版本号仍然落后时再重建一次
+        while shard is None or shard.version < version:
+            task = self._builds.get(scope)
+            if task is None:
+                task = asyncio.create_task(self._build(scope, user_id), name=f"pinyin-index-{scope}")
+                self._builds[scope] = task
+            shard = await asyncio.shield(task)
+        self._shards.move_to_end(scope)
+        return shard
+
+    async def _build(self, scope: str, user_id: int | None) -> Shard:
+        try:
+            async with AsyncSessionLocal() as db:
+                # 先读版本号再读链接，链接不会比版本号旧；之后的修改会让版本号继续递增
+                version = (await get_versions(db, [scope]))[scope]
+                rows = (await db.execute(scope_links(user_id))).all()
+            if len(rows) > THREAD_THRESHOLD:
+                shard = await asyncio.to_thread(build_shard, version, rows)
+            else:
+                shard = build_shard(version, rows)
+        except Exception as e:
+            logger.error(f"拼音索引构建失败 {scope}: {e}")
+            raise
+        finally:
+            self._builds.pop(scope, None)
+
+        self._shards[scope] = shard
+        self._shards.move_to_end(scope)
+        while len(self._shards) > self.max_shards:
+            self._shards.popitem(last=False)
+        self.rebuilds += 1
+        return shard
+
+
+pinyin_index = PinyinIndex(MAX_SHARDS)
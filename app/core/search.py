@@ -0,0 +1,71 @@
+"""基于 SQLite FTS5 的链接与用户搜索
+
+links_fts / users_fts 是 trigram 分词的外部内容表（见迁移 0007），由触发器与
+links、users 表保持同步。trigram 索引只能匹配不少于 3 个字符的词，查询中有
+更短的词时退回 LIKE 子串匹配，两种方式的结果一致，只是短查询无法使用索引。
+"""
+from sqlalchemy import Select, and_, column, func, literal_column, or_, select, table
+
+from app import models
+
+MIN_TOKEN_LENGTH = 3
+
+links_fts = table("links_fts", column("rowid"))
+users_fts = table("users_fts", column("rowid"))
+# 标题权重最高，其次是网页标题，URL 最低
+LINK_RANK = literal_column("bm25(links_fts, 10.0, 2.0, 5.0)")
+
+
+def split_terms(q: str) -> list[str]:
+    return [term for term in q.split() if term]
+
+
+def match_expression(terms: list[str]) -> str | None:
+    """把用户输入转换为 FTS5 查询：每个词作为短语，多个词同时命中；有短词时返回 None"""
+    if not terms or any(len(term) < MIN_TOKEN_LENGTH for term in terms):
+        return None
+    return " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def like_any(columns, term: str):
+    pattern = f"%{escape_like(term)}%"
+    return or_(*(col.ilike(pattern, escape="\\") for col in columns))
+
+
+def search_links(query: Select, q: str) -> Select:
+    """给链接查询加上搜索条件，能用索引时按相关度排序"""
+    terms = split_terms(q)
+    if not terms:
+        return query
+    expression = match_expression(terms)
+    if expression is None:
+        columns = (models.Link.title, models.Link.url, models.Link.http_title)
+        return query.where(and_(*(like_any(columns, term) for term in terms)))
+
+    return (
+        query.join(links_fts, links_fts.c.rowid == models.Link.id)
+        .where(literal_column("links_fts").op("MATCH")(expression))
+        .order_by(LINK_RANK)
+    )
+
+
+def search_users(query: Select, q: str) -> Select:
+    terms = split_terms(q)
+    if not terms:
+        return query
+    expression = match_expression(terms)
+    if expression is None:
+        return query.where(and_(*(like_any((models.User.username,), term) for term in terms)))
+
+    matched = select(users_fts.c.rowid).where(
+        literal_column("users_fts").op("MATCH")(expression)
+    )
+    return query.where(models.User.id.in_(matched))
+
+
+def count_of(query: Select) -> Select:
+    return select(func.count()).select_from(query.order_by(None).subquery())
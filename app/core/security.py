@@ -1,5 +1,8 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 import bcrypt
 if not hasattr(bcrypt, "__about__"):
@@ -8,17 +11,102 @@ if not hasattr(bcrypt, "__about__"):
     bcrypt.__about__ = About()
 from passlib.context import CryptContext
 import hashlib
-from app.core.config import ACCESS_TOKEN_EXPIRE_DAYS, ALGORITHM, SECRET_KEY
+from passlib.hash import argon2
+from app.core.config import (
+    ACCESS_TOKEN_EXPIRE_DAYS,
+    ALGORITHM,
+    ARGON2_MEMORY_COST_KB,
+    ARGON2_PARALLELISM,
+    ARGON2_TIME_COST,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_QUEUE_LIMIT,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_SCHEME,
+    SECRET_KEY,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if PASSWORD_SCHEME == "argon2" and not argon2.has_backend():
+    raise RuntimeError("PASSWORD_SCHEME=argon2 需要先安装 argon2-cffi：pip install argon2-cffi")
+
+
+def build_crypt_context(
+    scheme: str = PASSWORD_SCHEME,
+    bcrypt_rounds: int = BCRYPT_ROUNDS,
+    argon2_time_cost: int = ARGON2_TIME_COST,
+) -> CryptContext:
+    # 非当前方案会被标记为 deprecated；min/max_rounds 与目标值一致，
+    # 成本参数变化（调高或调低）后旧哈希都会被 needs_update 识别出来
+    schemes = [scheme] + [item for item in ("bcrypt", "argon2") if item != scheme]
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__default_rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__memory_cost=ARGON2_MEMORY_COST_KB,
+        argon2__parallelism=ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = build_crypt_context()
+
+def prehash_password(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 def get_password_hash(password: str):
-    pw_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
-    return pwd_context.hash(pw_hash)
+    return pwd_context.hash(prehash_password(password))
 
 def verify_password(plain_password: str, hashed_password: str):
-    pw_hash = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
-    return pwd_context.verify(pw_hash, hashed_password)
+    return pwd_context.verify(prehash_password(plain_password), hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """校验密码；若哈希方案或成本参数已过时，同时返回按当前配置重新计算的哈希"""
+    return pwd_context.verify_and_update(prehash_password(plain_password), hashed_password)
+
+# bcrypt 单次耗时约数百毫秒，放到独立线程池执行，避免阻塞事件循环；
+# 排队数超过上限时直接返回 429，而不是让请求无限堆积
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+password_pool_stats = {"pending": 0, "completed": 0, "rejected": 0}
+
+
+async def run_password_job(func, *args):
+    if password_pool_stats["pending"] >= PASSWORD_HASH_QUEUE_LIMIT:
+        password_pool_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="当前登录请求过多，请稍后再试",
+            headers={"Retry-After": "1"},
+        )
+
+    password_pool_stats["pending"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        password_pool_stats["pending"] -= 1
+        password_pool_stats["completed"] += 1
+
+
+async def get_password_hash_async(password: str):
+    return await run_password_job(get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    return await run_password_job(verify_and_update_password, plain_password, hashed_password)
+
+
+def get_password_pool_stats() -> dict:
+    return {
+        "scheme": PASSWORD_SCHEME,
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        **password_pool_stats,
+    }
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -0,0 +1,233 @@
+"""网页标题后台抓取队列
+
+新增或修改链接时只写入一条 title_jobs 记录并把链接标记为 pending，
+由若干 asyncio worker 在后台抓取标题后回填 http_title。任务存放在 SQLite 中，
+服务重启后会继续执行；领取任务时写入 locked_until 租约，多进程部署时
+同一任务只会被一个 worker 执行，进程崩溃后租约到期任务会被重新领取。
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core import config
+from app.core.crawler import TitleFetchError
+from app.core.url_metadata import get_cached_metadata, url_metadata, utcnow
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=config.TITLE_FETCH_RETRY_BASE * 2 ** (attempts - 1))
+
+
+async def enqueue_title_job(db: AsyncSession, link: models.Link) -> None:
+    """为链接登记抓取任务，需由调用方提交事务后再调用 title_queue.notify()
+
+    URL 元数据缓存未过期时直接回填标题，不再排队。
+    """
+    cached = await get_cached_metadata(db, link.url)
+    if cached is not None:
+        link.http_title = cached.title
+        link.title_status = STATUS_DONE
+        await db.flush()
+        await db.execute(delete(models.TitleJob).where(models.TitleJob.link_id == link.id))
+        return
+
+    link.http_title = None
+    link.title_status = STATUS_PENDING
+    await db.flush()
+
+    # 同一链接只保留一条任务；URL 再次修改时重置重试次数和租约
+    stmt = insert(models.TitleJob).values(
+        link_id=link.id, url=link.url, attempts=0, run_after=utcnow()
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.TitleJob.link_id],
+            set_={
+                "url": stmt.excluded.url,
+                "attempts": 0,
+                "run_after": stmt.excluded.run_after,
+                "locked_until": None,
+                "last_error": None,
+            },
+        )
+    )
+
+
+async def enqueue_title_jobs(db: AsyncSession, links: list[tuple[int, str]]) -> None:
+    """批量登记新建链接 (link_id, url) 的抓取任务，链接需已标记为 pending
+
+    用于导入等一次新增大量链接的场景，以多行 INSERT 写入，不逐条查询元数据缓存，
+    缓存命中由 worker 通过 url_metadata 处理。
+    """
+    if not links:
+        return
+    now = utcnow()
+    await db.execute(
+        insert(models.TitleJob),
+        [{"link_id": link_id, "url": url, "attempts": 0, "run_after": now} for link_id, url in links],
+    )
+
+
+class TitleQueue:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"title-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self, db: AsyncSession) -> dict:
+        pending, retrying = (
+            await db.execute(
+                select(
+                    func.count(),
+                    func.count().filter(models.TitleJob.attempts > 0),
+                ).select_from(models.TitleJob)
+            )
+        ).one()
+        return {
+            "workers": len(self._tasks),
+            "pending": pending,
+            "retrying": retrying,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            # 先清除唤醒标记再领取：notify 发生在事务提交之后，
+            # 领取时要么能看到新任务，要么随后的 wait 会被唤醒
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"领取标题抓取任务失败: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=config.TITLE_QUEUE_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"处理标题抓取任务失败: {e} (URL: {job.url})")
+                try:
+                    await self._retry_or_fail(job, str(e))
+                except Exception:
+                    # 写库失败时保留租约，到期后任务会被重新领取
+                    pass
+
+    async def _claim(self) -> models.TitleJob | None:
+        async with AsyncSessionLocal() as db:
+            while True:
+                now = utcnow()
+                claimable = (models.TitleJob.locked_until.is_(None)) | (
+                    models.TitleJob.locked_until < now
+                )
+                job = await db.scalar(
+                    select(models.TitleJob)
+                    .where(models.TitleJob.run_after <= now, claimable)
+                    .order_by(models.TitleJob.run_after)
+                    .limit(1)
+                )
+                if job is None:
+                    await db.commit()
+                    return None
+
+                # 条件更新抢占租约，其他 worker 已领取时 rowcount 为 0，继续找下一条
+                result = await db.execute(
+                    update(models.TitleJob)
+                    .where(models.TitleJob.id == job.id, claimable)
+                    .values(locked_until=now + timedelta(seconds=config.TITLE_FETCH_LEASE))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return job
+
+    async def _run(self, job: models.TitleJob) -> None:
+        try:
+            title = (await url_metadata.get(job.url)).title or ""
+        except TitleFetchError as exc:
+            await self._retry_or_fail(job, str(exc))
+            return
+
+        async with AsyncSessionLocal() as db:
+            # 抓取期间链接 URL 可能又被修改，此时任务已被重置，结果直接丢弃
+            await db.execute(
+                update(models.Link)
+                .where(models.Link.id == job.link_id, models.Link.url == job.url)
+                .values(http_title=title, title_status=STATUS_DONE)
+            )
+            await db.execute(
+                delete(models.TitleJob).where(
+                    models.TitleJob.id == job.id, models.TitleJob.url == job.url
+                )
+            )
+            await db.commit()
+        self.completed += 1
+
+    async def _retry_or_fail(self, job: models.TitleJob, error: str) -> None:
+        attempts = job.attempts + 1
+        async with AsyncSessionLocal() as db:
+            same_job = (models.TitleJob.id == job.id) & (models.TitleJob.url == job.url)
+            if attempts >= config.TITLE_FETCH_MAX_ATTEMPTS:
+                logger.warning(f"标题抓取重试 {attempts} 次后放弃: {error} (URL: {job.url})")
+                await db.execute(
+                    update(models.Link)
+                    .where(models.Link.id == job.link_id, models.Link.url == job.url)
+                    .values(title_status=STATUS_FAILED)
+                )
+                await db.execute(delete(models.TitleJob).where(same_job))
+                self.failed += 1
+            else:
+                await db.execute(
+                    update(models.TitleJob)
+                    .where(same_job)
+                    .values(
+                        attempts=attempts,
+                        run_after=utcnow() + retry_delay(attempts),
+                        locked_until=None,
+                        last_error=error,
+                    )
+                )
+                self.retried += 1
+            await db.commit()
+
+
+title_queue = TitleQueue(config.TITLE_FETCH_WORKERS)
@@ -0,0 +1,147 @@
+"""按规范化 URL 共享的网页元数据
+
+不同用户收藏同一站点时，标题、跳转后的最终地址、状态码、图标地址只抓取一次，
+在 TTL 内直接复用数据库中的结果。同一进程内对同一 URL 的并发请求会合并为
+一次抓取（single-flight），其余请求等待同一个结果。
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core import config
+from app.core.crawler import fetch_page_metadata
+from app.database import AsyncSessionLocal
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def canonicalize_url(url: str) -> str:
+    """小写协议与主机名、去掉默认端口和 #fragment、查询参数排序"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{userinfo}@{host}"
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def url_host(url: str) -> str | None:
+    """链接的主机名：小写、去掉末尾的点，中文域名转为 punycode，与前端 new URL(url).hostname 一致"""
+    try:
+        host = urlsplit(url.strip()).hostname
+    except ValueError:
+        return None
+    host = (host or "").rstrip(".")
+    if not host:
+        return None
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return host
+
+
+def is_fresh(meta: models.UrlMetadata) -> bool:
+    ttl = config.URL_METADATA_TTL if meta.status_code == 200 else config.URL_METADATA_ERROR_TTL
+    return meta.fetched_at >= utcnow() - timedelta(seconds=ttl)
+
+
+async def get_cached_metadata(db: AsyncSession, url: str) -> models.UrlMetadata | None:
+    """只读缓存，不触发抓取；过期或不存在时返回 None"""
+    meta = await db.get(models.UrlMetadata, canonicalize_url(url))
+    return meta if meta and is_fresh(meta) else None
+
+
+class UrlMetadataStore:
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, url: str) -> models.UrlMetadata:
+        """读取 URL 元数据，过期时重新抓取；暂时性错误抛出 TitleFetchError"""
+        key = canonicalize_url(url)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._load(key, url)
+        except Exception as exc:
+            future.set_exception(exc)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    async def _load(self, key: str, url: str) -> models.UrlMetadata:
+        async with AsyncSessionLocal() as db:
+            meta = await db.get(models.UrlMetadata, key)
+            if meta and is_fresh(meta):
+                self.hits += 1
+                return meta
+
+        self.misses += 1
+        page = await fetch_page_metadata(url)
+        values = {
+            "url_key": key,
+            "title": page.title,
+            "final_url": page.final_url,
+            "status_code": page.status_code,
+            "favicon": page.favicon,
+            "fetched_at": utcnow(),
+        }
+        async with AsyncSessionLocal() as db:
+            stmt = insert(models.UrlMetadata).values(**values)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[models.UrlMetadata.url_key],
+                    set_={name: stmt.excluded[name] for name in values if name != "url_key"},
+                )
+            )
+            await db.commit()
+        return models.UrlMetadata(**values)
+
+
+url_metadata = UrlMetadataStore()
@@ -0,0 +1,104 @@
+"""已认证用户的进程内缓存
+
+鉴权依赖每次请求都要按 JWT 中的用户名查一次 users 表，这里把结果缓存为
+轻量快照（不含密码哈希），按 TTL + LRU 淘汰。修改用户的接口需在提交后调用
+invalidate，多 worker 部署时其他进程的缓存最多在 TTL 内过期。
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core import config
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    id: int
+    username: str
+    is_admin: bool
+    is_active: bool
+    hidden_groups: str
+    custom_bg: str | None
+
+    @classmethod
+    def from_model(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            username=user.username,
+            is_admin=bool(user.is_admin),
+            is_active=bool(user.is_active),
+            hidden_groups=user.hidden_groups or "",
+            custom_bg=user.custom_bg,
+        )
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, UserSnapshot]] = OrderedDict()
+        self._usernames: dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, username: str) -> UserSnapshot | None:
+        entry = self._entries.get(username)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(username)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, snapshot: UserSnapshot) -> None:
+        if not self.enabled:
+            return
+
+        self._entries[snapshot.username] = (time.monotonic() + self.ttl, snapshot)
+        self._entries.move_to_end(snapshot.username)
+        self._usernames[snapshot.id] = snapshot.username
+
+        while len(self._entries) > self.maxsize:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._usernames.pop(evicted.id, None)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        username = self._usernames.get(user_id)
+        if username is not None:
+            self._remove(username)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._usernames.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, username: str) -> None:
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._usernames.pop(entry[1].id, None)
+
+
+user_cache = UserCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL)
@@ -1,23 +1,80 @@
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
+from app.core import config
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_DIR = os.path.join(BASE_DIR, "data")
 if not os.path.exists(DB_DIR):
     os.makedirs(DB_DIR)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DB_DIR, 'onepanel.db')}"
+DB_PATH = os.path.join(DB_DIR, "onepanel.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+
+POOL_OPTIONS = {
+    "pool_size": config.DB_POOL_SIZE,
+    "max_overflow": config.DB_MAX_OVERFLOW,
+    "pool_timeout": config.DB_POOL_TIMEOUT,
+}
+
+STORAGE_PRAGMAS = {
+    "journal_mode": config.SQLITE_JOURNAL_MODE,
+    "synchronous": config.SQLITE_SYNCHRONOUS,
+    "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": -config.SQLITE_CACHE_SIZE_KB,
+    "mmap_size": config.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    "temp_store": config.SQLITE_TEMP_STORE,
+    "foreign_keys": "ON",
+}
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, **POOL_OPTIONS
 )
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
+
+
+def apply_storage_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in STORAGE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+event.listen(engine, "connect", apply_storage_pragmas)
+event.listen(async_engine.sync_engine, "connect", apply_storage_pragmas)
+
+
+def check_storage_profile() -> dict:
+    """读取当前连接上实际生效的 PRAGMA，并与配置对比"""
+    with engine.connect() as conn:
+        active = {
+            name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in STORAGE_PRAGMAS
+        }
+
+    mismatched = []
+    if str(active["journal_mode"]).upper() != config.SQLITE_JOURNAL_MODE:
+        mismatched.append("journal_mode")
+    for name in ("busy_timeout", "cache_size", "mmap_size"):
+        if active[name] != STORAGE_PRAGMAS[name]:
+            mismatched.append(name)
+    if active["foreign_keys"] != 1:
+        mismatched.append("foreign_keys")
+
+    return {"active": active, "mismatched": mismatched, "pool": POOL_OPTIONS}
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
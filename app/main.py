@@ -1,18 +1,47 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app import models
-from app.api import admin, auth, group, init, links
+from app.api import admin, auth, bookmarks, bootstrap, favicons, group, init, links
 from app.core import config
-from app.database import SessionLocal, engine
+from app.core.http_client import close_http_client, get_http_client
+from app.core.icon_sweeper import icon_sweeper
+from app.core.icons import ensure_icon_variants
+from app.core.link_health import link_health
+from app.core.title_queue import title_queue
+from app.database import SessionLocal, check_storage_profile, engine, get_async_db
+from app.migrations import run_migrations
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="OnePanel")
+for applied_migration in run_migrations():
+    print(f"已执行数据库迁移: {applied_migration}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    generated = await asyncio.to_thread(ensure_icon_variants)
+    if generated:
+        print(f"已为 {generated} 个图标生成缩略图")
+    get_http_client()
+    await title_queue.start()
+    await link_health.start()
+    await icon_sweeper.start()
+    yield
+    await icon_sweeper.stop()
+    await link_health.stop()
+    await title_queue.stop()
+    await close_http_client()
+
+
+app = FastAPI(title="OnePanel", lifespan=lifespan)
 
 def init_system_config():
     db: Session = SessionLocal()
@@ -39,18 +68,48 @@ def init_system_config():
 
 init_system_config()
 
+
+def report_storage_profile():
+    try:
+        profile = check_storage_profile()
+    except Exception as e:
+        print(f"SQLite 存储配置自检失败: {e}")
+        return
+
+    active = ", ".join(f"{k}={v}" for k, v in profile["active"].items())
+    print(f"SQLite 存储配置: {active}")
+    if profile["mismatched"]:
+        print(f"警告: 以下 PRAGMA 未按配置生效: {', '.join(profile['mismatched'])}")
+
+report_storage_profile()
+
 app.include_router(init.router)
 app.include_router(auth.router)
 app.include_router(group.router)
 app.include_router(links.router)
 app.include_router(admin.router)
+app.include_router(favicons.router)
+app.include_router(bookmarks.router)
+app.include_router(bootstrap.router)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """图标文件名由内容哈希或 uuid 生成，内容永不改变，可让浏览器长期缓存"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
 
 
+app.mount("/static/icons", ImmutableStaticFiles(directory=config.ICONS_DIR), name="icons")
 app.mount("/static", StaticFiles(directory=config.STATIC_DIR), name="static")
 
 
 @app.get("/")
-async def read_root_index():
+async def read_root_index(request: Request, db: AsyncSession = Depends(get_async_db)):
+    if config.SERVER_RENDER_INDEX:
+        return await bootstrap.render_index(request, db)
     return FileResponse(os.path.join(config.STATIC_DIR, "index.html"))
 
 @app.get("/init")
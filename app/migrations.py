@@ -0,0 +1,403 @@
+"""版本化数据库迁移
+
+create_all 只会创建缺失的表，不会修改已存在的表，因此索引、约束、新增列
+都需要通过这里的迁移下发到已部署的数据库。每个迁移在独立事务中执行，
+执行成功后写入 schema_migrations 表；迁移本身需保证幂等，
+全新安装时 create_all 已建好最新结构，迁移应直接跳过。
+"""
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from app.core import config
+from app.core.icons import (
+    HASHED_NAME_RE,
+    ICON_URL_PREFIX,
+    IconError,
+    normalise_icon,
+    sniff_image_format,
+)
+from app.core.url_metadata import url_host
+from app.database import DB_PATH
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str):
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        return func
+
+    return decorator
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str, indexes: list[str]):
+    """按 SQLite 官方推荐流程重建表：建新表 -> 复制数据 -> 删旧表 -> 改名"""
+    new_table = f"{table}__new"
+    conn.execute(f'DROP TABLE IF EXISTS "{new_table}"')
+    conn.execute(create_sql.format(table=new_table))
+
+    columns = [c for c in table_columns(conn, new_table) if c in table_columns(conn, table)]
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    conn.execute(
+        f'INSERT INTO "{new_table}" ({column_list}) SELECT {column_list} FROM "{table}"'
+    )
+    conn.execute(f'DROP TABLE "{table}"')
+    conn.execute(f'ALTER TABLE "{new_table}" RENAME TO "{table}"')
+    for index_sql in indexes:
+        conn.execute(index_sql)
+
+
+@migration(1, "add hot path indexes")
+def add_hot_path_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_groups_user_id_order ON groups (user_id, "order")')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_links_group_id_order ON links (group_id, "order")')
+
+
+@migration(2, "cascade foreign keys")
+def add_cascade_foreign_keys(conn: sqlite3.Connection):
+    def has_cascade(table: str) -> bool:
+        # foreign_key_list 第 7 列为 on_delete
+        return all(row[6] == "CASCADE" for row in conn.execute(f'PRAGMA foreign_key_list("{table}")'))
+
+    if not has_cascade("groups"):
+        rebuild_table(
+            conn,
+            "groups",
+            """
+            CREATE TABLE "{table}" (
+                id INTEGER NOT NULL PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                "order" INTEGER,
+                user_id INTEGER REFERENCES users (id) ON DELETE CASCADE
+            )
+            """,
+            [
+                "CREATE INDEX IF NOT EXISTS ix_groups_id ON groups (id)",
+                'CREATE INDEX IF NOT EXISTS ix_groups_user_id_order ON groups (user_id, "order")',
+            ],
+        )
+
+    if not has_cascade("links"):
+        rebuild_table(
+            conn,
+            "links",
+            """
+            CREATE TABLE "{table}" (
+                id INTEGER NOT NULL PRIMARY KEY,
+                title VARCHAR NOT NULL,
+                url VARCHAR NOT NULL,
+                icon VARCHAR,
+                http_title TEXT,
+                "order" INTEGER,
+                group_id INTEGER REFERENCES groups (id) ON DELETE CASCADE
+            )
+            """,
+            [
+                "CREATE INDEX IF NOT EXISTS ix_links_id ON links (id)",
+                'CREATE INDEX IF NOT EXISTS ix_links_group_id_order ON links (group_id, "order")',
+            ],
+        )
+
+    orphans = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if orphans:
+        print(f"警告: 检测到 {len(orphans)} 条外键无效的历史数据，已保留原样")
+
+
+@migration(3, "link title status")
+def add_link_title_status(conn: sqlite3.Connection):
+    if "title_status" not in table_columns(conn, "links"):
+        conn.execute("ALTER TABLE links ADD COLUMN title_status VARCHAR NOT NULL DEFAULT 'done'")
+
+
+@migration(4, "content addressed icons")
+def add_icon_refcounts(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS icon_refs (icon VARCHAR NOT NULL PRIMARY KEY, refcount INTEGER NOT NULL)"
+    )
+
+    # 旧的 uuid 文件按上传时相同的方式重新编码，保存为 {sha256}{ext} 并改写链接，
+    # 与之后重新上传的同一图片得到相同文件名；原文件保留，之后会出现在后台的
+    # “冗余图标”列表中，由管理员确认清理。无法识别的文件保持原样
+    rows = conn.execute(
+        "SELECT DISTINCT icon FROM links WHERE icon LIKE '/static/icons/%'"
+    ).fetchall()
+    for (icon,) in rows:
+        filename = os.path.basename(icon[len(ICON_URL_PREFIX):])
+        path = os.path.join(config.ICONS_DIR, filename)
+        if HASHED_NAME_RE.fullmatch(filename) or not os.path.isfile(path):
+            continue
+
+        with open(path, "rb") as icon_file:
+            image_format = sniff_image_format(icon_file.read(16))
+        if image_format is None:
+            continue
+        try:
+            new_icon = normalise_icon(path, image_format)
+        except IconError as e:
+            print(f"迁移图标失败 {filename}: {e}")
+            continue
+        conn.execute("UPDATE links SET icon = ? WHERE icon = ?", (new_icon, icon))
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_icon_insert AFTER INSERT ON links
+        WHEN NEW.icon LIKE '/static/icons/%'
+        BEGIN
+            INSERT INTO icon_refs (icon, refcount) VALUES (NEW.icon, 1)
+            ON CONFLICT (icon) DO UPDATE SET refcount = refcount + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_icon_delete AFTER DELETE ON links
+        WHEN OLD.icon LIKE '/static/icons/%'
+        BEGIN
+            UPDATE icon_refs SET refcount = refcount - 1 WHERE icon = OLD.icon;
+            DELETE FROM icon_refs WHERE icon = OLD.icon AND refcount <= 0;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_icon_update AFTER UPDATE OF icon ON links
+        WHEN OLD.icon IS NOT NEW.icon
+        BEGIN
+            UPDATE icon_refs SET refcount = refcount - 1 WHERE icon = OLD.icon;
+            DELETE FROM icon_refs WHERE icon = OLD.icon AND refcount <= 0;
+            INSERT INTO icon_refs (icon, refcount)
+            SELECT NEW.icon, 1 WHERE NEW.icon LIKE '/static/icons/%'
+            ON CONFLICT (icon) DO UPDATE SET refcount = refcount + 1;
+        END
+    """)
+
+    conn.execute("DELETE FROM icon_refs")
+    conn.execute("""
+        INSERT INTO icon_refs (icon, refcount)
+        SELECT icon, COUNT(*) FROM links WHERE icon LIKE '/static/icons/%' GROUP BY icon
+    """)
+
+
+
+@migration(5, "sparse order keys")
+def spread_order_keys(conn: sqlite3.Connection):
+    # 原先的 order 是 0, 1, 2... 且可能重复，按现有顺序改为间隔 1024 的稀疏键
+    for table, scope in (("links", "group_id"), ("groups", "user_id")):
+        conn.execute(f"""
+            UPDATE {table} SET "order" = ranked.position * 1024
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY {scope} ORDER BY "order", id) AS position
+                FROM {table}
+            ) AS ranked
+            WHERE {table}.id = ranked.id
+        """)
+
+
+
+@migration(6, "link health columns")
+def add_link_health(conn: sqlite3.Connection):
+    columns = table_columns(conn, "links")
+    for name, ddl in (
+        ("health_status", "VARCHAR"),
+        ("health_code", "INTEGER"),
+        ("health_latency_ms", "INTEGER"),
+        ("health_checked_at", "DATETIME"),
+        ("health_failures", "INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE links ADD COLUMN {name} {ddl}")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_links_health_checked_at ON links (health_checked_at)"
+    )
+
+
+@migration(7, "full text search")
+def add_full_text_search(conn: sqlite3.Connection):
+    # trigram 分词支持中文与任意子串匹配；外部内容表不重复存储文本，由触发器同步
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS links_fts USING fts5(
+            title, url, http_title, content='links', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_fts_insert AFTER INSERT ON links
+        BEGIN
+            INSERT INTO links_fts (rowid, title, url, http_title)
+            VALUES (NEW.id, NEW.title, NEW.url, NEW.http_title);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_fts_delete AFTER DELETE ON links
+        BEGIN
+            INSERT INTO links_fts (links_fts, rowid, title, url, http_title)
+            VALUES ('delete', OLD.id, OLD.title, OLD.url, OLD.http_title);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_links_fts_update AFTER UPDATE OF title, url, http_title ON links
+        BEGIN
+            INSERT INTO links_fts (links_fts, rowid, title, url, http_title)
+            VALUES ('delete', OLD.id, OLD.title, OLD.url, OLD.http_title);
+            INSERT INTO links_fts (rowid, title, url, http_title)
+            VALUES (NEW.id, NEW.title, NEW.url, NEW.http_title);
+        END
+    """)
+    conn.execute("INSERT INTO links_fts (links_fts) VALUES ('rebuild')")
+
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+            username, content='users', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_insert AFTER INSERT ON users
+        BEGIN
+            INSERT INTO users_fts (rowid, username) VALUES (NEW.id, NEW.username);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_delete AFTER DELETE ON users
+        BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username) VALUES ('delete', OLD.id, OLD.username);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_fts_update AFTER UPDATE OF username ON users
+        BEGIN
+            INSERT INTO users_fts (users_fts, rowid, username) VALUES ('delete', OLD.id, OLD.username);
+            INSERT INTO users_fts (rowid, username) VALUES (NEW.id, NEW.username);
+        END
+    """)
+    conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+
+# 链接或分组变化时递增所属范围的版本号：公共分组（id=1）记在 public，其他记在所有者的 user:<id>
+GROUP_SCOPE_SQL = "CASE WHEN g.id = 1 THEN 'public' ELSE 'user:' || g.user_id END"
+BUMP_SQL = """
+    INSERT INTO data_versions (scope, version) {source}
+    ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+"""
+# 只有首页会展示的字段变化才递增，巡检写入的耗时、检查时间等不影响版本号
+LINK_CHANGED_SQL = " OR ".join(
+    f"OLD.{column} IS NOT NEW.{column}"
+    for column in (
+        "title", "url", "icon", '"order"', "group_id", "http_title", "title_status",
+        "health_status", "health_code", "health_failures",
+    )
+)
+USER_CHANGED_SQL = " OR ".join(
+    f"OLD.{column} IS NOT NEW.{column}"
+    for column in ("username", "is_admin", "is_active", "custom_bg", "hidden_groups")
+)
+
+
+def bump_group(group_id: str) -> str:
+    return BUMP_SQL.format(
+        source=f"SELECT {GROUP_SCOPE_SQL}, 1 FROM groups AS g WHERE g.id = {group_id}"
+    )
+
+
+def bump_scope(scope: str) -> str:
+    return BUMP_SQL.format(source=f"SELECT {scope}, 1 WHERE true")
+
+
+@migration(8, "data versions")
+def add_data_versions(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope VARCHAR NOT NULL PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    triggers = {
+        "trg_links_version_insert": f"AFTER INSERT ON links BEGIN {bump_group('NEW.group_id')} END",
+        "trg_links_version_update": (
+            f"AFTER UPDATE ON links WHEN {LINK_CHANGED_SQL} BEGIN "
+            f"{bump_group('OLD.group_id')} {bump_group('NEW.group_id')} END"
+        ),
+        "trg_links_version_delete": f"AFTER DELETE ON links BEGIN {bump_group('OLD.group_id')} END",
+        # 分组删除后在 groups 中已查不到，直接按 OLD 计算范围
+        "trg_groups_version_insert": f"AFTER INSERT ON groups BEGIN {bump_group('NEW.id')} END",
+        "trg_groups_version_update": (
+            "AFTER UPDATE ON groups WHEN OLD.name IS NOT NEW.name OR OLD.\"order\" IS NOT NEW.\"order\" "
+            f"OR OLD.user_id IS NOT NEW.user_id BEGIN {bump_group('OLD.id')} {bump_group('NEW.id')} END"
+        ),
+        "trg_groups_version_delete": (
+            "AFTER DELETE ON groups BEGIN "
+            + bump_scope("CASE WHEN OLD.id = 1 THEN 'public' ELSE 'user:' || OLD.user_id END")
+            + " END"
+        ),
+        "trg_users_version_update": (
+            f"AFTER UPDATE ON users WHEN {USER_CHANGED_SQL} BEGIN "
+            + bump_scope("'user:' || NEW.id") + " END"
+        ),
+        # 删除的用户 id 可能被新用户复用，版本号继续递增而不是删除记录
+        "trg_users_version_delete": (
+            "AFTER DELETE ON users BEGIN " + bump_scope("'user:' || OLD.id") + " END"
+        ),
+        # 创建管理员即完成系统初始化，记入 config
+        "trg_users_version_init": (
+            "AFTER INSERT ON users WHEN NEW.is_admin BEGIN " + bump_scope("'config'") + " END"
+        ),
+        "trg_config_version_insert": "AFTER INSERT ON system_config BEGIN " + bump_scope("'config'") + " END",
+        "trg_config_version_update": (
+            "AFTER UPDATE ON system_config WHEN OLD.value IS NOT NEW.value BEGIN "
+            + bump_scope("'config'") + " END"
+        ),
+        "trg_config_version_delete": "AFTER DELETE ON system_config BEGIN " + bump_scope("'config'") + " END",
+    }
+    for name, body in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+@migration(9, "link host")
+def add_link_host(conn: sqlite3.Connection):
+    if "host" not in table_columns(conn, "links"):
+        conn.execute("ALTER TABLE links ADD COLUMN host VARCHAR")
+    rows = conn.execute("SELECT id, url FROM links WHERE host IS NULL").fetchall()
+    conn.executemany(
+        "UPDATE links SET host = ? WHERE id = ?", [(url_host(url), link_id) for link_id, url in rows]
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_links_host ON links (host)")
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def run_migrations(db_path: str = DB_PATH) -> list[str]:
+    # 使用独立的 autocommit 连接，自行控制 BEGIN/COMMIT，确保 DDL 也在事务内；
+    # 该连接保持 foreign_keys=OFF，重建表时不会触发级联删除
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    applied = []
+    try:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                applied_at VARCHAR NOT NULL
+            )
+            """
+        )
+        for version, name, func in sorted(MIGRATIONS, key=lambda item: item[0]):
+            # BEGIN IMMEDIATE 持有写锁，多个 worker 同时启动时只有一个会真正执行
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                func(conn)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.now(timezone.utc).isoformat()),
+                )
+                conn.execute("COMMIT")
+                applied.append(f"{version:04d}_{name}")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text
+from sqlalchemy import Column, DateTime, Integer, String, Boolean, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 
 try:
@@ -17,7 +17,9 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     hidden_groups = Column(String, default="")
 
-    groups = relationship("Group", back_populates="owner", cascade="all, delete-orphan")
+    groups = relationship(
+        "Group", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class Group(Base):
@@ -25,10 +27,18 @@ class Group(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     order = Column(Integer, default=0) 
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
 
     owner = relationship("User", back_populates="groups")
-    links = relationship("Link", back_populates="group", cascade="all, delete-orphan", order_by="Link.order")
+    links = relationship(
+        "Link",
+        back_populates="group",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="Link.order",
+    )
+
+    __table_args__ = (Index("ix_groups_user_id_order", "user_id", "order"),)
 
 class Link(Base):
     __tablename__ = "links"
@@ -37,10 +47,68 @@ class Link(Base):
     url = Column(String, nullable=False)
     icon = Column(String, nullable=True)
     http_title = Column(Text, nullable=True)
+    # 网页标题抓取状态：pending 排队中 / done 已完成 / failed 重试耗尽
+    title_status = Column(String, nullable=False, default="done", server_default="done")
     order = Column(Integer, default=0)  
-    group_id = Column(Integer, ForeignKey("groups.id"))
+    group_id = Column(Integer, ForeignKey("groups.id", ondelete="CASCADE"))
+    # 可用性巡检结果：ok 正常 / broken 返回 4xx、5xx / unreachable 无法连接，未检查时为空
+    health_status = Column(String, nullable=True)
+    health_code = Column(Integer, nullable=True)
+    health_latency_ms = Column(Integer, nullable=True)
+    health_checked_at = Column(DateTime, nullable=True)
+    health_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    # url 的主机名（url_host），站点图标代理据此判断主机是否出现在已保存的链接中
+    host = Column(String, nullable=True)
     group = relationship("Group", back_populates="links")
 
+    __table_args__ = (
+        Index("ix_links_group_id_order", "group_id", "order"),
+        Index("ix_links_health_checked_at", "health_checked_at"),
+        Index("ix_links_host", "host"),
+    )
+
+
+class TitleJob(Base):
+    """待抓取网页标题的任务，持久化在数据库中，重启后继续执行"""
+    __tablename__ = "title_jobs"
+    id = Column(Integer, primary_key=True)
+    link_id = Column(Integer, ForeignKey("links.id", ondelete="CASCADE"), nullable=False, unique=True)
+    url = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (Index("ix_title_jobs_run_after", "run_after"),)
+
+
+class IconRef(Base):
+    """本地图标文件的引用计数，由 links 表上的触发器维护（见迁移 0004）"""
+    __tablename__ = "icon_refs"
+    icon = Column(String, primary_key=True)
+    refcount = Column(Integer, nullable=False, default=0)
+
+
+class UrlMetadata(Base):
+    """按规范化 URL 共享的网页元数据，多个用户收藏同一站点时只抓取一次"""
+    __tablename__ = "url_metadata"
+    url_key = Column(String, primary_key=True)
+    title = Column(Text, nullable=True)
+    final_url = Column(String, nullable=True)
+    status_code = Column(Integer, nullable=True)
+    favicon = Column(String, nullable=True)
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class DataVersion(Base):
+    """按范围递增的数据版本号，由触发器在写入 links / groups / users / system_config 时更新
+
+    范围：user:<id> 为该用户的分组、链接与个人设置，public 为公共分组，config 为系统配置。
+    """
+    __tablename__ = "data_versions"
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 
 class SystemConfig(Base):
     __tablename__ = "system_config"
@@ -1,12 +1,22 @@
-from pydantic import BaseModel
+from datetime import datetime
+
+from pydantic import BaseModel, computed_field
 from typing import Optional, List
 
+from app.core.icons import icon_variant_urls
+
 class LinkBase(BaseModel):
     title: str
     url: str
     icon: Optional[str] = None
     order: int = 0
     http_title: Optional[str] = None
+    title_status: str = "done"
+    health_status: Optional[str] = None
+    health_code: Optional[int] = None
+    health_latency_ms: Optional[int] = None
+    health_checked_at: Optional[datetime] = None
+    health_failures: int = 0
 
 
 class LinkCreate(BaseModel):
@@ -28,6 +38,11 @@ class LinkOut(LinkBase):
     id: int
     group_id: int
 
+    @computed_field
+    @property
+    def icon_variants(self) -> Optional[dict[str, dict[str, str]]]:
+        return icon_variant_urls(self.icon)
+
     class Config:
         from_attributes = True
 
@@ -35,6 +50,13 @@ class LinkAdminOut(BaseModel):
     id: int
     title: str
     url: str
+    http_title: Optional[str] = None
+    final_url: Optional[str] = None
+    http_status: Optional[int] = None
+    health_status: Optional[str] = None
+    health_code: Optional[int] = None
+    health_checked_at: Optional[datetime] = None
+    health_failures: int = 0
     owner: str
     risk_score: str
 
@@ -65,3 +87,34 @@ class GroupOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class DashboardLinkOut(BaseModel):
+    """首页分组接口中的链接，只含首页用到的字段"""
+    id: int
+    group_id: int
+    title: str
+    url: str
+    icon: Optional[str] = None
+    icon_variants: Optional[dict[str, dict[str, str]]] = None
+    order: int
+    title_status: str = "done"
+    health_status: Optional[str] = None
+    health_code: Optional[int] = None
+    health_failures: int = 0
+    http_title: Optional[str] = None
+
+
+class DashboardGroupOut(BaseModel):
+    id: int
+    name: str
+    order: int
+    user_id: int
+    is_readonly: bool = False
+    links: List[DashboardLinkOut] = []
+
+
+class GroupOptionOut(BaseModel):
+    id: int
+    name: str
+    order: int
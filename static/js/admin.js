@@ -514,6 +514,9 @@ function renderLinkList(linkArray) {
                     <a href="${link.url}" target="_blank" style="color:var(--admin-secondary); text-decoration:none; font-size:0.85rem;">
                         ${link.url} ↗
                     </a>
+                    ${link.final_url ? `
+                    <div style="color:#888; font-size:0.75rem; margin-top:2px;">跳转至 ${link.final_url}</div>` : ''}
+                    ${renderLinkHealth(link)}
                 </td>
                 <td><span class="badge">${link.owner}</span></td>
                 <td><span class="${config.class}">${config.text}</span></td>
@@ -528,6 +531,20 @@ function renderLinkList(linkArray) {
     }).join('');
 }
 
+function renderLinkHealth(link) {
+    if (!link.health_status) {
+        return `<div style="color:#888; font-size:0.75rem; margin-top:2px;">尚未巡检</div>`;
+    }
+    const checkedAt = link.health_checked_at
+        ? new Date(link.health_checked_at + 'Z').toLocaleString()
+        : '';
+    if (link.health_status === 'ok') {
+        return `<div style="color:#4caf50; font-size:0.75rem; margin-top:2px;">可访问 · ${link.health_code} · ${checkedAt}</div>`;
+    }
+    const reason = link.health_code ? `HTTP ${link.health_code}` : '无法连接';
+    return `<div style="color:#ff4d4d; font-size:0.75rem; margin-top:2px;">失效 · ${reason} · 连续失败 ${link.health_failures} 次 · ${checkedAt}</div>`;
+}
+
 function checkVT(url) {
     const b64Url = btoa(url.trim()).replace(/=/g, '');
     window.open(`https://www.virustotal.com/gui/url/${b64Url}/detection`, '_blank');
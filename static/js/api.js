@@ -1,3 +1,46 @@
+async function fetchBootstrap() {
+    const token = localStorage.getItem('onepanel_token');
+    const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
+
+    // 响应带 ETag，数据未变化时浏览器自动以 If-None-Match 校验并复用缓存
+    const res = await fetch('/api/bootstrap', { headers });
+    if (!res.ok) throw new Error("无法从服务器获取首页数据");
+    return await res.json();
+}
+
+function readCookie(name) {
+    const prefix = `${name}=`;
+    const item = document.cookie.split('; ').find(part => part.startsWith(prefix));
+    return item ? item.slice(prefix.length) : '';
+}
+
+function syncTokenCookie(token) {
+    // 服务端渲染首页时按该 cookie 识别用户，内容与 localStorage 中的令牌保持一致
+    const secure = location.protocol === 'https:' ? '; Secure' : '';
+    document.cookie = token
+        ? `onepanel_token=${token}; path=/; max-age=31536000; SameSite=Lax${secure}`
+        : `onepanel_token=; path=/; max-age=0; SameSite=Lax${secure}`;
+}
+
+function takeInlineBootstrap() {
+    // 服务端渲染的首页内联了首屏数据，只有渲染时使用的令牌与当前令牌一致才能直接使用
+    const node = document.getElementById('onepanel-bootstrap');
+    if (!node) return null;
+    node.remove();
+
+    const token = localStorage.getItem('onepanel_token') || '';
+    const renderedFor = readCookie('onepanel_token');
+    syncTokenCookie(token);
+    if (renderedFor !== token) return null;
+
+    try {
+        return JSON.parse(node.textContent);
+    } catch (e) {
+        console.warn('内联首页数据解析失败，改为请求接口', e);
+        return null;
+    }
+}
+
 async function fetchGroups() {
     const token = localStorage.getItem('onepanel_token');
     const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
@@ -131,6 +174,47 @@ async function deleteGroup(groupId) {
     if (!res.ok) throw new Error("删除分组失败");
 }
 
+async function importBookmarks(file) {
+    const token = localStorage.getItem('onepanel_token');
+    const formData = new FormData();
+    formData.append('file', file);
+
+    const res = await fetch('/api/bookmarks/import', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+        body: formData
+    });
+
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.detail || "导入失败");
+    return data;
+}
+
+async function exportBookmarks(format = 'html') {
+    const token = localStorage.getItem('onepanel_token');
+
+    const res = await fetch(`/api/bookmarks/export?format=${format}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+    });
+    if (!res.ok) throw new Error("导出失败");
+
+    const url = URL.createObjectURL(await res.blob());
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = `onepanel-bookmarks.${format}`;
+    a.click();
+    URL.revokeObjectURL(url);
+}
+
+async function autocompleteLinks(q, signal) {
+    const token = localStorage.getItem('onepanel_token');
+    const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
+
+    const res = await fetch(`/api/links/autocomplete?q=${encodeURIComponent(q)}`, { headers, signal });
+    if (!res.ok) return [];
+    return await res.json();
+}
+
 async function hideGroup(groupId) {
     await toggleGroupVisibility(groupId);
 }
@@ -1,23 +1,11 @@
-async function loadSettings() {
-    try {
-        const response = await fetch('/api/system/config');
-        const config = await response.json();
-
-        if (config.site_title) {
-            document.title = config.site_title;
-        }
-
-        window.CONFIG_FAVICON_API = config.favicon_api || "https://favicon.cccyun.cc/${hostname}";
-    } catch (error) {
-        console.error('加载配置失败:', error);
-        window.CONFIG_FAVICON_API = "https://favicon.cccyun.cc/${hostname}";
+function applySiteConfig(config) {
+    if (config.site_title) {
+        document.title = config.site_title;
     }
+    window.CONFIG_FAVICON_API = config.favicon_api || "https://favicon.cccyun.cc/${hostname}";
+    injectCustomCode(config);
 }
 
-document.addEventListener('DOMContentLoaded', async () => {
-    await loadSettings();
-});
-
 function injectCustomCode(config) {
     if (config.custom_styles && config.custom_styles.trim() !== '') {
         let styleTag = document.getElementById('onepanel-custom-css');
@@ -90,64 +78,33 @@ async function initPage() {
     startClock();
     UI.initSearch();
 
-    const token = localStorage.getItem('onepanel_token');
+    // 配置、用户与分组数据由 /api/bootstrap 一次返回，渲染链接时复用同一个请求；
+    // 服务端渲染的首页已内联这些数据，无需请求
+    const inlineData = takeInlineBootstrap();
+    const bootstrapPromise = inlineData ? Promise.resolve(inlineData) : fetchBootstrap();
+    const renderPromise = renderLinks(undefined, bootstrapPromise, Boolean(inlineData));
 
-    const statusRes = await fetch('/api/system/status');
-    const status = await statusRes.json();
-    if (!status.is_initialized) {
-        location.href = '/init';
+    let data;
+    try {
+        data = await bootstrapPromise;
+    } catch (e) {
+        console.error('加载首页数据失败:', e);
+        renderGuestUI();
         return;
     }
 
-    try {
-        const configRes = await fetch('/api/system/config');
-        if (configRes.ok) {
-            const config = await configRes.json();
-
-            if (config.custom_styles) {
-                const styleTag = document.createElement('style');
-                styleTag.id = 'onepanel-custom-css';
-                styleTag.textContent = config.custom_styles;
-                document.head.appendChild(styleTag);
-            }
-
-            if (config.custom_scripts) {
-                const scriptTag = document.createElement('script');
-                scriptTag.id = 'onepanel-custom-js';
-                scriptTag.textContent = config.custom_scripts;
-                document.body.appendChild(scriptTag);
-            }
-
-            if (config.site_title) {
-                document.title = config.site_title;
-            }
-            window.CONFIG_FAVICON_API = config.favicon_api || window.CONFIG_FAVICON_API;
-        }
-    } catch (e) {
-        console.warn('无法加载系统配置，使用默认设置');
+    if (!data.initialized) {
+        location.href = '/init';
+        return;
     }
 
-    if (token) {
-        try {
-            const userRes = await fetch('/api/user/me', {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-            if (userRes.ok) {
-                const user = await userRes.json();
-                renderUserUI(user);
-            } else {
-                renderGuestUI();
-            }
-        } catch (e) {
-            renderGuestUI();
-        }
+    applySiteConfig(data.config || {});
+    if (data.user) {
+        renderUserUI(data.user);
     } else {
         renderGuestUI();
     }
-
-    if (typeof renderLinks === 'function') {
-        renderLinks();
-    }
+    await renderPromise;
 
     const bgInput = document.getElementById('bg-input');
     if (bgInput) {
@@ -155,11 +112,92 @@ async function initPage() {
     }
 }
 
+let suggestTimer = null;
+let suggestController = null;
+let suggestIndex = -1;
+
+function handleSuggestInput(e) {
+    const q = e.target.value.trim();
+    clearTimeout(suggestTimer);
+    if (!q) {
+        hideSuggestions();
+        return;
+    }
+
+    // 输入停顿后再请求，并取消尚未返回的上一次请求
+    suggestTimer = setTimeout(async () => {
+        if (suggestController) suggestController.abort();
+        suggestController = new AbortController();
+        try {
+            renderSuggestions(await autocompleteLinks(q, suggestController.signal));
+        } catch (err) {
+            if (err.name !== 'AbortError') hideSuggestions();
+        }
+    }, 120);
+}
+
+function renderSuggestions(links) {
+    const menu = document.getElementById('suggest-dropdown');
+    if (!menu) return;
+
+    suggestIndex = -1;
+    menu.replaceChildren(...links.map(l => {
+        const item = document.createElement('a');
+        item.className = 'suggest-item';
+        item.href = l.url;
+        item.target = '_blank';
+
+        const img = document.createElement('img');
+        img.className = 'suggest-icon';
+        img.src = (l.icon && l.icon.trim() !== "") ? l.icon : getFaviconUrl(l.url);
+        img.onerror = () => handleIconError(img);
+
+        const title = document.createElement('span');
+        title.textContent = l.title;
+
+        item.append(img, title);
+        item.onclick = hideSuggestions;
+        return item;
+    }));
+    menu.classList.toggle('active', links.length > 0);
+}
+
+function hideSuggestions() {
+    const menu = document.getElementById('suggest-dropdown');
+    if (menu) menu.classList.remove('active');
+    suggestIndex = -1;
+}
+
 function handleSearch(e) {
+    // 输入法组字时的回车和方向键交给输入法处理
+    if (e.isComposing) return;
+
+    const items = document.querySelectorAll('#suggest-dropdown.active .suggest-item');
+    if ((e.key === 'ArrowDown' || e.key === 'ArrowUp') && items.length) {
+        e.preventDefault();
+        suggestIndex += e.key === 'ArrowDown' ? 1 : -1;
+        if (suggestIndex >= items.length) suggestIndex = -1;
+        if (suggestIndex < -1) suggestIndex = items.length - 1;
+        items.forEach((item, index) => item.classList.toggle('active', index === suggestIndex));
+        return;
+    }
+
+    if (e.key === 'Escape') {
+        hideSuggestions();
+        return;
+    }
+
     if (e.key === 'Enter') {
+        if (suggestIndex >= 0 && items[suggestIndex]) {
+            window.open(items[suggestIndex].href);
+            hideSuggestions();
+            return;
+        }
+
         const q = e.target.value.trim();
         if (q) {
             window.open(ENGINES[currentEngine].url + encodeURIComponent(q));
+            hideSuggestions();
         }
     }
 }
@@ -6,6 +6,17 @@ function safe(el, fn) {
     if (el) fn(el);
 }
 
+function handleIconError(img) {
+    const fallback = img.dataset.fallback;
+    if (fallback) {
+        delete img.dataset.fallback;
+        img.src = fallback;
+        return;
+    }
+    img.onerror = null;
+    img.src = '/static/default_link.jpg';
+}
+
 function getFaviconUrl(url) {
     let hostname = "invalid";
     try {
@@ -14,9 +25,8 @@ function getFaviconUrl(url) {
         return '/static/default_link.jpg';
     }
 
-    const template = window.CONFIG_FAVICON_API || "https://favicon.cccyun.cc/${hostname}";
-
-    return template.replace("${hostname}", hostname);
+    // 由服务端按 favicon_api 模板代理并缓存，避免每位访客直接请求第三方服务
+    return `/api/favicons/${encodeURIComponent(hostname)}`;
 }
 
 function startClock() {
@@ -42,8 +52,8 @@ function startClock() {
     update();
 }
 
-async function renderLinks(container) {
-    const token = localStorage.getItem('onepanel_token');
+async function renderLinks(container, bootstrapPromise, skipBundle = false) {
+    let token = localStorage.getItem('onepanel_token');
     const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
 
     const target = container || document.getElementById('links-container');
@@ -52,33 +62,30 @@ async function renderLinks(container) {
         return;
     }
 
-    let userData = null;
-    if (token) {
-        try {
-            const userRes = await fetch('/api/user/me', { headers });
-            if (userRes.ok) {
-                userData = await userRes.json();
-            } else if (userRes.status === 401) {
-                console.warn("Token 已失效，自动转为访客模式");
-                localStorage.removeItem('onepanel_token');
-                token = null;
-            }
-        } catch (e) { console.error("获取用户信息失败", e); }
-    }
-
     try {
-        const fetchUrl = token ? '/api/groups/' : '/api/groups/public';
-        const response = await fetch(fetchUrl, { headers });
-
-        if (!response.ok) {
-            const errorData = await response.json();
-            throw new Error(errorData.detail || "请求失败");
+        // 图标包与首页数据并行请求，一次拿到所有本地图标的 data URI；
+        // 服务端渲染时数据已就绪，不再等待图标包，直接使用可长期缓存的缩略图地址
+        const bundlePromise = skipBundle
+            ? Promise.resolve({})
+            : fetch('/api/groups/icon-bundle', { headers })
+                .then(res => res.ok ? res.json() : {})
+                .catch(() => ({}));
+        const data = await (bootstrapPromise || fetchBootstrap());
+
+        const userData = data.user;
+        if (token && !userData) {
+            console.warn("Token 已失效，自动转为访客模式");
+            localStorage.removeItem('onepanel_token');
+            syncTokenCookie('');
+            token = null;
         }
 
-        let groups = await response.json();
+        let groups = data.groups;
 
         if (!Array.isArray(groups)) throw new Error("返回数据格式错误");
 
+        const iconBundle = Object.assign({}, ...Object.values(await bundlePromise));
+
         if (userData && !userData.is_admin) {
             const hiddenStr = userData.hidden_groups || "";
             const hiddenList = hiddenStr.split(',').filter(Boolean);
@@ -109,12 +116,26 @@ async function renderLinks(container) {
             const cardsHtml = links.map(l => {
                 window.linkRegistry[l.id] = { ...l, group_id: group.id };
 
-                const iconSrc = (l.icon && l.icon.trim() !== "")
-                    ? l.icon
-                    : getFaviconUrl(l.url);
+                // 可用性由服务端后台巡检，这里只展示最近一次结果
+                const unhealthy = l.health_status === 'broken' || l.health_status === 'unreachable';
+                const healthTip = unhealthy
+                    ? `链接可能已失效（${l.health_code ? 'HTTP ' + l.health_code : '无法连接'}，连续失败 ${l.health_failures} 次）`
+                    : '';
+
+                // 优先使用图标包中的 data URI，其次是 128px WebP 缩略图（60px 图标的 2x），加载失败时回退到 PNG 缩略图
+                const variant = l.icon_variants ? l.icon_variants['128'] : null;
+                const iconSrc = unhealthy
+                    ? '/static/default_error.jpg'
+                    : iconBundle[l.icon]
+                    ? iconBundle[l.icon]
+                    : variant
+                    ? variant.webp
+                    : (l.icon && l.icon.trim() !== "")
+                        ? l.icon
+                        : getFaviconUrl(l.url);
 
                 return `
-                <div class="link-card" id="link-${l.id}" data-link-id="${l.id}">
+                <div class="link-card ${unhealthy ? 'inactive' : ''}" id="link-${l.id}" data-link-id="${l.id}" ${unhealthy ? `title="${healthTip}"` : ''}>
                     ${(token && !isReadonly) ? `
                         <div class="link-actions">
                             <button type="button" class="link-action-btn edit-btn" onclick="openEditLinkModalById(event, ${l.id})" aria-label="Edit link" title="编辑"><svg viewBox="0 0 24 24" aria-hidden="true"><path d="M3 17.25V21h3.75L17.81 9.94l-3.75-3.75L3 17.25zm14.71-9.04a1.003 1.003 0 000-1.42l-2.5-2.5a1.003 1.003 0 00-1.42 0l-1.96 1.96 3.75 3.75 2.13-2.09z"/></svg></button>
@@ -124,7 +145,8 @@ async function renderLinks(container) {
                         <div class="icon-wrapper">
                             <img src="${iconSrc}"
                                  alt="${l.title}"
-                                 onerror="this.onerror=null; this.src='/static/default_link.jpg';">
+                                 ${variant ? `data-fallback="${variant.png}"` : ''}
+                                 onerror="handleIconError(this)">
                         </div>
                         <div class="link-title">${l.title}</div>
                     </a>
@@ -155,14 +177,6 @@ async function renderLinks(container) {
             initSortable(userData);
         }
 
-        groups.forEach(g =>
-            g.links?.forEach(l => {
-                if (typeof checkUrlAccessibility === 'function') {
-                    checkUrlAccessibility(l.url, `link-${l.id}`);
-                }
-            })
-        );
-
     } catch (e) {
         console.error("渲染列表失败:", e);
         target.innerHTML = `<div style="color:rgba(255,255,255,0.5); padding:20px;">数据加载异常</div>`;
@@ -194,32 +208,29 @@ function initSortable(userData) {
                     return;
                 }
 
-                const syncGroupOrder = async (gridElement) => {
-                    const groupId = gridElement.dataset.groupId;
+                // 只提交被拖动的链接及其新位置，服务端取前后邻居的中间值作为排序键
+                const linkId = parseInt(evt.item.dataset.linkId);
+                const position = Array.from(evt.to.querySelectorAll('.link-card')).indexOf(evt.item);
+                if (evt.from === evt.to && evt.oldIndex === evt.newIndex) return;
 
-                    const linkIds = Array.from(
-                        gridElement.querySelectorAll('.link-card')
-                    ).map(card => parseInt(card.dataset.linkId));
-
-                    if (!linkIds.length) return;
-
-                    await fetch(`/api/links/reorder`, {
+                const params = new URLSearchParams({
+                    target_group_id: evt.to.dataset.groupId,
+                    new_order: position
+                });
+                try {
+                    const res = await fetch(`/api/links/${linkId}/move?${params}`, {
                         method: 'PUT',
-                        headers: {
-                            'Authorization': `Bearer ${token}`,
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({
-                            link_ids: linkIds,
-                            group_id: parseInt(groupId)
-                        })
+                        headers: { 'Authorization': `Bearer ${token}` }
                     });
-                };
-
-                await syncGroupOrder(evt.to);
-
-                if (evt.from !== evt.to) {
-                    await syncGroupOrder(evt.from);
+                    if (!res.ok) {
+                        const error = await res.json();
+                        UI.showToast(error.detail || "保存排序失败", false);
+                    } else if (window.linkRegistry[linkId]) {
+                        window.linkRegistry[linkId].group_id = parseInt(evt.to.dataset.groupId);
+                    }
+                } catch (e) {
+                    console.error("排序请求异常:", e);
+                    UI.showToast("网络连接异常", false);
                 }
             }
         });
@@ -262,39 +273,6 @@ function initSortable(userData) {
 
 window.initSortable = initSortable;
 
-async function checkUrlAccessibility(url, elementId) {
-    const el = document.getElementById(elementId);
-    if (!el) return;
-
-    el.classList.add('checking');
-
-    try {
-        const controller = new AbortController();
-        const timeoutId = setTimeout(() => controller.abort(), 3000);
-
-        await fetch(url, { mode: 'no-cors', signal: controller.signal });
-        clearTimeout(timeoutId);
-
-        el.classList.remove('inactive');
-
-        const img = el.querySelector('.icon-wrapper img');
-        if (img && img.src.includes('default_error.jpg')) {
-            img.src = getFaviconUrl(url);
-        }
-
-    } catch (err) {
-        el.classList.add('inactive');
-
-        const img = el.querySelector('.icon-wrapper img');
-        if (img) {
-            img.src = '/static/default_error.jpg';
-        }
-        console.warn(`健康检查失败 [${elementId}]: ${url}`);
-    } finally {
-        el.classList.remove('checking');
-    }
-}
-
 function openModal() {
     const modal = document.getElementById('linkModal');
     if (!modal) return;
@@ -391,6 +369,8 @@ const UI = {
             <button class="glass-btn" onclick="document.getElementById('bg-input').click()">✨ 换背景</button>
             <button class="glass-btn" onclick="openGroupModal()">📁 建分组</button>
             <button class="glass-btn" onclick="window.openModal()">➕ 添链接</button>
+            <button class="glass-btn" onclick="document.getElementById('bookmark-input').click()">📥 导入</button>
+            <button class="glass-btn" onclick="exportBookmarks().catch(err => UI.showToast(err.message, false))">📤 导出</button>
             <button class="glass-btn" onclick="logout()">🚪 退出</button>
         `;
     },
@@ -407,7 +387,10 @@ const UI = {
             menu.classList.toggle('active');
         };
 
-        document.addEventListener('click', () => menu.classList.remove('active'));
+        document.addEventListener('click', (e) => {
+            menu.classList.remove('active');
+            if (e.target !== input) hideSuggestions();
+        });
     },
 
     setSearchEngine(key) {
@@ -632,6 +615,21 @@ document.getElementById('bg-input')?.addEventListener('change', async e => {
     }
 });
 
+document.getElementById('bookmark-input')?.addEventListener('change', async e => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+
+    UI.showToast("正在导入书签...");
+    try {
+        const result = await importBookmarks(file);
+        UI.showToast(`已导入 ${result.links_created} 个链接，跳过重复 ${result.duplicates} 个`);
+        renderLinks();
+    } catch (err) {
+        UI.showToast(err.message || "导入失败", false);
+    }
+});
+
 window.currentEditingLinkId = null;
 
 function updateModalIconPreview(path) {
@@ -778,6 +776,7 @@ function openEditLinkModalById(event, linkId) {
 
 function logout() {
     localStorage.removeItem('onepanel_token');
+    syncTokenCookie('');
     window.location.reload();
 }
 
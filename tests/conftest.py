@@ -0,0 +1,139 @@
+import os
+
+# app.core.config 在导入时读取环境变量，测试中关闭后台任务，避免访问外部网络
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("TITLE_FETCH_WORKERS", "0")
+os.environ.setdefault("HEALTH_CHECK_CONCURRENCY", "0")
+os.environ.setdefault("ICON_SWEEP_INTERVAL", "0")
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import models
+from app.core.http_client import close_http_client
+from app.migrations import run_migrations
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def http_client():
+    """共享 HTTP 客户端绑定创建时的事件循环，每个测试结束后关闭"""
+    yield
+    await close_http_client()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """临时数据库（create_all + 全部迁移）的异步会话工厂，用于替换模块中的 AsyncSessionLocal"""
+    path = tmp_path / "onepanel.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    run_migrations(str(path))
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+@dataclass
+class Route:
+    body: bytes = b""
+    status: int = 200
+    content_type: str = "text/html; charset=utf-8"
+    delay: float = 0.0
+    chunks: int = 1
+    chunk_delay: float = 0.0
+    send_length: bool = True
+    headers: dict | None = None
+
+
+class StandInServer:
+    """本地替身 HTTP 服务：按路径返回预设内容，记录每个路径的请求次数与最大并发数"""
+
+    def __init__(self):
+        self.routes: dict[str, Route] = {}
+        self.hits: Counter[str] = Counter()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def route(self, path: str, **kwargs) -> str:
+        self.routes[path] = Route(**kwargs)
+        return self.url(path)
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                with server._lock:
+                    server.hits[path] += 1
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    self._respond(server.routes.get(path))
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端超时或超出大小后主动断开
+                    pass
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def _respond(self, route: Route | None):
+                if route is None:
+                    self.send_error(404)
+                    return
+                time.sleep(route.delay)
+                self.send_response(route.status)
+                self.send_header("Content-Type", route.content_type)
+                for name, value in (route.headers or {}).items():
+                    self.send_header(name, value)
+                if route.send_length:
+                    self.send_header("Content-Length", str(len(route.body)))
+                self.end_headers()
+
+                # 不发送 Content-Length 时以关闭连接结束响应体（HTTP/1.0）
+                size = -(-len(route.body) // route.chunks) if route.body else 0
+                for start in range(0, len(route.body), size or 1):
+                    self.wfile.write(route.body[start:start + size])
+                    self.wfile.flush()
+                    time.sleep(route.chunk_delay)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def stand_in_server():
+    server = StandInServer()
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,35 @@
+"""首屏接口按 Accept-Encoding 的编码与 q 值决定是否返回 gzip"""
+import pytest
+from fastapi import Request
+
+from app.core.dashboard import accepts_gzip
+
+
+def make_request(accept_encoding: str | None) -> Request:
+    headers = [] if accept_encoding is None else [(b"accept-encoding", accept_encoding.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, False),
+        ("", False),
+        ("gzip", True),
+        ("GZIP", True),
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, gzip;q=0.8", True),
+        ("x-gzip", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.000", False),
+        ("br, gzip;q=0, *;q=1", False),
+        ("*;q=0", False),
+        ("identity, *;q=0", False),
+        ("br, *;q=0.5", True),
+        ("gzip;q=bad", False),
+        ("deflate, notgzip", False),
+    ],
+)
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(make_request(header)) is expected
@@ -0,0 +1,40 @@
+"""条件请求：If-None-Match 按实体标签逐个做弱比较"""
+import pytest
+from fastapi import Request
+
+from app.core.data_versions import etag_matches
+
+ETAG = '"b3-2-7-4"'
+
+
+def make_request(if_none_match: str | None) -> Request:
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, False),
+        ("", False),
+        ('"b3-2-7-4"', True),
+        ('W/"b3-2-7-4"', True),
+        ('"other", W/"b3-2-7-4"', True),
+        ('"other",W/"b3-2-7-4"', True),
+        ("*", True),
+        ('"b3-2-7-4-1"', False),
+        ('"xb3-2-7-4"', False),
+        (' "other" , , "b3-2-7-4" ', True),
+        ('"a,b", "b3-2-7-4"', True),
+        ('"b3-2-7-4" garbage', False),
+        ('prefix"b3-2-7-4"', False),
+        ("b3-2-7-4", False),
+        ('"b3-2-7", "4"', False),
+    ],
+)
+def test_etag_matches(header, expected):
+    assert etag_matches(make_request(header), ETAG) is expected
+
+
+def test_weak_etag_matches_strong_candidate():
+    assert etag_matches(make_request(ETAG), f"W/{ETAG}")
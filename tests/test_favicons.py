@@ -0,0 +1,146 @@
+"""站点图标代理：只为已保存链接中的站点抓取并缓存，第三方服务由本地替身代替"""
+import io
+import os
+import sqlite3
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from PIL import Image
+from sqlalchemy import create_engine
+
+from app import migrations, models
+from app.api import favicons
+from app.core import config
+from app.core import favicons as favicon_module
+from app.core.favicons import FaviconCache
+from app.core.url_metadata import url_host
+from app.database import get_async_db
+
+pytestmark = pytest.mark.anyio
+
+
+def png_bytes() -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", (16, 16), (0, 0, 255, 255)).save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def api(tmp_path, session_factory, stand_in_server, monkeypatch):
+    cache_dir = tmp_path / "favicons"
+    cache_dir.mkdir()
+    monkeypatch.setattr(config, "FAVICON_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(favicons, "favicon_cache", FaviconCache())
+    url = "https://Known.Example/docs?page=1"
+
+    with sqlite3.connect(tmp_path / "onepanel.db") as conn:
+        conn.execute(
+            "INSERT INTO system_config (key, value) VALUES ('favicon_api', ?)",
+            (stand_in_server.url("/favicon/${hostname}"),),
+        )
+        conn.execute(
+            "INSERT INTO links (title, url, host, \"order\", group_id) VALUES (?, ?, ?, 0, 1)",
+            ("已保存的链接", url, url_host(url)),
+        )
+
+    async def override_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(favicons.router)
+    app.dependency_overrides[get_async_db] = override_db
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver")
+
+
+async def test_known_host_is_fetched_once_and_cached(api, stand_in_server, http_client, tmp_path):
+    stand_in_server.route("/favicon/known.example", body=png_bytes(), content_type="image/png")
+
+    async with api:
+        first = await api.get("/api/favicons/known.example")
+        second = await api.get("/api/favicons/known.example")
+        revalidated = await api.get(
+            "/api/favicons/known.example", headers={"If-None-Match": f'"x", {first.headers["etag"]}'}
+        )
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["content-type"] == "image/png"
+    assert revalidated.status_code == 304
+    assert first.content == second.content == png_bytes()
+    assert stand_in_server.hits["/favicon/known.example"] == 1
+    assert len(os.listdir(tmp_path / "favicons")) == 2
+
+
+async def test_unknown_host_is_not_fetched_or_cached(api, stand_in_server, http_client, tmp_path):
+    stand_in_server.route("/favicon/random-123.example", body=png_bytes(), content_type="image/png")
+
+    async with api:
+        # 仅作为其他站点的路径或子串出现也不算
+        responses = [
+            await api.get(f"/api/favicons/{host}")
+            for host in ("random-123.example", "example", "known.example.evil")
+        ]
+
+    assert [response.status_code for response in responses] == [404, 404, 404]
+    assert sum(stand_in_server.hits.values()) == 0
+    assert os.listdir(tmp_path / "favicons") == []
+
+
+async def test_unlinked_host_is_remembered_until_a_link_uses_it(
+    api, stand_in_server, http_client, tmp_path, monkeypatch
+):
+    stand_in_server.route("/favicon/new.example", body=png_bytes(), content_type="image/png")
+    queries = []
+    host_in_links = favicon_module.host_in_links
+
+    async def counting_host_in_links(db, host):
+        queries.append(host)
+        return await host_in_links(db, host)
+
+    monkeypatch.setattr(favicons, "host_in_links", counting_host_in_links)
+
+    async with api:
+        for _ in range(3):
+            response = await api.get("/api/favicons/new.example")
+            assert response.status_code == 404
+            assert response.headers["cache-control"] == "no-store"
+        assert queries == ["new.example"]
+
+        # 链接保存后（接口中调用 forget_unlinked）立即可以抓取
+        favicons.favicon_cache.forget_unlinked(["new.example"])
+        with sqlite3.connect(tmp_path / "onepanel.db") as conn:
+            conn.execute(
+                "INSERT INTO links (title, url, host, \"order\", group_id) VALUES (?, ?, ?, 0, 1)",
+                ("新链接", "http://new.example/", "new.example"),
+            )
+        response = await api.get("/api/favicons/new.example")
+
+    assert response.status_code == 200
+    assert stand_in_server.hits["/favicon/new.example"] == 1
+
+
+def test_link_host_is_backfilled_by_migration(tmp_path, monkeypatch):
+    path = str(tmp_path / "onepanel.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    all_migrations = list(migrations.MIGRATIONS)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in all_migrations if m[0] < 9])
+    migrations.run_migrations(path)
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO links (title, url, \"order\", group_id) VALUES (?, ?, 0, 1)",
+            [("a", "https://WWW.Example.com./x"), ("b", "http://中国.cn:8080/"), ("c", "not a url")],
+        )
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", all_migrations)
+    migrations.run_migrations(path)
+    with sqlite3.connect(path) as conn:
+        hosts = [row[0] for row in conn.execute("SELECT host FROM links ORDER BY id")]
+        plan = " ".join(
+            row[3] for row in conn.execute("EXPLAIN QUERY PLAN SELECT id FROM links WHERE host = 'x'")
+        )
+
+    assert hosts == ["www.example.com", "xn--fiqs8s.cn", None]
+    assert "ix_links_host" in plan
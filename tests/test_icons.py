@@ -0,0 +1,98 @@
+"""本地图标的内容寻址：旧文件迁移与重新上传得到同一个文件，以及未引用文件的定期清理"""
+import asyncio
+import io
+import os
+import sqlite3
+import time
+
+from PIL import Image
+from sqlalchemy import create_engine
+
+from app import migrations, models
+from app.core import config
+from app.core.icons import (
+    ICON_URL_PREFIX,
+    PURGE_GRACE_SECONDS,
+    store_icon_bytes,
+    sweep_unreferenced_icons,
+)
+
+
+def legacy_png() -> bytes:
+    # 与重新编码结果字节不同的 PNG（不压缩），模拟旧版本直接保存的原始文件
+    output = io.BytesIO()
+    Image.new("RGB", (40, 40), (0, 128, 255)).save(output, format="PNG", compress_level=0)
+    return output.getvalue()
+
+
+def test_migrated_icon_matches_reupload(tmp_path, monkeypatch):
+    icons_dir = tmp_path / "icons"
+    icons_dir.mkdir()
+    monkeypatch.setattr(config, "ICONS_DIR", str(icons_dir))
+    raw = legacy_png()
+    (icons_dir / "3f2a9c1e-legacy.png").write_bytes(raw)
+
+    path = str(tmp_path / "onepanel.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+    # 先停在迁移 0004 之前，写入使用 uuid 文件名的旧链接
+    all_migrations = list(migrations.MIGRATIONS)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in all_migrations if m[0] < 4])
+    migrations.run_migrations(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO links (title, url, icon, \"order\", group_id) VALUES (?, ?, ?, 0, 1)",
+            ("旧链接", "https://example.com", ICON_URL_PREFIX + "3f2a9c1e-legacy.png"),
+        )
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", all_migrations)
+    migrations.run_migrations(path)
+    with sqlite3.connect(path) as conn:
+        migrated = conn.execute("SELECT icon FROM links").fetchone()[0]
+        refs = conn.execute("SELECT icon, refcount FROM icon_refs").fetchall()
+
+    reuploaded = asyncio.run(store_icon_bytes(raw))
+    assert migrated == reuploaded
+    assert refs == [(migrated, 1)]
+
+
+def test_sweep_removes_expired_unreferenced_icons(tmp_path, session_factory, monkeypatch):
+    icons_dir = tmp_path / "icons"
+    icons_dir.mkdir()
+    monkeypatch.setattr(config, "ICONS_DIR", str(icons_dir))
+    kept, expired, editing, gone = ("a" * 64, "b" * 64, "c" * 64, "d" * 64)
+    names = {
+        "kept": [f"{kept}.png", f"{kept}-32.webp"],
+        "expired": [f"{expired}.png", f"{expired}-32.webp", f"{expired}-64.png"],
+        # 编辑表单中已上传、尚未保存的图标，超过即时清理的宽限期但仍在编辑中
+        "editing": [f"{editing}.png"],
+        "orphan_variant": [f"{gone}-32.webp"],
+        "legacy": ["3f2a9c1e-legacy.png"],
+    }
+    old = time.time() - config.ICON_SWEEP_GRACE * 2
+    uploaded = time.time() - PURGE_GRACE_SECONDS * 30
+    for group, files in names.items():
+        for name in files:
+            path = icons_dir / name
+            path.write_bytes(b"icon")
+            mtime = uploaded if group == "editing" else old
+            os.utime(path, (mtime, mtime))
+
+    with sqlite3.connect(tmp_path / "onepanel.db") as conn:
+        conn.execute(
+            "INSERT INTO links (title, url, icon, \"order\", group_id) VALUES (?, ?, ?, 0, 1)",
+            ("链接", "https://example.com", f"{ICON_URL_PREFIX}{kept}.png"),
+        )
+        # 引用计数已归零但未删除的记录
+        conn.execute("INSERT INTO icon_refs (icon, refcount) VALUES (?, 0)", (f"{ICON_URL_PREFIX}{expired}.png",))
+
+    async def sweep():
+        async with session_factory() as db:
+            return await sweep_unreferenced_icons(db)
+
+    assert asyncio.run(sweep()) == 2
+    assert sorted(os.listdir(icons_dir)) == sorted(names["kept"] + names["editing"] + names["legacy"])
+    with sqlite3.connect(tmp_path / "onepanel.db") as conn:
+        refs = conn.execute("SELECT icon, refcount FROM icon_refs").fetchall()
+    assert refs == [(f"{ICON_URL_PREFIX}{kept}.png", 1)]
@@ -0,0 +1,36 @@
+"""链接巡检：单个 URL 检查出错时，同批其他链接的结果照常写入"""
+import sqlite3
+
+import pytest
+
+from app.core import link_health
+from app.core.link_health import STATUS_OK, STATUS_UNREACHABLE, HealthResult, LinkHealthChecker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unexpected_error_does_not_drop_batch_results(tmp_path, session_factory, monkeypatch):
+    monkeypatch.setattr(link_health, "AsyncSessionLocal", session_factory)
+    path = tmp_path / "onepanel.db"
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO links (id, title, url, \"order\", group_id) VALUES (?, ?, ?, 0, 1)",
+            [(1, "正常", "http://ok.example/"), (2, "出错", "http://boom.example/")],
+        )
+
+    async def fake_check_url(url: str) -> HealthResult:
+        if "boom" in url:
+            raise RuntimeError("意外错误")
+        return HealthResult(STATUS_OK, 200, 5)
+
+    monkeypatch.setattr(link_health, "check_url", fake_check_url)
+    checker = LinkHealthChecker(2)
+
+    assert await checker.run_once() == 2
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            "SELECT id, health_status, health_code, health_failures FROM links ORDER BY id"
+        ).fetchall()
+    assert rows == [(1, STATUS_OK, 200, 0), (2, STATUS_UNREACHABLE, None, 1)]
+    assert (checker.ok, checker.failed) == (1, 1)
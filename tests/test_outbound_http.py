@@ -0,0 +1,108 @@
+"""出站请求：同一 URL 并发抓取合并、单站点并发上限，以及图标下载的超时与大小上限
+
+所有请求都发往本地替身服务，不访问外部网络。
+"""
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.core import config, icons, url_metadata
+from app.core.http_client import get_http_client, outbound_slot
+from app.core.icons import IconError, download_icon
+from app.core.url_metadata import UrlMetadataStore
+
+pytestmark = pytest.mark.anyio
+
+PAGE = "<html><head><title>替身页面</title></head><body></body></html>".encode("utf-8")
+
+
+def png_bytes(size: int = 48) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", (size, size), (255, 0, 0, 255)).save(output, format="PNG")
+    return output.getvalue()
+
+
+async def test_concurrent_requests_for_same_url_share_one_fetch(
+    stand_in_server, session_factory, http_client, monkeypatch
+):
+    monkeypatch.setattr(url_metadata, "AsyncSessionLocal", session_factory)
+    url = stand_in_server.route("/page", body=PAGE, delay=0.3)
+    store = UrlMetadataStore()
+
+    results = await asyncio.gather(*(store.get(url) for _ in range(5)))
+
+    assert stand_in_server.hits["/page"] == 1
+    assert store.coalesced == 4
+    assert {meta.title for meta in results} == {"替身页面"}
+
+    # 结果已写入数据库，TTL 内再次读取不会访问上游
+    await store.get(url)
+    assert stand_in_server.hits["/page"] == 1
+    assert store.hits == 1
+
+
+async def test_per_host_limit_caps_parallel_requests(stand_in_server, http_client, monkeypatch):
+    monkeypatch.setattr(config, "HTTP_PER_HOST_LIMIT", 2)
+    url = stand_in_server.route("/slow", body=b"ok", delay=0.2)
+
+    async def fetch(index: int) -> int:
+        async with outbound_slot(url):
+            response = await get_http_client().get(f"{url}?n={index}")
+            return response.status_code
+
+    statuses = await asyncio.gather(*(fetch(index) for index in range(6)))
+
+    assert statuses == [200] * 6
+    assert stand_in_server.hits["/slow"] == 6
+    assert stand_in_server.max_active == 2
+
+
+@pytest.fixture
+def icons_dir(tmp_path, monkeypatch):
+    path = tmp_path / "icons"
+    path.mkdir()
+    monkeypatch.setattr(config, "ICONS_DIR", str(path))
+    return path
+
+
+async def test_download_icon_saves_normalised_image(stand_in_server, http_client, icons_dir):
+    url = stand_in_server.route("/icon.png", body=png_bytes(), content_type="image/png")
+
+    icon = await download_icon(url)
+
+    assert icon.startswith(icons.ICON_URL_PREFIX)
+    assert (icons_dir / icon.removeprefix(icons.ICON_URL_PREFIX)).exists()
+    # 临时文件已清理
+    assert not [name for name in os.listdir(icons_dir) if name.endswith(".download")]
+
+
+async def test_download_icon_times_out_on_slow_body(
+    stand_in_server, http_client, icons_dir, monkeypatch
+):
+    monkeypatch.setattr(config, "ICON_DOWNLOAD_TIMEOUT", 0.5)
+    # 响应头立即返回，响应体每 0.3 秒发送一段，总耗时超过下载上限
+    url = stand_in_server.route(
+        "/slow.png", body=png_bytes(), content_type="image/png", chunks=8, chunk_delay=0.3
+    )
+
+    with pytest.raises(IconError, match="下载超时"):
+        await download_icon(url)
+    assert os.listdir(icons_dir) == []
+
+
+@pytest.mark.parametrize("send_length", [True, False])
+async def test_download_icon_rejects_oversized_body(
+    stand_in_server, http_client, icons_dir, monkeypatch, send_length
+):
+    monkeypatch.setattr(icons, "MAX_FILE_SIZE", 4096)
+    body = png_bytes() + b"\0" * 16384
+    url = stand_in_server.route(
+        "/huge.png", body=body, content_type="image/png", chunks=8, send_length=send_length
+    )
+
+    with pytest.raises(IconError, match="超过"):
+        await download_icon(url)
+    assert os.listdir(icons_dir) == []
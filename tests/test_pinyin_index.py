@@ -0,0 +1,61 @@
+"""拼音补全索引：按公共分组 / 用户分片，数据版本号变化时只重建对应分片"""
+import sqlite3
+
+import pytest
+
+from app.core import pinyin_index as pinyin_module
+from app.core.pinyin_index import PinyinIndex
+
+pytestmark = pytest.mark.anyio
+
+GROUPS = [(1, "常用链接", 1), (2, "我的分组", 2), (3, "别人的分组", 3)]
+LINKS = [
+    (1, "百度", "https://www.baidu.com", 1),
+    (2, "百度网盘", "https://pan.baidu.com", 2),
+    (3, "百度地图", "https://map.baidu.com", 3),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path, session_factory, monkeypatch):
+    monkeypatch.setattr(pinyin_module, "AsyncSessionLocal", session_factory)
+    path = tmp_path / "onepanel.db"
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO groups (id, name, \"order\", user_id) VALUES (?, ?, 0, ?)", GROUPS)
+        conn.executemany(
+            "INSERT INTO links (id, title, url, \"order\", group_id) VALUES (?, ?, ?, 0, ?)", LINKS
+        )
+    return path
+
+
+async def lookup(index, session_factory, user_id, q, group_ids):
+    async with session_factory() as db:
+        return await index.lookup(db, user_id, q, group_ids, 10)
+
+
+async def test_lookup_only_reads_visible_shards(db_path, session_factory):
+    index = PinyinIndex(16)
+
+    assert await lookup(index, session_factory, 2, "bd", {1, 2}) == [1, 2]
+    assert await lookup(index, session_factory, None, "百度", {1}) == [1]
+    # 隐藏公共分组后不再读取公共分片
+    assert await lookup(index, session_factory, 2, "baidu", {2}) == [2]
+    assert set(index._shards) == {"public", "user:2"}
+    assert index.rebuilds == 2
+
+
+async def test_version_bump_rebuilds_only_that_shard(db_path, session_factory):
+    index = PinyinIndex(16)
+    assert await lookup(index, session_factory, 2, "bd", {1, 2}) == [1, 2]
+
+    # 模拟其他进程的修改：触发器递增 user:2 的版本号
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE links SET title = '网易云音乐' WHERE id = 2")
+    assert await lookup(index, session_factory, 2, "wy", {1, 2}) == [2]
+    assert await lookup(index, session_factory, 2, "bd", {1, 2}) == [1]
+    assert index.rebuilds == 3
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM links WHERE id = 1")
+    assert await lookup(index, session_factory, None, "bd", {1}) == []
+    assert index.rebuilds == 4
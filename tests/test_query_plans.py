@@ -0,0 +1,58 @@
+"""首页分组与链接查询的执行计划回归测试：必须走复合索引，且不需要临时 B 树排序"""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import models
+from app.core.dashboard import group_query, link_query
+from app.migrations import run_migrations
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """按旧版本结构建库：create_all 之后删掉迁移负责添加的索引，再执行迁移"""
+    path = str(tmp_path / "onepanel.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP INDEX ix_groups_user_id_order")
+        conn.execute("DROP INDEX ix_links_group_id_order")
+
+    run_migrations(path)
+    conn = sqlite3.connect(path)
+    yield engine, conn
+    conn.close()
+    engine.dispose()
+
+
+def query_plan(engine, conn, stmt) -> list[str]:
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def test_guest_group_query_reads_public_group_by_primary_key(legacy_db):
+    engine, conn = legacy_db
+    plan = query_plan(engine, conn, group_query(None, True))
+
+    assert any("INTEGER PRIMARY KEY" in step for step in plan), plan
+    assert not any("USE TEMP B-TREE FOR ORDER BY" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("user_id, include_public", [(2, True), (2, False), (1, True)])
+def test_group_query_uses_user_order_index(legacy_db, user_id, include_public):
+    engine, conn = legacy_db
+    plan = query_plan(engine, conn, group_query(user_id, include_public))
+
+    assert any("ix_groups_user_id_order" in step for step in plan), plan
+    assert not any("USE TEMP B-TREE FOR ORDER BY" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("with_http_title", [False, True])
+@pytest.mark.parametrize("group_ids", [[1], [1, 2, 3]])
+def test_link_query_uses_group_order_index(legacy_db, group_ids, with_http_title):
+    engine, conn = legacy_db
+    plan = query_plan(engine, conn, link_query(group_ids, with_http_title))
+
+    assert any("ix_links_group_id_order" in step for step in plan), plan
+    assert not any("USE TEMP B-TREE FOR ORDER BY" in step for step in plan), plan